@@ -1,26 +1,101 @@
 import os
+import io
 import base64
-from openai import OpenAI
+import threading
 from dotenv import load_dotenv
+from config.settings import (
+    RESPONSE_CACHE_DIR, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_DISABLED,
+    UPLOAD_IMAGE_MAX_SIDE,
+)
+from utils import tracing
+from utils.disk_cache import DiskCache
 
 # Load environment variables
 load_dotenv()
-api_key = os.getenv("OPENAI_API_KEY")
 
-if not api_key:
-    raise ValueError("OPENAI_API_KEY not found in environment variables.")
+_client = None
+_client_lock = threading.Lock()
 
-client = OpenAI(api_key=api_key)
 
-def _encode_image(image_path):
+def get_client():
+    """The OpenAI client is created on first use, so importing this module stays cheap."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment variables.")
+
+            from openai import OpenAI
+            _client = OpenAI(api_key=api_key)
+        return _client
+
+# Completed responses keyed by model, prompts, max_tokens and image bytes
+response_cache = DiskCache(RESPONSE_CACHE_DIR, max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL, suffix=".txt")
+
+
+def set_client(client) -> None:
+    """Use client (e.g. a local stand-in with the same chat.completions API) for all calls."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def _encode_image(image_bytes: bytes, max_side: int = UPLOAD_IMAGE_MAX_SIDE):
+    """
+    Return (mime type, base64 payload). Images larger than max_side are downscaled
+    and re-encoded as JPEG to cut upload size; small JPEG/PNG files go as-is.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes))
+    if max(image.size) <= max_side and image.format in ("JPEG", "PNG"):
+        return Image.MIME[image.format], base64.b64encode(image_bytes).decode("utf-8")
+
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image.mode != "RGB":
+        # Flatten transparency onto white rather than black
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85, optimize=True)
+    return "image/jpeg", base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def _cached(key: str, use_cache: bool):
+    if not use_cache or RESPONSE_CACHE_DISABLED:
+        return None
+    cached = response_cache.get(key)
+    tracing.count("openai.cache_hits" if cached is not None else "openai.cache_misses")
+    return cached.decode("utf-8") if cached is not None else None
+
+
+def _store(key: str, text: str, use_cache: bool) -> None:
+    if use_cache and not RESPONSE_CACHE_DISABLED:
+        response_cache.put(key, text.encode("utf-8"))
+
+
+@tracing.traced("openai.prompt_image")
+def prompt_image(system_prompt: str, user_prompt: str, image_path: str, use_cache: bool = True) -> str:
+    model = "gpt-4.1-mini"
+    max_tokens = 300
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+        image_bytes = image_file.read()
+
+    key = DiskCache.make_key("prompt_image", model, system_prompt, user_prompt, max_tokens, UPLOAD_IMAGE_MAX_SIDE, image_bytes)
+    cached = _cached(key, use_cache)
+    if cached is not None:
+        return cached
 
-def prompt_image(system_prompt: str, user_prompt: str, image_path: str) -> str:
-    base64_image = _encode_image(image_path)
+    mime_type, base64_image = _encode_image(image_bytes)
+    tracing.count("openai.bytes_uploaded", len(base64_image))
 
-    response = client.chat.completions.create(
-        model="gpt-4.1-mini",
+    tracing.count("openai.requests")
+    response = get_client().chat.completions.create(
+        model=model,
         messages=[
             {
                 "role": "system",
@@ -33,32 +108,49 @@ def prompt_image(system_prompt: str, user_prompt: str, image_path: str) -> str:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
+                            "url": f"data:{mime_type};base64,{base64_image}"
                         }
                     },
                 ],
             },
         ],
-        max_tokens=300
+        max_tokens=max_tokens
     )
 
-    return response.choices[0].message.content.strip()
+    result = response.choices[0].message.content.strip()
+    _store(key, result, use_cache)
+    return result
 
 # Main function to generate a response from a prompt
-def prompt_llm(prompt: str, system_message: str = None) -> str:
+@tracing.traced("openai.prompt_llm")
+def prompt_llm(prompt: str, system_message: str = None, use_cache: bool = True) -> str:
     if not system_message:
         system_message = (
             "Only reply with the asked description text and nothing else!"
         )
 
-    response = client.chat.completions.create(
-        model="gpt-4o",  # or "gpt-4-turbo" if preferred
+    model = "gpt-4o"  # or "gpt-4-turbo" if preferred
+    max_tokens = 300
+    key = DiskCache.make_key("prompt_llm", model, system_message, prompt, max_tokens)
+    cached = _cached(key, use_cache)
+    if cached is not None:
+        return cached
+
+    tracing.count("openai.requests")
+    response = get_client().chat.completions.create(
+        model=model,
         messages=[
             {"role": "system", "content": system_message},
             {"role": "user", "content": prompt}
         ],
-        max_tokens=300
+        max_tokens=max_tokens
     )
 
-    return response.choices[0].message.content.strip()
+    result = response.choices[0].message.content.strip()
+    _store(key, result, use_cache)
+    return result
+
 
+def cache_stats() -> dict:
+    """Hit/miss counters of the response cache for this process."""
+    return response_cache.stats()
@@ -1,40 +1,151 @@
 import os
 import uuid
+import shutil
+import threading
+from typing import Iterator, Optional
 from dotenv import load_dotenv
-from elevenlabs.client import ElevenLabs
-from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
+from config.settings import TEMP_DIR, TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES
+from utils import tracing
+from utils.disk_cache import DiskCache
 
 load_dotenv()
 
+VOICE_ID = "pNInz6obpgDQGcFmaJgB"
+MODEL_ID = "eleven_turbo_v2_5"
+OUTPUT_FORMAT = "mp3_22050_32"
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75,
+    "style": 0.0,
+    "use_speaker_boost": True,
+    "speed": 1.0,
+}
+# Narration pace at speed 1.0, for estimating a script's length before it is synthesized
+WORDS_PER_SECOND = 2.5
 
+_client = None
+_client_lock = threading.Lock()
 
-def tts(text: str, filename: str = None) -> str:
-    client = ElevenLabs(
-  api_key=os.getenv("ELEVENLABS_API_KEY"),
-)
-    
-    response = client.text_to_speech.convert(
+audio_cache = DiskCache(TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, suffix=".mp3")
+
+
+def get_client() -> "ElevenLabs":
+    """One shared client, so its HTTP connection pool is reused across calls."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from elevenlabs.client import ElevenLabs
+
+            _client = ElevenLabs(
+                api_key=os.getenv("ELEVENLABS_API_KEY"),
+            )
+        return _client
+
+
+def set_client(client) -> None:
+    """Use client (e.g. a local stand-in exposing text_to_speech.stream) for all calls."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def _cache_key(text, voice_id, model_id, output_format, voice_settings) -> str:
+    return DiskCache.make_key("elevenlabs", text, voice_id, model_id, output_format, voice_settings)
+
+
+def estimate_speech_duration(text: str, voice_settings: Optional[dict] = None) -> float:
+    """Rough seconds of narration for text, from its word count."""
+    speed = (voice_settings or VOICE_SETTINGS).get("speed", 1.0)
+    return len(text.split()) / (WORDS_PER_SECOND * speed)
+
+
+def tts_stream(
+    text: str,
+    voice_id: str = VOICE_ID,
+    model_id: str = MODEL_ID,
+    output_format: str = OUTPUT_FORMAT,
+    voice_settings: Optional[dict] = None,
+    use_cache: bool = True,
+) -> Iterator[bytes]:
+    """
+    Yield audio bytes as they arrive. Cached audio is replayed from disk; fresh audio
+    is written to the cache only once the stream completed.
+    """
+    voice_settings = voice_settings or VOICE_SETTINGS
+    key = _cache_key(text, voice_id, model_id, output_format, voice_settings)
+
+    cached_path = audio_cache.get_path(key) if use_cache else None
+    if cached_path:
+        tracing.count("tts.cache_hits")
+        with open(cached_path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                yield chunk
+        return
+
+    from elevenlabs import VoiceSettings
+
+    tracing.count("elevenlabs.requests")
+    response = get_client().text_to_speech.stream(
+        voice_id=voice_id,
         text=text,
-        voice_id="pNInz6obpgDQGcFmaJgB", 
-        model_id="eleven_turbo_v2_5",
-        output_format="mp3_22050_32",  
-        voice_settings=VoiceSettings(
-            stability=0.5,
-            similarity_boost=0.75,
-            style=0.0,
-            use_speaker_boost=True,
-            speed=1.0,
-        ),
+        model_id=model_id,
+        output_format=output_format,
+        voice_settings=VoiceSettings(**voice_settings),
     )
 
+    if not use_cache:
+        for chunk in response:
+            if chunk:
+                yield chunk
+        return
+
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    partial_path = os.path.join(TEMP_DIR, f"tts_{uuid.uuid4().hex}.partial")
+    try:
+        with open(partial_path, "wb") as f:
+            for chunk in response:
+                if chunk:
+                    f.write(chunk)
+                    yield chunk
+        audio_cache.put_file(key, partial_path, move=True)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+@tracing.traced("elevenlabs.tts")
+def tts(
+    text: str,
+    filename: str = None,
+    voice_id: str = VOICE_ID,
+    model_id: str = MODEL_ID,
+    output_format: str = OUTPUT_FORMAT,
+    voice_settings: Optional[dict] = None,
+    use_cache: bool = True,
+) -> str:
     if not filename:
-        filename = f"{uuid.uuid4()}.mp3"
+        # Unique per job so concurrent runs never share an output file
+        filename = os.path.join(TEMP_DIR, f"tts_{uuid.uuid4().hex}.mp3")
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    voice_settings = voice_settings or VOICE_SETTINGS
+    key = _cache_key(text, voice_id, model_id, output_format, voice_settings)
+    cached_path = audio_cache.get_path(key) if use_cache else None
+
+    if cached_path:
+        tracing.count("tts.cache_hits")
+        shutil.copyfile(cached_path, filename)
+        print(f"Audio saved to: {filename} (cached)")
+        return filename
 
     with open(filename, "wb") as f:
-        for chunk in response:
-            if chunk:
-                f.write(chunk)
+        for chunk in tts_stream(text, voice_id, model_id, output_format, voice_settings, use_cache=False):
+            f.write(chunk)
+    tracing.count("elevenlabs.bytes_received", os.path.getsize(filename))
+
+    if use_cache:
+        audio_cache.put_file(key, filename)
 
     print(f"Audio saved to: {filename}")
     return filename
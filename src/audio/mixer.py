@@ -0,0 +1,162 @@
+"""
+Narration / background music pre-mix in NumPy.
+
+Both tracks are decoded once by ffmpeg to PCM at the output sample rate; gain,
+fades and sidechain ducking are applied as whole-array operations and the result
+is written as a single WAV that the renderers mux in as-is. Decoded music beds
+are cached as .npy files (keyed by file content), so a track shared by many ads
+is decoded once and afterwards just memory-mapped.
+"""
+
+import os
+import uuid
+import wave
+import numpy as np
+from typing import Optional
+from config.settings import MUSIC_CACHE_DIR, MUSIC_CACHE_MAX_BYTES, TEMP_DIR
+from utils import tracing
+from utils.disk_cache import DiskCache
+from utils.ffmpeg import read_ffmpeg, run_ffmpeg
+from utils.hashing import file_digest
+from video.ffmpeg_render import AUDIO_SAMPLE_RATE
+
+CHANNELS = 2
+# Narration loudness (RMS over DUCK_WINDOW seconds) above which music is ducked
+DUCK_THRESHOLD = 0.02
+DUCK_WINDOW = 0.01
+
+music_cache = DiskCache(MUSIC_CACHE_DIR, max_bytes=MUSIC_CACHE_MAX_BYTES, suffix=".npy")
+
+
+def decode_pcm(path: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> np.ndarray:
+    """Audio of path as int16 samples, shape (n, CHANNELS)."""
+    with tracing.span("audio.decode", path=path):
+        data = read_ffmpeg([
+            "-i", path, "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", str(CHANNELS), "-ar", str(sample_rate), "-",
+        ])
+    return np.frombuffer(data, dtype=np.int16).reshape(-1, CHANNELS)
+
+
+def load_music_bed(path: str, sample_rate: int = AUDIO_SAMPLE_RATE) -> np.ndarray:
+    """Decoded music track (int16, memory-mapped from the cache when possible)."""
+    key = DiskCache.make_key("music", file_digest(path), sample_rate, CHANNELS)
+    cached_path = music_cache.get_path(key)
+    if cached_path:
+        tracing.count("music_cache.hits")
+        return np.load(cached_path, mmap_mode="r")
+
+    tracing.count("music_cache.misses")
+    pcm = decode_pcm(path, sample_rate)
+    tmp_path = music_cache.path_for(key) + f".{uuid.uuid4().hex}.npy"
+    os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+    np.save(tmp_path, pcm)
+    music_cache.put_file(key, tmp_path, move=True)
+    return pcm
+
+
+def to_float(pcm: np.ndarray, length: int) -> np.ndarray:
+    """First length frames as float32 in [-1, 1], zero padded when pcm is shorter."""
+    out = np.zeros((length, CHANNELS), dtype=np.float32)
+    n = min(length, len(pcm))
+    np.multiply(pcm[:n], 1.0 / 32768, out=out[:n], casting="unsafe")
+    return out
+
+
+def fade_envelope(length: int, sample_rate: int, fade_in: float, fade_out: float) -> np.ndarray:
+    envelope = np.ones(length, dtype=np.float32)
+    n_in = min(length, int(fade_in * sample_rate))
+    n_out = min(length, int(fade_out * sample_rate))
+    if n_in:
+        envelope[:n_in] = np.linspace(0.0, 1.0, n_in, dtype=np.float32)
+    if n_out:
+        envelope[length - n_out:] *= np.linspace(1.0, 0.0, n_out, dtype=np.float32)
+    return envelope
+
+
+def duck_envelope(
+    narration: np.ndarray,
+    sample_rate: int,
+    amount: float,
+    smoothing: float = 0.25,
+    threshold: float = DUCK_THRESHOLD,
+) -> np.ndarray:
+    """
+    Per-sample music gain: 1 - amount while the narration is speaking, easing in and
+    out over smoothing seconds (a centered moving average, so the dip starts just
+    before speech instead of clipping the first syllable).
+    """
+    length = len(narration)
+    hop = max(1, int(DUCK_WINDOW * sample_rate))
+    frames = length // hop
+    if not frames:
+        return np.ones(length, dtype=np.float32)
+
+    mono = narration[:frames * hop].mean(axis=1).reshape(frames, hop)
+    rms = np.sqrt(np.mean(mono * mono, axis=1))
+    gain = 1.0 - amount * (rms > threshold)
+
+    width = max(1, int(smoothing / DUCK_WINDOW))
+    padded = np.pad(gain, (width // 2, width - 1 - width // 2), mode="edge")
+    gain = np.convolve(padded, np.ones(width) / width, mode="valid")
+
+    centers = (np.arange(frames) + 0.5) * hop
+    return np.interp(np.arange(length), centers, gain).astype(np.float32)
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int) -> None:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+
+def wav_duration(path: str) -> float:
+    with wave.open(path, "rb") as f:
+        return f.getnframes() / f.getframerate()
+
+
+def encode_aac(wav_path: str, bitrate: str = "192k") -> str:
+    """AAC (.m4a) copy of a mix, for muxers that copy the audio stream into an mp4 as-is."""
+    output_path = os.path.splitext(wav_path)[0] + ".m4a"
+    run_ffmpeg(["-i", wav_path, "-c:a", "aac", "-b:a", bitrate, output_path])
+    return output_path
+
+
+@tracing.traced("audio.mix")
+def mix_audio(
+    tts_audio_path: str,
+    bg_music_path: Optional[str] = None,
+    bg_music_volume: float = 0.1,
+    duration: Optional[float] = None,
+    output_path: Optional[str] = None,
+    fade: float = 1.0,
+    ducking: float = 0.0,
+    sample_rate: int = AUDIO_SAMPLE_RATE,
+) -> str:
+    """
+    Write narration plus optional music (at bg_music_volume, faded in and out over
+    fade seconds, lowered by the ducking fraction under speech) to a WAV file.
+    The mix lasts duration seconds, or as long as the narration.
+    """
+    narration = decode_pcm(tts_audio_path, sample_rate)
+    length = int(round(duration * sample_rate)) if duration is not None else len(narration)
+    mix = to_float(narration, length)
+
+    if bg_music_path:
+        try:
+            music = to_float(load_music_bed(bg_music_path, sample_rate), length)
+            gain = fade_envelope(length, sample_rate, fade, fade) * bg_music_volume
+            if ducking:
+                gain *= duck_envelope(mix, sample_rate, ducking)
+            mix += music * gain[:, None]
+        except Exception as e:
+            print(f"Failed to load background music: {e}")
+
+    if not output_path:
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        output_path = os.path.join(TEMP_DIR, f"mix_{uuid.uuid4().hex}.wav")
+    write_wav(output_path, mix, sample_rate)
+    return output_path
@@ -1,8 +1,15 @@
+import io
+import re
+import time
 import base64
 import os
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 from pydub import AudioSegment
+from utils import tracing
 
 load_dotenv()
 TIKTOK_SESSIONID = os.getenv("TIKTOK_SESSIONID")
@@ -10,6 +17,37 @@ API_BASE_URL = "https://api16-normal-v6.tiktokv.com/media/api/text/speech/invoke
 USER_AGENT = "com.zhiliaoapp.musically/2022600030 (Linux; U; Android 7.1.2; es_ES; SM-G988N; Build/NRD90M;tt-ok/3.12.13.1)"
 
 MAX_WORDS = 30
+MAX_CHARS = 200
+MAX_WORKERS = 4
+MAX_ATTEMPTS = 3
+REQUEST_TIMEOUT = 30
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Shared keep-alive session, sized for MAX_WORKERS parallel requests. It does not
+    retry by itself; synthesize_chunk is the one retry layer.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.headers.update({
+                'User-Agent': USER_AGENT,
+                'Cookie': f'sessionid={TIKTOK_SESSIONID}'
+            })
+        return _session
+
+def set_session(session) -> None:
+    """Use session (anything with a requests-style post()) for all chunk requests."""
+    global _session
+    with _session_lock:
+        _session = session
 
 def sanitize(text):
     text = text.replace("+", "plus").replace(" ", "+")
@@ -19,12 +57,9 @@ def sanitize(text):
 
 def request_tts_chunk(text, speaker):
     req_text = sanitize(text)
-    response = requests.post(
+    response = get_session().post(
         f"{API_BASE_URL}?text_speaker={speaker}&req_text={req_text}&speaker_map_type=0&aid=1233",
-        headers={
-            'User-Agent': USER_AGENT,
-            'Cookie': f'sessionid={TIKTOK_SESSIONID}'
-        }
+        timeout=REQUEST_TIMEOUT,
     )
     json_data = response.json()
 
@@ -34,26 +69,66 @@ def request_tts_chunk(text, speaker):
     vstr = json_data["data"]["v_str"]
     return base64.b64decode(vstr)
 
-def split_text(text, max_words=MAX_WORDS):
-    words = text.split()
-    return [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+def synthesize_chunk(text, speaker, attempts=MAX_ATTEMPTS) -> AudioSegment:
+    """Request one chunk (retrying HTTP and API-level failures) and decode it in memory."""
+    for attempt in range(1, attempts + 1):
+        try:
+            with tracing.span("tiktok.request_chunk", chars=len(text), attempt=attempt):
+                audio_data = request_tts_chunk(text, speaker)
+            tracing.count("tiktok.bytes_received", len(audio_data))
+            return AudioSegment.from_file(io.BytesIO(audio_data), format="mp3")
+        except Exception:
+            if attempt == attempts:
+                raise
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
+def _split_words(text, max_words, max_chars):
+    chunks, current = [], []
+    for word in text.split():
+        if current and (len(current) >= max_words or len(" ".join(current + [word])) > max_chars):
+            chunks.append(" ".join(current))
+            current = []
+        current.append(word)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
 
-def tts(text_speaker="en_us_002", req_text="TikTok Text To Speech", filename="voice.mp3"):
+def split_text(text, max_words=MAX_WORDS, max_chars=MAX_CHARS):
+    """Pack whole sentences into chunks of at most max_words / max_chars; overlong sentences fall back to words."""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+    chunks, current = [], ""
+    for sentence in sentences:
+        candidate = f"{current} {sentence}".strip()
+        if len(candidate.split()) <= max_words and len(candidate) <= max_chars:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        if len(sentence.split()) <= max_words and len(sentence) <= max_chars:
+            current = sentence
+        else:
+            *parts, current = _split_words(sentence, max_words, max_chars)
+            chunks.extend(parts)
+    if current:
+        chunks.append(current)
+    return chunks
+
+@tracing.traced("tiktok.tts")
+def tts(text_speaker="en_us_002", req_text="TikTok Text To Speech", filename="voice.mp3", max_workers=MAX_WORKERS):
     chunks = split_text(req_text)
     final_audio = AudioSegment.empty()
 
-    for i, chunk in enumerate(chunks):
-        print(f"Processing chunk {i+1}/{len(chunks)}: {chunk}")
-        try:
-            audio_data = request_tts_chunk(chunk, text_speaker)
-            temp_filename = f"temp_chunk_{i}.mp3"
-            with open(temp_filename, "wb") as temp_file:
-                temp_file.write(audio_data)
-            final_audio += AudioSegment.from_file(temp_filename)
-            os.remove(temp_filename)
-        except Exception as e:
-            print(f"Error processing chunk {i+1}: {e}")
-            continue
+    # Requests run in parallel; results are consumed in submission order to keep the script order
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(synthesize_chunk, chunk, text_speaker) for chunk in chunks]
+
+        for i, (chunk, future) in enumerate(zip(chunks, futures)):
+            print(f"Processing chunk {i+1}/{len(chunks)}: {chunk}")
+            try:
+                final_audio += future.result()
+            except Exception as e:
+                print(f"Error processing chunk {i+1}: {e}")
+                continue
 
     final_audio.export(filename, format="mp3")
     print(f"✅ Final audio saved to {filename}")
@@ -1,8 +1,9 @@
 import asyncio
-import edge_tts
 import os
 
 async def generate_tts(text, output_path="voiceover.mp3", voice="en-US-GuyNeural", rate="+15%"):
+    import edge_tts
+
     communicate = edge_tts.Communicate(text=text, voice=voice, rate=rate)
     await communicate.save(output_path)
     print(f"[+] Voiceover saved to {output_path}")
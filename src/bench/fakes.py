@@ -0,0 +1,103 @@
+"""
+Local stand-ins for OpenAI, ElevenLabs and the TikTok TTS API with canned
+responses and configurable latency, so the pipeline can be benchmarked offline.
+"""
+
+import time
+import base64
+from types import SimpleNamespace
+from config.prompts import create_ad_script, create_embeding_prompt
+
+CANNED_DESCRIPTION = (
+    "A compact stainless steel water bottle with a matte blue finish, a leak-proof "
+    "screw cap and a carrying loop, shown on a light background."
+)
+CANNED_EMBEDDING_PROMPT = "a person drinking from a blue water bottle outdoors on a sunny day"
+CANNED_SCRIPT = (
+    "Tired of lukewarm water on hot days? Meet the bottle that keeps it ice cold for 24 hours. "
+    "Leak-proof, light and tough enough for every trip. Grab yours today before they sell out!"
+)
+
+
+class _Completions:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def create(self, model, messages, max_tokens=None, **kwargs):
+        time.sleep(self.latency)
+        self.calls += 1
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        if system == create_embeding_prompt["system_prompt"]:
+            text = CANNED_EMBEDDING_PROMPT
+        elif system == create_ad_script["system_prompt"]:
+            text = CANNED_SCRIPT
+        else:
+            text = CANNED_DESCRIPTION
+        message = SimpleNamespace(content=text, role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, index=0)], model=model)
+
+
+class FakeOpenAI:
+    """Implements the chat.completions.create subset of the OpenAI client."""
+
+    def __init__(self, latency: float = 0.5):
+        self.chat = SimpleNamespace(completions=_Completions(latency))
+
+
+class _TextToSpeech:
+    def __init__(self, audio: bytes, latency: float, chunk_size: int):
+        self.audio = audio
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+    def stream(self, voice_id, text, model_id=None, output_format=None, voice_settings=None, **kwargs):
+        # Time to first byte, then the body in chunks like a streaming HTTP response
+        time.sleep(self.latency)
+        for start in range(0, len(self.audio), self.chunk_size):
+            yield self.audio[start:start + self.chunk_size]
+
+    convert = stream
+
+
+class FakeElevenLabs:
+    """Implements text_to_speech.stream / convert, always returning the same mp3."""
+
+    def __init__(self, audio: bytes, latency: float = 0.5, chunk_size: int = 4096):
+        self.text_to_speech = _TextToSpeech(audio, latency, chunk_size)
+
+
+class FakeTikTokSession:
+    """requests.Session stand-in whose post() answers like the TikTok TTS endpoint."""
+
+    def __init__(self, audio: bytes, latency: float = 0.3):
+        self.payload = {"data": {"v_str": base64.b64encode(audio).decode("ascii")}, "message": "success"}
+        self.latency = latency
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        time.sleep(self.latency)
+        self.calls += 1
+        return SimpleNamespace(json=lambda: self.payload, status_code=200)
+
+
+def install_fakes(narration_path: str, latency: float = 0.5) -> dict:
+    """
+    Swap the fakes into ai.openAI, audio.eleven_tts and audio.tiktok_tts.
+    narration_path is an mp3 returned for every TTS request. Returns the installed fakes.
+    """
+    from ai import openAI
+    from audio import eleven_tts, tiktok_tts
+
+    with open(narration_path, "rb") as f:
+        audio = f.read()
+
+    fakes = {
+        "openai": FakeOpenAI(latency),
+        "elevenlabs": FakeElevenLabs(audio, latency),
+        "tiktok": FakeTikTokSession(audio, latency),
+    }
+    openAI.set_client(fakes["openai"])
+    eleven_tts.set_client(fakes["elevenlabs"])
+    tiktok_tts.set_session(fakes["tiktok"])
+    return fakes
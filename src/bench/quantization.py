@@ -0,0 +1,37 @@
+"""
+Accuracy/memory trade-off of quantized library storage against float32.
+
+    python -m bench.quantization ASSETS_DIR "prompt one" "prompt two" [--k 20] [--output report.json]
+"""
+
+import json
+import argparse
+import numpy as np
+from video.clipSelector import ClipSelector
+from video.clip_index import quantization_report
+from video.library_index import iter_media_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("assets", help="Directory of library videos")
+    parser.add_argument("prompts", nargs="+", help="Text prompts used as ranking queries")
+    parser.add_argument("--k", type=int, default=20, help="Top-k compared between storage types")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    selector = ClipSelector(index_storage="float32")
+    video_paths = list(iter_media_files(args.assets))
+    index = selector.build_index(video_paths)
+    queries = np.vstack([selector.get_text_embedding(prompt) for prompt in args.prompts])
+
+    report = quantization_report(index, queries, k=args.k)
+    print(f"{len(index)} segments, {len(args.prompts)} queries")
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Offline end-to-end benchmark: ranking, rendering and full create_ad runs against
+synthetic libraries of several sizes, with OpenAI / ElevenLabs / TikTok replaced
+by local fakes (see bench.fakes). Every (stage, size) runs in a fresh interpreter
+with its own cache directory, so peak RSS and cold/warm timings are isolated.
+
+    python -m bench.run_pipeline [--sizes 4,16,64] [--stages ...] [--latency 0.5]
+                                 [--model ViT-B-32] [--backend ffmpeg] [--output results.json]
+                                 [--trace-dir traces/]
+
+Results are JSON (commit, config and one entry per stage and size) for comparing commits.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+from typing import Any, Dict, List
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = (
+    "ranked_clips_cold", "ranked_clips_warm",
+    "assemble_moviepy", "assemble_ffmpeg", "assemble_ffmpeg-chunked",
+    "create_ad",
+)
+PROMPT = "a person drinking from a blue water bottle outdoors on a sunny day"
+AD_SECONDS = 15.0
+
+
+def git_commit() -> Dict[str, Any]:
+    def git(*args):
+        result = subprocess.run(["git", *args], cwd=SRC_DIR, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    status = git("status", "--porcelain")
+    return {"sha": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def prepare_media(work_dir: str, sizes: List[int]) -> Dict[str, Any]:
+    """Synthetic library (one directory of symlinks per size), product image, narration and music."""
+    from bench.synthetic import make_library, make_audio, make_product_image
+
+    media_dir = os.path.join(work_dir, "media")
+    library = make_library(os.path.join(media_dir, "videos"), max(sizes))
+    paths = sorted(library)
+
+    libraries = {}
+    for size in sizes:
+        size_dir = os.path.join(media_dir, f"library_{size}")
+        os.makedirs(size_dir, exist_ok=True)
+        for path in paths[:size]:
+            link = os.path.join(size_dir, os.path.basename(path))
+            if not os.path.lexists(link):
+                os.symlink(os.path.abspath(path), link)
+        libraries[str(size)] = size_dir
+
+    def once(path, make):
+        return path if os.path.exists(path) else make(path)
+
+    return {
+        "scenes": {path: scenes for path, scenes in library.items()},
+        "libraries": libraries,
+        "product_image": once(os.path.join(media_dir, "product.png"), make_product_image),
+        "narration": once(os.path.join(media_dir, "narration.mp3"), lambda p: make_audio(p, AD_SECONDS)),
+        "music": once(os.path.join(media_dir, "music.mp3"), lambda p: make_audio(p, AD_SECONDS + 5, frequency=220)),
+    }
+
+
+def synthetic_ranking(scenes: Dict[str, list], size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Ranked clips built from the ground-truth scenes, so render benchmarks don't need CLIP."""
+    rng = random.Random(seed)
+    clips = []
+    for path in sorted(scenes)[:size]:
+        for start, end in scenes[path]:
+            clips.append({
+                "start": start, "end": end, "duration": end - start,
+                "similarity": rng.uniform(0.1, 0.35), "source": os.path.abspath(path),
+            })
+    return sorted(clips, key=lambda c: c["similarity"], reverse=True)
+
+
+def timed(stages: Dict[str, float], name: str, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        stages[name] = time.perf_counter() - start
+
+
+def bench_ranked_clips(media: Dict[str, Any], size: int, args) -> Dict[str, Any]:
+    from main import list_video_paths
+    from video.clipSelector import ClipSelector
+
+    stages = {}
+    selector = ClipSelector()
+    timed(stages, "model_load", selector.warmup)
+    paths = list_video_paths(media["libraries"][str(size)])
+    index = timed(stages, "build_index", selector.build_index, paths)
+    ranked = timed(stages, "rank", selector.rank_index, index, PROMPT)
+    return {
+        "stages": stages,
+        "segments": len(index),
+        "throughput": {
+            "videos_per_s": len(paths) / stages["build_index"] if stages["build_index"] else None,
+            "segments_per_s": len(index) / stages["build_index"] if stages["build_index"] else None,
+        },
+        "ranked": len(ranked),
+    }
+
+
+def bench_assemble(media: Dict[str, Any], size: int, args, backend: str) -> Dict[str, Any]:
+    from main import render_kwargs
+    from video.assembler import assemble_final_video
+    from bench.fakes import CANNED_SCRIPT
+
+    stages = {}
+    output = os.path.join(args.work_dir, "output", f"assemble_{backend}_{size}.mp4")
+    timed(
+        stages, "render", assemble_final_video,
+        ranked_clips=synthetic_ranking(media["scenes"], size),
+        tts_audio_path=media["narration"],
+        ad_script=CANNED_SCRIPT,
+        output_path=output,
+        bg_music_path=media["music"],
+        **render_kwargs(backend),
+    )
+    return {
+        "stages": stages,
+        "throughput": {"output_s_per_s": AD_SECONDS / stages["render"] if stages["render"] else None},
+        "output_bytes": os.path.getsize(output),
+    }
+
+
+def bench_create_ad(media: Dict[str, Any], size: int, args) -> Dict[str, Any]:
+    import main
+    from bench.fakes import install_fakes
+    from pipeline.stage_graph import StageGraph
+
+    install_fakes(media["narration"], latency=args.latency)
+
+    # Handed to create_ad to keep its per-stage timeline
+    graph = StageGraph(name="create_ad")
+    output = os.path.join(args.work_dir, "output", f"create_ad_{size}.mp4")
+    start = time.perf_counter()
+    main.create_ad(
+        media["product_image"], media["libraries"][str(size)],
+        background_music=media["music"], output_path=output, render_backend=args.backend, graph=graph,
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "stages": {name: t["duration"] for name, t in graph.timeline.items()},
+        "critical_path": graph.critical_path(),
+        "throughput": {"ads_per_hour": 3600 / elapsed if elapsed else None},
+    }
+
+
+def worker(args) -> Dict[str, Any]:
+    """Runs inside the fresh interpreter; DROPADS_* env vars are already set by the parent."""
+    from utils import tracing
+
+    with open(os.path.join(args.work_dir, "media.json"), "r") as f:
+        media = json.load(f)
+
+    start = time.perf_counter()
+    if args.worker.startswith("ranked_clips"):
+        result = bench_ranked_clips(media, args.size, args)
+    elif args.worker.startswith("assemble_"):
+        result = bench_assemble(media, args.size, args, backend=args.worker[len("assemble_"):])
+    elif args.worker == "create_ad":
+        result = bench_create_ad(media, args.size, args)
+    else:
+        raise ValueError(f"Unknown stage {args.worker}")
+
+    result.update({"stage": args.worker, "size": args.size, "wall_s": time.perf_counter() - start})
+    result.update(peak_rss_mb())
+    if tracing.enabled():
+        result["counters"] = tracing.counters()
+    return result
+
+
+def run_worker(stage: str, size: int, args) -> Dict[str, Any]:
+    cache_dir = os.path.join(args.work_dir, "cache", f"{stage.replace('_warm', '').replace('_cold', '')}_{size}")
+    if not stage.endswith("_warm") and os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+
+    env = dict(os.environ)
+    env["DROPADS_CACHE_DIR"] = cache_dir
+    env["DROPADS_TEMP_DIR"] = os.path.join(args.work_dir, "temp")
+    if args.model:
+        env["DROPADS_CLIP_MODEL"] = args.model
+    if args.pretrained:
+        env["DROPADS_CLIP_PRETRAINED"] = args.pretrained
+    if args.trace_dir:
+        env["DROPADS_TRACE"] = os.path.join(os.path.abspath(args.trace_dir), f"{stage}_{size}.json")
+
+    cmd = [
+        sys.executable, "-m", "bench.run_pipeline",
+        "--worker", stage, "--size", str(size), "--work-dir", args.work_dir,
+        "--latency", str(args.latency), "--backend", args.backend,
+    ]
+    result = subprocess.run(cmd, cwd=SRC_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"stage": stage, "size": size, "error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="4,16,64", help="Comma separated library sizes (number of videos)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma separated subset of {', '.join(STAGES)}")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds each fake API call takes")
+    parser.add_argument("--model", help="CLIP model name (e.g. ViT-B-32 for quicker runs)")
+    parser.add_argument("--pretrained", help="CLIP pretrained weights tag")
+    parser.add_argument("--backend", choices=("moviepy", "ffmpeg", "ffmpeg-cached"), default="ffmpeg",
+                        help="Render backend used by the create_ad stage")
+    parser.add_argument("--work-dir", default=os.path.join(SRC_DIR, "cache", "bench"),
+                        help="Synthetic media, caches and outputs; media is reused across runs")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--trace-dir", help="Write a Chrome trace per stage and size into this directory")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.work_dir = os.path.abspath(args.work_dir)
+
+    if args.worker:
+        print(json.dumps(worker(args)))
+        return
+
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    stages = [s for s in args.stages.split(",") if s]
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"Unknown stage {stage}")
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    print(f"Preparing synthetic media for library sizes {sizes}...")
+    media = prepare_media(args.work_dir, sizes)
+    with open(os.path.join(args.work_dir, "media.json"), "w") as f:
+        json.dump(media, f)
+
+    results = []
+    for size in sizes:
+        for stage in stages:
+            result = run_worker(stage, size, args)
+            status = f"error: {result['error']}" if "error" in result else \
+                f"{result['wall_s']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB"
+            print(f"{stage:<20} size={size:<5} {status}")
+            results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "sizes": sizes, "latency": args.latency, "model": args.model,
+            "pretrained": args.pretrained, "backend": args.backend,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
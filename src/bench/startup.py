@@ -0,0 +1,101 @@
+"""
+Startup benchmark: import time of the pipeline and time to the first CLIP embedding,
+each measured in a fresh interpreter.
+
+    python -m bench.startup [--repeat 3] [--skip-model] [--output startup.json] [--baseline old.json]
+
+With --baseline the run fails (exit code 1) when a metric regresses by more than --tolerance.
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBES = {
+    "import_main_s": """
+import time
+t = time.perf_counter()
+import main
+print(time.perf_counter() - t)
+""",
+    "import_clip_selector_s": """
+import time
+t = time.perf_counter()
+from video.clipSelector import ClipSelector
+ClipSelector(store_dir=None, scene_store_dir=None)
+print(time.perf_counter() - t)
+""",
+    "first_text_embedding_s": """
+import time
+t = time.perf_counter()
+from video.clipSelector import ClipSelector
+ClipSelector(store_dir=None, scene_store_dir=None).get_text_embedding("a product on a table")
+print(time.perf_counter() - t)
+""",
+}
+
+MODEL_PROBES = {"first_text_embedding_s"}
+
+
+def run_probe(code: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(repeat: int = 3, skip_model: bool = False) -> dict:
+    results = {}
+    for name, code in PROBES.items():
+        if skip_model and name in MODEL_PROBES:
+            continue
+        samples = [run_probe(code) for _ in range(repeat)]
+        results[name] = statistics.median(samples)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if old and value > old * (1 + tolerance):
+            regressions.append(f"{name}: {old:.3f}s -> {value:.3f}s (+{(value / old - 1):.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per probe; the median is reported")
+    parser.add_argument("--skip-model", action="store_true", help="Only measure imports, don't load CLIP")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown vs. baseline")
+    args = parser.parse_args()
+
+    results = measure(args.repeat, args.skip_model)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Synthetic media for benchmarks: videos with known scene cuts, silent/tonal audio
+and a product image, all generated locally with ffmpeg and PIL.
+"""
+
+import os
+import random
+from typing import Dict, List, Tuple
+from utils.ffmpeg import run_ffmpeg
+
+# Saturated, well separated colors so ContentDetector reliably cuts between scenes
+PALETTE = [
+    "0xE53935", "0x1E88E5", "0x43A047", "0xFDD835", "0x8E24AA",
+    "0xFB8C00", "0x00ACC1", "0x6D4C41", "0xD81B60", "0x3949AB",
+]
+
+
+def make_video(
+    path: str,
+    scene_durations: List[float],
+    size: Tuple[int, int] = (640, 360),
+    fps: int = 30,
+    seed: int = 0,
+) -> List[float]:
+    """
+    Write an H.264 video made of solid-color scenes with animated noise texture.
+    Returns the ground-truth scenes as (start, end) seconds.
+    """
+    rng = random.Random(seed)
+    colors = rng.sample(PALETTE, k=min(len(PALETTE), len(scene_durations)))
+    width, height = size
+
+    args, filters = [], []
+    for i, duration in enumerate(scene_durations):
+        color = colors[i % len(colors)]
+        args += ["-f", "lavfi", "-i", f"color=c={color}:s={width}x{height}:r={fps}:d={duration:.3f}"]
+        filters.append(f"[{i}:v]noise=alls=12:allf=t+u,format=yuv420p[s{i}]")
+
+    inputs = "".join(f"[s{i}]" for i in range(len(scene_durations)))
+    filters.append(f"{inputs}concat=n={len(scene_durations)}:v=1:a=0[out]")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    run_ffmpeg([
+        *args,
+        "-filter_complex", ";".join(filters),
+        "-map", "[out]",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", str(fps * 2), "-pix_fmt", "yuv420p",
+        path,
+    ])
+
+    return scene_bounds(scene_durations)
+
+
+def scene_bounds(scene_durations: List[float]) -> List[Tuple[float, float]]:
+    scenes, t = [], 0.0
+    for duration in scene_durations:
+        scenes.append((round(t, 3), round(t + duration, 3)))
+        t += duration
+    return scenes
+
+
+def make_library(
+    directory: str,
+    num_videos: int,
+    scenes_per_video: Tuple[int, int] = (2, 5),
+    scene_seconds: Tuple[float, float] = (1.5, 6.0),
+    seed: int = 0,
+) -> Dict[str, List[Tuple[float, float]]]:
+    """Generate num_videos videos (reusing ones already present); returns {path: scenes}."""
+    rng = random.Random(seed)
+    library = {}
+    for i in range(num_videos):
+        durations = [round(rng.uniform(*scene_seconds), 2) for _ in range(rng.randint(*scenes_per_video))]
+        path = os.path.join(directory, f"synthetic_{i:04d}.mp4")
+        if os.path.exists(path):
+            library[path] = scene_bounds(durations)
+        else:
+            library[path] = make_video(path, durations, seed=seed + i)
+    return library
+
+
+def make_audio(path: str, duration: float, frequency: int = 0, bitrate: str = "32k") -> str:
+    """mp3 of silence (frequency=0) or a sine tone, e.g. as fake narration or music bed."""
+    source = f"sine=frequency={frequency}:duration={duration:.3f}" if frequency else f"anullsrc=r=22050:cl=mono:d={duration:.3f}"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    run_ffmpeg(["-f", "lavfi", "-i", source, "-t", f"{duration:.3f}", "-c:a", "libmp3lame", "-b:a", bitrate, path])
+    return path
+
+
+def make_product_image(path: str, size: Tuple[int, int] = (1600, 1600)) -> str:
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", size, (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    w, h = size
+    draw.ellipse((w * 0.25, h * 0.25, w * 0.75, h * 0.75), fill=(30, 136, 229))
+    draw.rectangle((w * 0.45, h * 0.1, w * 0.55, h * 0.3), fill=(67, 160, 71))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    image.save(path)
+    return path
@@ -0,0 +1,57 @@
+import os
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Root directory for every on-disk cache (embeddings, scenes, responses, renders)
+CACHE_DIR = os.getenv("DROPADS_CACHE_DIR", os.path.join(SRC_DIR, "cache"))
+
+EMBEDDING_STORE_DIR = os.path.join(CACHE_DIR, "embeddings")
+SCENE_STORE_DIR = os.path.join(CACHE_DIR, "scenes")
+
+# OpenAI response cache; set DROPADS_NO_RESPONSE_CACHE=1 to always hit the API
+RESPONSE_CACHE_DIR = os.path.join(CACHE_DIR, "responses")
+RESPONSE_CACHE_TTL = float(os.getenv("DROPADS_RESPONSE_CACHE_TTL", 30 * 24 * 3600))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("DROPADS_RESPONSE_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+RESPONSE_CACHE_DISABLED = os.getenv("DROPADS_NO_RESPONSE_CACHE", "") not in ("", "0")
+
+# Product images are downscaled to this longest side before upload
+UPLOAD_IMAGE_MAX_SIDE = int(os.getenv("DROPADS_UPLOAD_IMAGE_MAX_SIDE", 1024))
+
+# Scratch files of a single job (narration, mixes, ...)
+TEMP_DIR = os.getenv("DROPADS_TEMP_DIR", "temp")
+
+# Synthesized narration keyed by text, voice and model settings
+TTS_CACHE_DIR = os.path.join(CACHE_DIR, "tts")
+TTS_CACHE_MAX_BYTES = int(os.getenv("DROPADS_TTS_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+
+# Pre-normalized (trimmed, scaled, re-encoded) segments reused across renders
+SEGMENT_CACHE_DIR = os.path.join(CACHE_DIR, "segments")
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv("DROPADS_SEGMENT_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+
+# CLIP model used for ranking; smaller open_clip models (e.g. ViT-B-32) trade accuracy for speed
+CLIP_MODEL_NAME = os.getenv("DROPADS_CLIP_MODEL", "ViT-L-14")
+CLIP_PRETRAINED = os.getenv("DROPADS_CLIP_PRETRAINED", "openai")
+# open_clip precision: fp32, fp16 or bf16 (half precision is mainly useful on GPU)
+CLIP_PRECISION = os.getenv("DROPADS_CLIP_PRECISION", "fp32")
+
+# In-memory library index storage: float32, float16 or int8 (per-vector scale)
+CLIP_INDEX_STORAGE = os.getenv("DROPADS_CLIP_INDEX_STORAGE", "float32")
+
+# Write spans and counters to this file (".json" for a Chrome trace, else JSON lines); unset disables tracing
+TRACE_PATH = os.getenv("DROPADS_TRACE", "")
+
+# Persisted per-library indexes (file manifest plus ClipIndex), one directory per asset root
+LIBRARY_INDEX_DIR = os.path.join(CACHE_DIR, "libraries")
+
+# Segment frame sampling: "uniform" embeds num_frames per segment; "adaptive" looks at up to
+# CLIP_MAX_FRAMES but skips near-identical frames and embeds byte-identical footage once.
+# Each mode keeps its own embedding store namespace, so switching never discards the other's vectors
+CLIP_SAMPLING = os.getenv("DROPADS_CLIP_SAMPLING", "uniform")
+CLIP_MAX_FRAMES = int(os.getenv("DROPADS_CLIP_MAX_FRAMES", 8))
+
+# Rasterized caption sprites keyed by text, font and size
+CAPTION_CACHE_DIR = os.path.join(CACHE_DIR, "captions")
+
+# Background music decoded to PCM (.npy), reused by every ad that uses the same track
+MUSIC_CACHE_DIR = os.path.join(CACHE_DIR, "music")
+MUSIC_CACHE_MAX_BYTES = int(os.getenv("DROPADS_MUSIC_CACHE_MAX_BYTES", 1024 ** 3))
@@ -4,14 +4,62 @@ DropAds: Automated TikTok Ad Generator for Dropshipping Products
 """
 
 import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
 from video.assembler import assemble_final_video
-from video.clipSelector import ClipSelector
+from video.library_index import LibraryIndex, iter_media_files
 from audio.tts import create_ad_voiceover
-from audio.eleven_tts import tts
-from ai.openAI import prompt_image, prompt_llm
+from audio.eleven_tts import estimate_speech_duration, tts
+from ai.openAI import prompt_image, prompt_llm, cache_stats
 from config.prompts import create_product_description, create_ad_script, create_embeding_prompt
+from pipeline.stage_graph import StageGraph
+from utils import tracing
+from utils.ffmpeg import probe
+
+_clip_controller = None
+_clip_controller_lock = threading.Lock()
+
+
+def get_clip_controller():
+    """The process-wide ClipSelector, built on first use (importing it pulls in torch and open_clip)."""
+    global _clip_controller
+    with _clip_controller_lock:
+        if _clip_controller is None:
+            from video.clipSelector import ClipSelector
+
+            _clip_controller = ClipSelector()
+        return _clip_controller
+
+
+def list_video_paths(media_assets_dir: str) -> List[str]:
+    return list(iter_media_files(media_assets_dir))
+
+
+def render_kwargs(render_backend: str, render_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    assemble_final_video arguments for a backend name: "moviepy", "ffmpeg",
+    "ffmpeg-cached" (segment cache) or "ffmpeg-chunked" (parallel chunk encodes).
+    render_options (x264_preset, crf, encode_threads, render_workers, captions,
+    music_ducking) override the defaults.
+    """
+    kwargs = {
+        "backend": "ffmpeg" if render_backend.startswith("ffmpeg") else render_backend,
+        "use_segment_cache": render_backend == "ffmpeg-cached",
+    }
+    if render_backend == "ffmpeg-chunked":
+        kwargs["render_workers"] = os.cpu_count() or 1
+    kwargs.update({k: v for k, v in (render_options or {}).items() if v is not None})
+    return kwargs
+
+
+def update_library_index(media_assets_dir: str, rebuild: bool = False):
+    """Index only what changed in media_assets_dir since the last run and return the full ClipIndex."""
+    return LibraryIndex(media_assets_dir, get_clip_controller()).update(rebuild=rebuild)
 
-clip_controller = ClipSelector()
 
 def create_ad(
     product_image_path: str,
@@ -19,7 +67,13 @@ def create_ad(
     target_length: int = 30,
     background_music: str = None,
     output_path: str = "output/final_ad.mp4",
-    
+    clip_index=None,
+    executors=None,
+    render_backend: str = "moviepy",
+    render_options: Optional[Dict[str, Any]] = None,
+    align_script: bool = False,
+    stream: bool = False,
+    graph: Optional[StageGraph] = None,
 ):
     """
     Create a TikTok ad for a dropshipping product.
@@ -29,49 +83,299 @@ def create_ad(
         media_assets_dir: Directory containing additional media assets (videos, images)
         target_length: Target length of the final ad in seconds
         output_path: Path where the final ad will be saved
+        clip_index: Prebuilt ClipIndex of media_assets_dir to rank against (incrementally updated here if None)
+        executors: Optional {"network": ..., "inference": ..., "encode": ...} executors shared across ads
+        render_backend: "moviepy", "ffmpeg", "ffmpeg-cached" or "ffmpeg-chunked" (see render_kwargs)
+        render_options: Render overrides (x264_preset, crf, encode_threads, render_workers, captions, music_ducking)
+        align_script: Match clips to each line of the script instead of ranking the library
+            against one embedding prompt
+        stream: Rank videos as they are found instead of loading the whole library index,
+            keeping memory bounded and stopping once there is enough matching footage
+            for the narration (ignored when clip_index is given)
+        graph: Empty StageGraph to run the stages in, so the caller can read its timeline
+            afterwards (a fresh one by default)
     """
+    if align_script and stream:
+        raise ValueError("align_script needs the whole library index and can't be combined with stream")
+    stream = stream and clip_index is None
+    graph = graph if graph is not None else StageGraph(name="create_ad")
+
     # Step 1: Detect product and generate description
-    print("Detecting product...")
-    print("Generating product description...")
-    product_description = prompt_image(user_prompt=create_product_description['user_prompt'],system_prompt=create_product_description['system_prompt'], image_path=product_image_path)
-    print(f"Product description: {product_description} ")
+    def product_description():
+        print("Detecting product...")
+        print("Generating product description...")
+        description = prompt_image(user_prompt=create_product_description['user_prompt'],system_prompt=create_product_description['system_prompt'], image_path=product_image_path)
+        print(f"Product description: {description} ")
+        return description
 
-    embeding_prompt = prompt_llm(prompt=create_embeding_prompt['user_prompt'].format(product_description=product_description), system_message=create_embeding_prompt['system_prompt'])
-    print(f"Clips embeding prompt: {embeding_prompt} - writing ad script")
-    
-    ad_script = prompt_llm(prompt=create_ad_script['user_prompt'].format(product_description=product_description), system_message=create_ad_script['system_prompt'])
-    print(f"Ad script: {ad_script}")
-
-    # Step 2: Ranking video clips
-    print("ranking video clips...")
-    video_paths = [os.path.join(media_assets_dir, f) for f in os.listdir(media_assets_dir) 
-                  if f.endswith(('.mp4', '.mov', '.avi'))]
-    ranked_clips = clip_controller.get_ranked_clips(video_paths=video_paths, embedding_prompt=embeding_prompt)
-    
-    # Step 4: Generate audio (TTS)
-    print("Generating speech audio...")
-    # tts_path = create_ad_voiceover(ad_input=ad_script, output_path=os.path.join("temp", "tts.mp3"))
-    tts_path = tts(text=ad_script, filename=os.path.join("temp", "tts.mp3"))
-    
-    print("Assembling final video...")
-    final_video_path = assemble_final_video(
-        ranked_clips=ranked_clips,
-        tts_audio_path=tts_path,
-        ad_script=ad_script,  # the raw string or list
-        output_path=output_path, bg_music_path=background_music
-    )
-    print(f"Ad generation complete! Saved to: {final_video_path}")
+    # Embedding prompt and ad script only depend on the description, so they run in parallel
+    def embeding_prompt(product_description):
+        prompt = prompt_llm(prompt=create_embeding_prompt['user_prompt'].format(product_description=product_description), system_message=create_embeding_prompt['system_prompt'])
+        print(f"Clips embeding prompt: {prompt}")
+        return prompt
+
+    def ad_script(product_description):
+        script = prompt_llm(prompt=create_ad_script['user_prompt'].format(product_description=product_description), system_message=create_ad_script['system_prompt'])
+        print(f"Ad script: {script}")
+        return script
+
+    # Step 2: Segment and embed the library while the LLM calls are in flight, then rank
+    def library_index():
+        if clip_index is not None:
+            return clip_index
+        print("Indexing video clips...")
+        return update_library_index(media_assets_dir)
+
+    # Load CLIP while the LLM calls are in flight; a no-op once the model is warm
+    def clip_model():
+        get_clip_controller().warmup()
+
+    def ranked_clips(library_index, embeding_prompt, clip_model):
+        print("ranking video clips...")
+        return get_clip_controller().rank_index(library_index, embeding_prompt)
+
+    # Streaming: walk the asset tree lazily and stop once the narration can be filled.
+    # This runs alongside TTS, so it goes by the script's estimated length (with some
+    # slack); assembly still uses the real narration
+    def streamed_clips(embeding_prompt, ad_script, clip_model):
+        print("Ranking video clips as they are found...")
+        return get_clip_controller().stream_ranked_clips(
+            iter_media_files(media_assets_dir), embeding_prompt, duration=1.25 * estimate_speech_duration(ad_script))
+
+    # Alternatively give every script line its own clips; line timing uses the same probed
+    # narration length as the assembler, so cuts and captions stay in step
+    def clip_timeline(library_index, ad_script, tts_path, clip_model):
+        print("Aligning video clips to the script...")
+        return get_clip_controller().align_script(library_index, ad_script, probe(tts_path)["duration"])
+
+    # Step 3: Generate audio (TTS), concurrently with clip ranking
+    def tts_path(ad_script):
+        print("Generating speech audio...")
+        # return create_ad_voiceover(ad_input=ad_script, output_path=os.path.join("temp", "tts.mp3"))
+        # tts picks a unique path per ad, so concurrent ads never share a file
+        return tts(text=ad_script)
+
+    # Step 4: Assemble as soon as clips and narration are both ready
+    def final_video_path(tts_path, ad_script, ranked_clips=None, clip_timeline=None):
+        print("Assembling final video...")
+        return assemble_final_video(
+            ranked_clips=ranked_clips,
+            timeline=clip_timeline,
+            tts_audio_path=tts_path,
+            ad_script=ad_script,  # the raw string or list
+            output_path=output_path, bg_music_path=background_music,
+            **render_kwargs(render_backend, render_options),
+        )
+
+    # API calls, CLIP work and encoding go to separate pools when batching or serving
+    graph.add("product_description", product_description, pool="network")
+    graph.add("ad_script", ad_script, deps=["product_description"], pool="network")
+    graph.add("clip_model", clip_model, pool="inference")
+    graph.add("tts_path", tts_path, deps=["ad_script"], pool="network")
+    if stream:
+        clips = "ranked_clips"
+        graph.add("embeding_prompt", embeding_prompt, deps=["product_description"], pool="network")
+        graph.add(clips, streamed_clips, deps=["embeding_prompt", "ad_script", "clip_model"], pool="inference")
+    elif align_script:
+        clips = "clip_timeline"
+        graph.add("library_index", library_index, pool="inference")
+        graph.add(clips, clip_timeline, deps=["library_index", "ad_script", "tts_path", "clip_model"], pool="inference")
+    else:
+        clips = "ranked_clips"
+        graph.add("library_index", library_index, pool="inference")
+        graph.add("embeding_prompt", embeding_prompt, deps=["product_description"], pool="network")
+        graph.add(clips, ranked_clips, deps=["library_index", "embeding_prompt", "clip_model"], pool="inference")
+    graph.add("final_video_path", final_video_path, deps=[clips, "tts_path", "ad_script"], pool="encode")
+
+    with tracing.span("create_ad", product=os.path.basename(product_image_path), backend=render_backend):
+        results = graph.run(executors=executors)
+    tracing.count("ads.created")
+    print(graph.format_timeline())
+    print(f"Ad generation complete! Saved to: {results['final_video_path']}")
+    return results['final_video_path']
+
+
+def create_ads(
+    products: List[Dict[str, Any]],
+    media_assets_dir: str,
+    max_workers: int = 4,
+    network_workers: int = 8,
+    cpu_workers: int = 1,
+    render_backend: str = "moviepy",
+    render_options: Optional[Dict[str, Any]] = None,
+    align_script: bool = False,
+) -> Dict[str, Any]:
+    """
+    Generate ads for many products against one clip library.
+
+    The CLIP model is warmed up and the library index built once. Up to max_workers products are
+    in flight; their LLM/TTS stages share a network pool while ranking and rendering
+    share a CPU pool, so one product's API calls overlap another's render.
+
+    Args:
+        products: Dicts with 'image' and optional 'output', 'background_music', 'target_length'
+        media_assets_dir: Directory containing the shared media assets
+        max_workers: Products processed concurrently
+        network_workers: Threads for LLM and TTS requests
+        cpu_workers: Threads for ranking and rendering
+        render_backend: "moviepy", "ffmpeg", "ffmpeg-cached" or "ffmpeg-chunked" (see render_kwargs)
+        render_options: Render overrides (x264_preset, crf, encode_threads, render_workers, captions, music_ducking)
+        align_script: Match clips to each script line (see create_ad)
+
+    Returns:
+        Dict with 'succeeded' and 'failed' entries, 'elapsed' seconds and 'ads_per_hour'
+    """
+    start = time.perf_counter()
+    with tracing.span("prepare_library", assets=media_assets_dir):
+        get_clip_controller().warmup()
+        print(f"Indexing clip library {media_assets_dir}...")
+        clip_index = update_library_index(media_assets_dir)
+
+    # Ranking and rendering share the cpu_workers threads
+    cpu = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="cpu")
+    executors = {
+        "network": ThreadPoolExecutor(max_workers=network_workers, thread_name_prefix="network"),
+        "inference": cpu,
+        "encode": cpu,
+    }
+    succeeded, failed = [], []
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="product") as pool:
+            futures = {}
+            for product in products:
+                image = product["image"]
+                output = product.get("output") or os.path.join(
+                    "output", f"{os.path.splitext(os.path.basename(image))[0]}.mp4")
+                futures[pool.submit(
+                    create_ad,
+                    image,
+                    media_assets_dir,
+                    target_length=product.get("target_length", 30),
+                    background_music=product.get("background_music"),
+                    output_path=output,
+                    clip_index=clip_index,
+                    executors=executors,
+                    render_backend=render_backend,
+                    render_options=render_options,
+                    align_script=align_script,
+                )] = image
+
+            # A failing product is recorded and the rest of the batch keeps going
+            for future in as_completed(futures):
+                image = futures[future]
+                try:
+                    succeeded.append({"image": image, "output": future.result()})
+                except Exception as e:
+                    print(f"Failed to create ad for {image}: {e}")
+                    failed.append({"image": image, "error": repr(e)})
+    finally:
+        for executor in set(executors.values()):
+            executor.shutdown(wait=True)
+
+    elapsed = time.perf_counter() - start
+    ads_per_hour = len(succeeded) / elapsed * 3600 if elapsed > 0 else 0.0
+    print(f"Batch done: {len(succeeded)} ads, {len(failed)} failed in {elapsed:.1f}s ({ads_per_hour:.1f} ads/hour)")
+    for failure in failed:
+        print(f"  FAILED {failure['image']}: {failure['error']}")
+    print(f"OpenAI response cache: {cache_stats()}")
+    if tracing.enabled():
+        tracing.flush()
+        print(f"Counters: {tracing.counters()}")
+
+    return {"succeeded": succeeded, "failed": failed, "elapsed": elapsed, "ads_per_hour": ads_per_hour}
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Any]:
+    """
+    A manifest is either a JSON list of products or an object with a 'products' list
+    and optional 'media_assets_dir' / 'background_music' defaults. Relative paths are
+    resolved against the manifest's directory.
+    """
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"products": manifest}
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    def resolve(path):
+        return path if not path or os.path.isabs(path) else os.path.join(base_dir, path)
+
+    products = []
+    for product in manifest["products"]:
+        if isinstance(product, str):
+            product = {"image": product}
+        product = dict(product)
+        product.setdefault("background_music", manifest.get("background_music"))
+        for key in ("image", "output", "background_music"):
+            if product.get(key):
+                product[key] = resolve(product[key])
+        products.append(product)
+
+    manifest["products"] = products
+    if manifest.get("media_assets_dir"):
+        manifest["media_assets_dir"] = resolve(manifest["media_assets_dir"])
+    return manifest
 
 
 def main():
+    parser = argparse.ArgumentParser(description="DropAds: automated TikTok ad generator")
+    parser.add_argument("--manifest", help="JSON manifest of products to generate ads for in one batch")
+    parser.add_argument("--assets", help="Media assets directory (overrides the manifest's media_assets_dir)")
+    parser.add_argument("--workers", type=int, default=4, help="Products processed concurrently in batch mode")
+    parser.add_argument("--network-workers", type=int, default=8, help="Threads for LLM/TTS requests in batch mode")
+    parser.add_argument("--cpu-workers", type=int, default=1, help="Threads for ranking/rendering in batch mode")
+    parser.add_argument("--backend", choices=("moviepy", "ffmpeg", "ffmpeg-cached", "ffmpeg-chunked"), default="moviepy",
+                        help="Render backend; ffmpeg-cached concats pre-rendered library segments, "
+                             "ffmpeg-chunked encodes chunks of the timeline in parallel")
+    parser.add_argument("--preset", help="libx264 preset, e.g. veryfast for speed or slow for quality")
+    parser.add_argument("--crf", type=int, help="libx264 CRF (lower is better quality, default 23)")
+    parser.add_argument("--threads", type=int, help="Encoder threads per ffmpeg process (default: automatic)")
+    parser.add_argument("--render-workers", type=int, help="Parallel chunk encodes for ffmpeg-chunked (default: cores)")
+    parser.add_argument("--captions", action="store_true", help="Burn the ad script in as captions")
+    parser.add_argument("--align", action="store_true", help="Pick clips per script line instead of per ad")
+    parser.add_argument("--stream", action="store_true",
+                        help="Rank videos as they are found with bounded memory, stopping once the narration is covered")
+    parser.add_argument("--duck", type=float, help="Lower the music by this fraction (0-1) while the narration speaks")
+    parser.add_argument("--index", action="store_true",
+                        help="Only update the persisted index of the assets directory (new/changed/removed files) and exit")
+    parser.add_argument("--rebuild-index", action="store_true", help="With --index, re-index every file")
+    args = parser.parse_args()
+    render_options = {
+        "x264_preset": args.preset, "crf": args.crf,
+        "encode_threads": args.threads, "render_workers": args.render_workers,
+        "captions": args.captions or None, "music_ducking": args.duck,
+    }
 
     current_path = os.path.dirname(os.path.abspath(__file__))
     product_image = os.path.join(current_path, 'assets', 'images', 'image.png')
     background_music = os.path.join(current_path, 'assets', 'audio', 'chill.mp3')
     media_dir = os.path.join(current_path, 'assets', 'clips')
     output_path = os.path.join(current_path, 'output', 'final.mp4')
-    
-    create_ad(product_image, media_dir,background_music=background_music, output_path=output_path)
+
+    if args.index:
+        index = update_library_index(args.assets or media_dir, rebuild=args.rebuild_index)
+        print(f"Library index holds {len(index)} segments from {len(index.sources)} videos")
+        return
+
+    if args.manifest:
+        manifest = load_manifest(args.manifest)
+        report = create_ads(
+            manifest["products"],
+            args.assets or manifest.get("media_assets_dir") or media_dir,
+            max_workers=args.workers,
+            network_workers=args.network_workers,
+            cpu_workers=args.cpu_workers,
+            render_backend=args.backend,
+            render_options=render_options,
+            align_script=args.align,
+        )
+        raise SystemExit(1 if report["failed"] else 0)
+
+    create_ad(product_image, media_dir,background_music=background_music, output_path=output_path,
+              render_backend=args.backend, render_options=render_options, align_script=args.align,
+              stream=args.stream)
 
 
 if __name__ == "__main__":
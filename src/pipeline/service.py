@@ -0,0 +1,366 @@
+"""
+Job queue and local HTTP API for running ads in a long-lived process.
+
+Jobs wait in a priority queue (higher priority first, FIFO within a priority) and
+up to max_jobs run at once. Their stages share one bounded thread pool per kind
+of work (see STAGE_POOLS), so a burst of jobs can't oversubscribe the model or the
+encoder while their API calls still overlap.
+
+API (JSON in and out, over TCP or a Unix socket):
+    POST   /jobs          submit {"image": ..., "priority": 0, ...}; returns the job
+    GET    /jobs          every known job
+    GET    /jobs/<id>     one job's status, timings and output or error
+    DELETE /jobs/<id>     cancel a job that hasn't started
+    GET    /metrics       queue depth, pool usage, job counts and latency percentiles
+    GET    /health        liveness
+    POST   /library       re-scan the asset library (incremental); runs on the inference
+                          pool, and requests arriving during a scan share its result
+
+A job's "output" must lie inside the service's output_dir (relative paths are
+taken relative to it); other paths are rejected with a 400.
+"""
+
+import os
+import json
+import time
+import heapq
+import uuid
+import itertools
+import threading
+import socketserver
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from utils import tracing
+
+# StageGraph pool names used by create_ad
+STAGE_POOLS = ("network", "inference", "encode")
+# Completed jobs kept for status queries and latency stats
+HISTORY_SIZE = 1000
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that reports how many tasks are queued and running."""
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.workers = max_workers
+        self.queued = 0
+        self.active = 0
+        self._count_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._count_lock:
+            self.queued += 1
+
+        def counted():
+            with self._count_lock:
+                self.queued -= 1
+                self.active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._count_lock:
+                    self.active -= 1
+
+        return super().submit(counted)
+
+    def stats(self) -> Dict[str, int]:
+        with self._count_lock:
+            return {"workers": self.workers, "queued": self.queued, "active": self.active}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": pick(0.5),
+        "p95": pick(0.95),
+        "max": ordered[-1],
+    }
+
+
+class AdService:
+    """
+    run_job(request, executors) does the work for one job request (a dict) and
+    returns its output path; executors maps STAGE_POOLS names to shared pools.
+    Requests naming an "output" are only accepted with an output_dir to put it in.
+    """
+
+    def __init__(
+        self,
+        run_job: Callable[[Dict[str, Any], Dict[str, Any]], str],
+        max_jobs: int = 4,
+        network_workers: int = 8,
+        inference_workers: int = 1,
+        encode_workers: int = 1,
+        refresh_library: Optional[Callable[[], Any]] = None,
+        output_dir: Optional[str] = None,
+    ):
+        self.run_job = run_job
+        self.refresh_library = refresh_library
+        self.output_dir = os.path.realpath(output_dir) if output_dir else None
+        self._refresh: Optional[Future] = None
+        self.executors = {
+            "network": CountingExecutor(network_workers, "network"),
+            "inference": CountingExecutor(inference_workers, "inference"),
+            "encode": CountingExecutor(encode_workers, "encode"),
+        }
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._finished = deque()
+        self._latencies = deque(maxlen=HISTORY_SIZE)
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = 0
+        self._stopping = False
+        self.counts = {"submitted": 0, "succeeded": 0, "failed": 0, "cancelled": 0}
+        self.started_at = time.time()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"job-{i}", daemon=True) for i in range(max_jobs)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if not request.get("image"):
+            raise ValueError("A job needs an 'image'")
+        if request.get("output"):
+            request = dict(request, output=self.output_path(request["output"]))
+        priority = int(request.get("priority", 0))
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "queued",
+            "priority": priority,
+            "request": request,
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "output": None,
+            "error": None,
+        }
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("The service is shutting down")
+            self.jobs[job["id"]] = job
+            heapq.heappush(self._queue, (-priority, next(self._seq), job["id"]))
+            self.counts["submitted"] += 1
+            self._cond.notify()
+        tracing.count("service.jobs_submitted")
+        return dict(job)
+
+    def output_path(self, output: str) -> str:
+        """Absolute path for a requested output, which has to stay inside output_dir."""
+        if not self.output_dir:
+            raise ValueError("This service does not accept an 'output' path")
+        path = os.path.realpath(os.path.join(self.output_dir, output))
+        if os.path.commonpath([path, self.output_dir]) != self.output_dir or path == self.output_dir:
+            raise ValueError(f"'output' must be a file inside {self.output_dir}")
+        return path
+
+    def refresh(self) -> Future:
+        """Re-scan the library on the inference pool; joins a scan that is already running."""
+        with self._cond:
+            if self._refresh is None or self._refresh.done():
+                self._refresh = self.executors["inference"].submit(self.refresh_library)
+            return self._refresh
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def all_jobs(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [dict(job) for job in self.jobs.values()]
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job; running jobs are left to finish. Returns the job or None if unknown."""
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job and job["status"] == "queued":
+                self._queue = [entry for entry in self._queue if entry[2] != job_id]
+                heapq.heapify(self._queue)
+                self._finish(job, "cancelled")
+            return dict(job) if job else None
+
+    def _finish(self, job: Dict[str, Any], status: str) -> None:
+        # Caller holds _cond
+        job["status"] = status
+        job["finished"] = time.time()
+        self.counts[status] += 1
+        self._finished.append(job["id"])
+        while len(self._finished) > HISTORY_SIZE:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                _, _, job_id = heapq.heappop(self._queue)
+                job = self.jobs[job_id]
+                job["status"] = "running"
+                job["started"] = time.time()
+                self._running += 1
+
+            try:
+                with tracing.span("service.job", job=job_id, priority=job["priority"]):
+                    output, error, status = self.run_job(job["request"], self.executors), None, "succeeded"
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                output, error, status = None, repr(e), "failed"
+
+            with self._cond:
+                self._running -= 1
+                job["output"], job["error"] = output, error
+                self._finish(job, status)
+                self._latencies.append((job["started"] - job["submitted"], job["finished"] - job["started"]))
+            tracing.count(f"service.jobs_{status}")
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            queue_waits = [wait for wait, _ in self._latencies]
+            run_times = [run for _, run in self._latencies]
+            queued_by_priority: Dict[int, int] = {}
+            for priority, _, _ in self._queue:
+                queued_by_priority[-priority] = queued_by_priority.get(-priority, 0) + 1
+            return {
+                "uptime_s": time.time() - self.started_at,
+                "queue_depth": len(self._queue),
+                "queued_by_priority": queued_by_priority,
+                "running": self._running,
+                "jobs": dict(self.counts),
+                "pools": {name: pool.stats() for name, pool in self.executors.items()},
+                "latency_s": {
+                    "queue_wait": percentiles(queue_waits),
+                    "run": percentiles(run_times),
+                    "total": percentiles([w + r for w, r in self._latencies]),
+                },
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop taking jobs; queued jobs still run before the workers exit."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "DropAds"
+
+    @property
+    def service(self) -> AdService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Any) -> None:
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        return body
+
+    def _job_id(self) -> Optional[str]:
+        parts = self.path.rstrip("/").split("/")
+        return parts[2] if len(parts) == 3 and parts[1] == "jobs" else None
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send(200, {"ok": True})
+        elif path == "/metrics":
+            self._send(200, self.service.metrics())
+        elif path == "/jobs":
+            self._send(200, self.service.all_jobs())
+        elif self._job_id():
+            job = self.service.get(self._job_id())
+            if job:
+                self._send(200, job)
+            else:
+                self._send(404, {"error": "unknown job"})
+        else:
+            self._send(404, {"error": f"no route {self.path}"})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        try:
+            if path == "/jobs":
+                self._send(202, self.service.submit(self._read_json()))
+            elif path == "/library" and self.service.refresh_library:
+                index = self.service.refresh().result()
+                self._send(200, {"segments": len(index), "videos": len(index.sources)})
+            else:
+                self._send(404, {"error": f"no route {self.path}"})
+        except (ValueError, RuntimeError) as e:
+            self._send(400, {"error": str(e)})
+
+    def do_DELETE(self):
+        job = self.service.cancel(self._job_id()) if self._job_id() else None
+        if job:
+            self._send(200, job)
+        else:
+            self._send(404, {"error": "unknown job"})
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: AdService):
+        self.service = service
+        super().__init__(address, ServiceHandler)
+
+
+class ServiceUnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, service: AdService):
+        self.service = service
+        if os.path.exists(path):
+            os.remove(path)  # stale socket from a previous run
+        super().__init__(path, UnixServiceHandler)
+
+
+class UnixServiceHandler(ServiceHandler):
+    def address_string(self):
+        return "unix"
+
+
+def serve(service: AdService, host: str = "127.0.0.1", port: int = 8765, unix_socket: Optional[str] = None) -> None:
+    """Serve the API until interrupted, then drain the queue."""
+    server = ServiceUnixServer(unix_socket, service) if unix_socket else ServiceHTTPServer((host, port), service)
+    print(f"Serving on {unix_socket or f'http://{host}:{port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down, finishing queued jobs...")
+    finally:
+        server.server_close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        service.shutdown()
@@ -0,0 +1,101 @@
+"""
+Tiny dependency-graph executor for pipeline stages
+"""
+
+import time
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from utils import tracing
+
+
+class StageGraph:
+    """
+    Stages are callables whose keyword arguments are the results of the stages they
+    depend on. run() starts every stage as soon as its dependencies are done and
+    records a per-stage timeline.
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.stages: Dict[str, dict] = {}
+        self.timeline: Dict[str, dict] = {}
+        self._t0 = None
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Iterable[str] = (), pool: Optional[str] = None) -> None:
+        """Register a stage; pool names which executor from run(executors=...) it runs on."""
+        deps = list(deps)
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = {"fn": fn, "deps": deps, "pool": pool}
+
+    def _timed(self, name: str, fn: Callable[..., Any], kwargs: dict, parent: Optional[int] = None) -> Any:
+        start = time.perf_counter()
+        try:
+            with tracing.span(name, parent=parent, graph=self.name):
+                return fn(**kwargs)
+        finally:
+            end = time.perf_counter()
+            self.timeline[name] = {
+                "start": start - self._t0,
+                "end": end - self._t0,
+                "duration": end - start,
+                "thread": threading.current_thread().name,
+            }
+
+    def run(self, max_workers: int = 4, executors: Optional[Dict[str, Executor]] = None) -> Dict[str, Any]:
+        """Execute the graph and return {stage name: result}. The first failing stage's error is raised."""
+        executors = executors or {}
+        own_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self.name)
+        self._t0 = time.perf_counter()
+        self.timeline = {}
+
+        results: Dict[str, Any] = {}
+        running: Dict[Future, str] = {}
+        waiting = dict(self.stages)
+        # Stages run on pool threads; link their spans to whatever span called run()
+        parent = tracing.current_span_id()
+
+        try:
+            while waiting or running:
+                for name, stage in list(waiting.items()):
+                    if all(dep in results for dep in stage["deps"]):
+                        kwargs = {dep: results[dep] for dep in stage["deps"]}
+                        pool = executors.get(stage["pool"], own_pool)
+                        running[pool.submit(self._timed, name, stage["fn"], kwargs, parent)] = name
+                        del waiting[name]
+
+                if not running:
+                    raise RuntimeError(f"Stages {sorted(waiting)} can never run (dependency cycle)")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+        finally:
+            for future in running:
+                future.cancel()
+            own_pool.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    def critical_path(self) -> List[str]:
+        """Chain of stages that determined the total wall time, first to last."""
+        if not self.timeline:
+            return []
+        name = max(self.timeline, key=lambda n: self.timeline[n]["end"])
+        path = [name]
+        while self.stages[name]["deps"]:
+            name = max(self.stages[name]["deps"], key=lambda n: self.timeline[n]["end"])
+            path.append(name)
+        return path[::-1]
+
+    def format_timeline(self) -> str:
+        critical = set(self.critical_path())
+        lines = [f"{self.name} timeline:"]
+        for name, t in sorted(self.timeline.items(), key=lambda item: item[1]["start"]):
+            marker = "*" if name in critical else " "
+            lines.append(f" {marker} {name:<20} {t['start']:7.2f}s -> {t['end']:7.2f}s  ({t['duration']:.2f}s)")
+        lines.append(" * = critical path")
+        return "\n".join(lines)
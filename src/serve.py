@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+DropAds render service: keeps the CLIP model and the library index loaded and
+runs create_ad for jobs submitted over a local HTTP or Unix-socket API (see
+pipeline.service for the endpoints).
+
+    python serve.py [--port 8765 | --socket /tmp/dropads.sock] [--assets DIR]
+                    [--fake-backends [--narration voice.mp3] [--latency 0.5]]
+
+    curl -X POST localhost:8765/jobs -d '{"image": "assets/images/image.png", "priority": 5}'
+    curl localhost:8765/jobs/<id>
+    curl localhost:8765/metrics
+"""
+
+import os
+import uuid
+import argparse
+import threading
+from typing import Any, Dict
+from config.settings import TEMP_DIR
+from pipeline.service import AdService, serve
+from utils import tracing
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument("--assets", default=os.path.join(SRC_DIR, "assets", "clips"), help="Media assets directory")
+    parser.add_argument("--output-dir", default=os.path.join(SRC_DIR, "output"),
+                        help="Where videos are written; a job's 'output' must be inside it")
+    parser.add_argument("--max-jobs", type=int, default=4, help="Jobs in flight at once")
+    parser.add_argument("--network-workers", type=int, default=8, help="Threads for LLM/TTS requests")
+    parser.add_argument("--inference-workers", type=int, default=1, help="Threads for indexing/ranking")
+    parser.add_argument("--encode-workers", type=int, default=1, help="Renders at once")
+    parser.add_argument("--backend", choices=("moviepy", "ffmpeg", "ffmpeg-cached", "ffmpeg-chunked"), default="ffmpeg",
+                        help="Default render backend; a job can override it with 'render_backend'")
+    parser.add_argument("--fake-backends", action="store_true",
+                        help="Answer OpenAI / ElevenLabs / TikTok calls locally with canned responses")
+    parser.add_argument("--narration", help="mp3 the fake TTS backends return (default: generated silence)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds each fake API call takes")
+    args = parser.parse_args()
+
+    if args.fake_backends:
+        from bench.fakes import install_fakes
+
+        narration = args.narration
+        if not narration:
+            from bench.synthetic import make_audio
+
+            os.makedirs(TEMP_DIR, exist_ok=True)
+            narration = make_audio(os.path.join(TEMP_DIR, "fake_narration.mp3"), 15.0)
+        install_fakes(narration, latency=args.latency)
+        print("Using fake API backends")
+
+    import main as pipeline
+
+    print("Loading CLIP model...")
+    pipeline.get_clip_controller().warmup()
+    print(f"Indexing clip library {args.assets}...")
+    library = {"index": pipeline.update_library_index(args.assets)}
+    library_lock = threading.Lock()
+
+    def refresh_library():
+        with library_lock:
+            library["index"] = pipeline.update_library_index(args.assets)
+            return library["index"]
+
+    def run_job(request: Dict[str, Any], executors: Dict[str, Any]) -> str:
+        image = request["image"]
+        # AdService has already resolved a requested output inside args.output_dir
+        output = request.get("output") or os.path.join(
+            args.output_dir, f"{os.path.splitext(os.path.basename(image))[0]}_{uuid.uuid4().hex[:8]}.mp4")
+        return pipeline.create_ad(
+            image,
+            args.assets,
+            target_length=request.get("target_length", 30),
+            background_music=request.get("background_music"),
+            output_path=output,
+            clip_index=library["index"],
+            executors=executors,
+            render_backend=request.get("render_backend", args.backend),
+            render_options=request.get("render_options"),
+            align_script=request.get("align_script", False),
+        )
+
+    service = AdService(
+        run_job,
+        max_jobs=args.max_jobs,
+        network_workers=args.network_workers,
+        inference_workers=args.inference_workers,
+        encode_workers=args.encode_workers,
+        refresh_library=refresh_library,
+        output_dir=args.output_dir,
+    )
+    try:
+        serve(service, args.host, args.port, args.socket)
+    finally:
+        if tracing.enabled():
+            tracing.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Content-addressed file cache with TTL and disk-budget (LRU) eviction
+"""
+
+import os
+import json
+import time
+import hashlib
+import shutil
+import threading
+from typing import Any, Optional
+
+
+class DiskCache:
+    """
+    Each entry is one file under root/<key[:2]>/<key><suffix>. Writes go through a
+    temp file and os.replace, so concurrent readers only ever see complete entries.
+    Entry mtime doubles as last-access time: hits touch it, eviction removes the
+    oldest entries until the cache fits in max_bytes. Directories are created on
+    the first write, so constructing a cache has no filesystem side effects.
+    """
+
+    def __init__(self, root: str, max_bytes: Optional[int] = None, ttl: Optional[float] = None, suffix: str = ""):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self._size = None  # bytes on disk, computed lazily on first write
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Stable hash of bytes / str / JSON-serializable parts."""
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, (bytes, bytearray, memoryview)):
+                data = bytes(part)
+            elif isinstance(part, str):
+                data = part.encode()
+            else:
+                data = json.dumps(part, sort_keys=True, default=str).encode()
+            h.update(len(data).to_bytes(8, "little"))
+            h.update(data)
+        return h.hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + self.suffix)
+
+    def _expired(self, mtime: float) -> bool:
+        return self.ttl is not None and time.time() - mtime > self.ttl
+
+    def get_path(self, key: str) -> Optional[str]:
+        """Path of a live entry (counted as a hit and touched), or None on a miss."""
+        path = self.path_for(key)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+
+        if st is not None and self._expired(st.st_mtime):
+            self._remove(path)
+            st = None
+
+        with self._lock:
+            if st is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_served += st.st_size
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:  # evicted by another process in between
+            return None
+
+    def _commit(self, tmp_path: str, key: str) -> str:
+        path = self.path_for(key)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+        if self.max_bytes is not None and self._current_size() > self.max_bytes:
+            self.evict()
+        return path
+
+    def _tmp_path(self, key: str) -> str:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def put(self, key: str, data: bytes) -> str:
+        tmp_path = self._tmp_path(key)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return self._commit(tmp_path, key)
+
+    def put_file(self, key: str, src_path: str, move: bool = False) -> str:
+        """Store an existing file (copied, or moved when move=True) under key."""
+        tmp_path = self._tmp_path(key)
+        if move:
+            shutil.move(src_path, tmp_path)
+        else:
+            shutil.copyfile(src_path, tmp_path)
+        return self._commit(tmp_path, key)
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _current_size(self) -> int:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            return self._size
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until under max_bytes. Returns bytes freed."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for path, size, mtime in entries:
+            over_budget = self.max_bytes is not None and total - freed > self.max_bytes
+            if not over_budget and not self._expired(mtime):
+                continue
+            self._remove(path)
+            freed += size
+        with self._lock:
+            self._size = total - freed
+        return freed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "bytes_served": self.bytes_served,
+        }
@@ -0,0 +1,52 @@
+"""
+Helpers for driving the ffmpeg binary directly
+"""
+
+import os
+import subprocess
+from functools import lru_cache
+from typing import Any, Dict, List
+from utils import tracing
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_binary() -> str:
+    """Same binary moviepy uses, unless FFMPEG_BINARY overrides it."""
+    if os.getenv("FFMPEG_BINARY"):
+        return os.environ["FFMPEG_BINARY"]
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def probe(path: str) -> Dict[str, Any]:
+    """Return moviepy's parsed stream info (duration, video_size, video_fps, ...)."""
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    infos = ffmpeg_parse_infos(path)
+    if infos.get("video_rotation", 0) in (90, 270) and infos.get("video_size"):
+        # ffmpeg auto-rotates on decode, so report the displayed size
+        w, h = infos["video_size"]
+        infos["video_size"] = [h, w]
+    return infos
+
+
+def run_ffmpeg(args: List[str]) -> None:
+    """Run ffmpeg with the given arguments, raising with its stderr on failure."""
+    cmd = [ffmpeg_binary(), "-y", "-nostdin", "-loglevel", "error", *args]
+    with tracing.span("ffmpeg", output=args[-1] if args else None):
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.decode(errors='replace').strip()}")
+
+
+def read_ffmpeg(args: List[str]) -> bytes:
+    """Run ffmpeg writing to stdout ("-" as output) and return what it wrote."""
+    cmd = [ffmpeg_binary(), "-nostdin", "-loglevel", "error", *args]
+    with tracing.span("ffmpeg", output="pipe"):
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
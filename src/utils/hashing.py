@@ -0,0 +1,76 @@
+"""
+Content fingerprints for media files
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Tuple
+
+_CHUNK_SIZE = 1 << 20
+
+# (abs path, size, mtime_ns) -> digest, so unchanged files are hashed once per process
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+_memo_lock = threading.Lock()
+# Serializes saves within the process; the temp file is unique per save, so
+# processes sharing memo_path never write to the same file either
+_save_lock = threading.Lock()
+
+
+def _stat_key(path: str) -> Tuple[str, int, int]:
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+def file_digest(path: str) -> str:
+    """Return a hex digest of the file contents, memoized on (path, size, mtime)."""
+    key = _stat_key(path)
+    with _memo_lock:
+        if key in _digest_memo:
+            return _digest_memo[key]
+
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _memo_lock:
+        _digest_memo[key] = digest
+    return digest
+
+
+def load_digest_memo(memo_path: str) -> None:
+    """Seed the in-process memo from a JSON file written by save_digest_memo."""
+    try:
+        with open(memo_path, "r") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return
+
+    with _memo_lock:
+        for path, size, mtime_ns, digest in entries:
+            _digest_memo[(path, size, mtime_ns)] = digest
+
+
+def save_digest_memo(memo_path: str) -> None:
+    """Atomically persist the in-process memo so restarts skip re-hashing."""
+    with _memo_lock:
+        entries = [[path, size, mtime_ns, digest] for (path, size, mtime_ns), digest in _digest_memo.items()]
+
+    memo_dir = os.path.dirname(memo_path) or "."
+    with _save_lock:
+        os.makedirs(memo_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=memo_dir, prefix=os.path.basename(memo_path) + ".", suffix=".tmp", delete=False
+        ) as f:
+            tmp_path = f.name
+            try:
+                json.dump(entries, f)
+            except BaseException:
+                f.close()
+                os.remove(tmp_path)
+                raise
+        os.replace(tmp_path, memo_path)
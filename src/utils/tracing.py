@@ -0,0 +1,229 @@
+"""
+Lightweight spans and counters for profiling pipeline runs.
+
+Tracing is off unless DROPADS_TRACE names an output file (or enable() is called).
+A ".json" path gets a Chrome trace (open it in chrome://tracing or Perfetto); any
+other path gets one JSON object per line. While disabled, span() hands out a shared
+no-op context manager and count() returns immediately.
+
+    with tracing.span("build_index", videos=len(paths)):
+        ...
+        tracing.count("frames_decoded", n)
+"""
+
+import os
+import json
+import time
+import atexit
+import itertools
+import threading
+import multiprocessing
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+from config.settings import TRACE_PATH
+
+_enabled = False
+_path: Optional[str] = None
+_format = "jsonl"
+_pid = None
+_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+
+_counters: Dict[str, float] = {}
+_events: List[dict] = []  # Chrome trace events, written out by flush()
+_thread_names: Dict[int, str] = {}
+_file = None  # JSON lines output, appended as spans finish
+
+# Wall-clock anchor, so perf_counter timestamps line up across processes and runs
+_epoch_offset = time.time() - time.perf_counter()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+    @property
+    def id(self) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Span:
+    __slots__ = ("name", "attrs", "id", "parent", "start", "_explicit_parent")
+
+    def __init__(self, name: str, parent: Optional[int], attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.id = next(_ids)
+        self.parent = parent
+        self._explicit_parent = parent is not None
+        self.start = 0.0
+
+    def set(self, **attrs) -> None:
+        """Attach attributes discovered while the span runs (cache hit, sizes, ...)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _stack()
+        if self.parent is None and stack:
+            self.parent = stack[-1].id
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _record(self, end, root=not stack and not self._explicit_parent)
+        return False
+
+
+def span(name: str, parent: Optional[int] = None, **attrs):
+    """
+    Context manager timing a block. Spans nest per thread; pass parent=current_span_id()
+    captured on another thread to link work handed to a pool.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, parent, attrs)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator wrapping every call of the function in a span."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, None, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span_id() -> Optional[int]:
+    if not _enabled:
+        return None
+    stack = _stack()
+    return stack[-1].id if stack else None
+
+
+def count(name: str, value: float = 1) -> None:
+    """Add value to a process-wide counter."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def counters() -> Dict[str, float]:
+    with _lock:
+        return dict(_counters)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def _record(s: Span, end: float, root: bool) -> None:
+    thread = threading.current_thread()
+    if _format == "chrome":
+        event = {
+            "name": s.name, "cat": "dropads", "ph": "X",
+            "ts": (s.start + _epoch_offset) * 1e6, "dur": (end - s.start) * 1e6,
+            "pid": _pid, "tid": thread.ident,
+            "args": dict(s.attrs, id=s.id, parent=s.parent),
+        }
+        with _lock:
+            _thread_names.setdefault(thread.ident, thread.name)
+            _events.append(event)
+            if root:
+                # Sample the counters whenever a top-level span closes
+                _events.append(_counter_event(end))
+        return
+
+    line = json.dumps({
+        "type": "span", "name": s.name, "id": s.id, "parent": s.parent,
+        "start": s.start + _epoch_offset, "duration": end - s.start,
+        "pid": _pid, "thread": thread.name, "attrs": s.attrs,
+    }, default=str)
+    with _lock:
+        if _file is not None:
+            _file.write(line + "\n")
+
+
+def _counter_event(t: float) -> dict:
+    return {"name": "counters", "ph": "C", "ts": (t + _epoch_offset) * 1e6, "pid": _pid, "args": dict(_counters)}
+
+
+def enable(path: str, format: Optional[str] = None) -> None:
+    """Start tracing to path; format is "chrome" or "jsonl" (default: by extension)."""
+    global _enabled, _path, _format, _pid, _file
+    with _lock:
+        _path = path
+        _format = format or ("chrome" if path.endswith(".json") else "jsonl")
+        _pid = os.getpid()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if _format == "jsonl":
+            _file = open(path, "a", buffering=1024 * 1024)
+        _enabled = True
+
+
+def flush() -> None:
+    """Write counters (and, for Chrome traces, every event so far) to the output file."""
+    global _file
+    if not _enabled or os.getpid() != _pid:
+        return
+    with _lock:
+        now = time.perf_counter()
+        if _format == "chrome":
+            metadata = [
+                {"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid, "args": {"name": name}}
+                for tid, name in _thread_names.items()
+            ]
+            with open(_path, "w") as f:
+                json.dump({"traceEvents": metadata + _events + [_counter_event(now)], "displayTimeUnit": "ms"}, f)
+        elif _file is not None:
+            _file.write(json.dumps({"type": "counters", "time": now + _epoch_offset, "pid": _pid, "values": _counters}) + "\n")
+            _file.flush()
+
+
+def disable() -> None:
+    global _enabled, _file
+    flush()
+    with _lock:
+        _enabled = False
+        if _file is not None:
+            _file.close()
+            _file = None
+
+
+# Worker processes inherit DROPADS_TRACE but must not clobber the parent's file
+if TRACE_PATH and multiprocessing.parent_process() is None:
+    enable(TRACE_PATH)
+    atexit.register(disable)
@@ -0,0 +1,128 @@
+"""
+Script-to-scene alignment: every narration line gets the library segments that
+match it best, instead of the whole ad drawing from one prompt's ranking.
+
+All lines are scored against the whole library in one (lines x segments) matrix
+product. Each line keeps its top candidates, and a greedy pass over all
+(line, segment) pairs in descending score order fills each line's share of the
+narration. A segment is used at most once per ad.
+"""
+
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from utils import tracing
+from video.clip_index import ClipIndex
+
+# Candidates kept per line before the assignment; widened only for lines left short
+CANDIDATES_PER_LINE = 256
+# A line counts as covered once less than this many seconds are missing
+MIN_SHOT = 0.5
+
+
+def assign_segments(
+    scores: np.ndarray,
+    durations: np.ndarray,
+    needs: Sequence[float],
+    min_score_threshold: float = 0.005,
+    candidates: int = CANDIDATES_PER_LINE,
+    min_shot: float = MIN_SHOT,
+) -> List[List[int]]:
+    """
+    Segment indices per line (best first) so that each line's needs[i] seconds are
+    covered without reusing a segment. A line with no unused segment above the
+    threshold gets its single best segment, even if another line already uses it.
+    """
+    num_lines = scores.shape[0]
+    assigned: List[List[int]] = [[] for _ in range(num_lines)]
+    if not scores.shape[1]:
+        return assigned
+    filled = np.zeros(num_lines)
+    # Earlier lines may end up to min_shot short and the last line makes that up,
+    # so it must be covered completely, plus their worst-case shortfall. Lines shorter
+    # than min_shot still need one segment of their own
+    needs = np.maximum(np.asarray(needs, dtype=np.float64) - min_shot, min_shot)
+    needs[-1] += min_shot * num_lines
+    used = set()
+
+    def take(line: int, seg: int) -> None:
+        assigned[line].append(seg)
+        used.add(seg)
+        filled[line] += durations[seg]
+
+    # Global greedy over the candidate pairs: the strongest matches are settled first
+    top = np.stack([ClipIndex.top_k(row, candidates) for row in scores])
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=None, kind="stable")
+    for flat in order:
+        line, rank = divmod(int(flat), top.shape[1])
+        if top_scores[line, rank] < min_score_threshold:
+            break
+        seg = int(top[line, rank])
+        if seg not in used and filled[line] < needs[line]:
+            take(line, seg)
+
+    # Lines still short look past their candidate list, then repeat what they have
+    for line in np.flatnonzero(filled < needs):
+        row = scores[line].copy()
+        if used:
+            row[list(used)] = -np.inf
+        for seg in ClipIndex.top_k(row):
+            if filled[line] >= needs[line] or row[seg] < min_score_threshold:
+                break
+            take(line, int(seg))
+        if not assigned[line]:
+            assigned[line].append(int(np.argmax(scores[line])))
+    return assigned
+
+
+def build_timeline(
+    index: ClipIndex,
+    assigned: List[List[int]],
+    scores: np.ndarray,
+    windows: Sequence[Tuple[float, float]],
+) -> List[Dict[str, Any]]:
+    """
+    Play-ordered segment dicts cut so each line's footage ends where the line ends;
+    a line left slightly short is made up by the next one, and the last line repeats
+    its segments until the narration is covered. A cut segment keeps the scene's own
+    end as segment_end.
+    """
+    timeline = []
+    t = 0.0
+    for line, ((_, line_end), segs) in enumerate(zip(windows, assigned)):
+        records = index.records(np.asarray(segs, dtype=np.int64), scores[line])
+        last = line == len(windows) - 1
+        i = 0
+        while records and t < line_end - 1e-3 and (last or i < len(records)):
+            record = records[i % len(records)]
+            length = min(record["duration"], line_end - t)
+            timeline.append(dict(
+                record, end=record["start"] + length, duration=length, line=line, segment_end=record["end"]))
+            t += length
+            i += 1
+    return timeline
+
+
+@tracing.traced("align_script")
+def align_lines(
+    index: ClipIndex,
+    line_embeddings: np.ndarray,
+    windows: Sequence[Tuple[float, float]],
+    reference_embedding: Optional[np.ndarray] = None,
+    text_weight: float = 0.5,
+    min_score_threshold: float = 0.005,
+    candidates: int = CANDIDATES_PER_LINE,
+) -> List[Dict[str, Any]]:
+    """
+    Timeline covering the narration, where windows[i] is the (start, end) of line i
+    and line_embeddings[i] its normalized text embedding.
+    """
+    if not len(index):
+        raise ValueError("The clip library is empty")
+    queries = ClipIndex.combine_queries(line_embeddings, reference_embedding, text_weight)
+    scores = index.scores(queries)
+    durations = index.ends - index.starts
+    needs = [end - start for start, end in windows]
+    assigned = assign_segments(scores, durations, needs, min_score_threshold, candidates)
+    tracing.count("alignment.segments", sum(len(segs) for segs in assigned))
+    return build_timeline(index, assigned, scores, windows)
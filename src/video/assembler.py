@@ -1,11 +1,102 @@
-from moviepy.editor import (
-    VideoFileClip, concatenate_videoclips, AudioFileClip, 
-    TextClip, CompositeVideoClip, afx, CompositeAudioClip
-)
-
 import os
-import re
+import uuid
+import shutil
+from collections import OrderedDict
+from utils import tracing
+from audio.mixer import encode_aac, mix_audio, wav_duration
+from utils.ffmpeg import probe
+from video.captions import build_captions, caption_clips
+from video.ffmpeg_render import render_ffmpeg, render_chunked, concat_pieces, X264_PRESET, X264_CRF
+from video.segment_cache import get_segment_cache
+
+
+class SourceReaders:
+    """
+    One VideoFileClip per source file, shared by all segments cut from it. Only the
+    max_open most recently read sources keep a live ffmpeg process; older ones are
+    closed and moviepy reopens them lazily if they are read again.
+    """
+
+    def __init__(self, max_open=4):
+        self.max_open = max_open
+        self.clips = {}
+        self._live = OrderedDict()
+
+    def get(self, path):
+        if path not in self.clips:
+            from moviepy.editor import VideoFileClip
+
+            self.clips[path] = VideoFileClip(path, audio=False)
+        return self.clips[path]
+
+    def touch(self, path):
+        self._live[path] = True
+        self._live.move_to_end(path)
+        while len(self._live) > self.max_open:
+            stale, _ = self._live.popitem(last=False)
+            self.clips[stale].reader.close()
+
+    def segment(self, path, start, end, target_resolution):
+        clip = fit_to_resolution(self.get(path).subclip(start, end), target_resolution)
+
+        def get_frame(get_frame_at, t):
+            self.touch(path)
+            return get_frame_at(t)
+
+        return clip.fl(get_frame)
+
+    def close(self):
+        for clip in self.clips.values():
+            clip.close()
+        self.clips.clear()
+        self._live.clear()
+
+
+def fit_to_resolution(clip, target_resolution):
+    """Single aspect-correct scale to cover the target, then a center crop."""
+    width, height = target_resolution
+    scale = max(width / clip.w, height / clip.h)
+    new_w = max(width, int(round(clip.w * scale)))
+    new_h = max(height, int(round(clip.h * scale)))
+    clip = clip.resize(newsize=(new_w, new_h))
+    return clip.crop(x_center=new_w / 2, y_center=new_h / 2, width=width, height=height)
+
+
+def select_segments(ranked_clips, duration, min_score_threshold):
+    """Highest ranked segments above the threshold that fit into duration seconds."""
+    selected = []
+    current_duration = 0.0
+
+    for seg in ranked_clips:
+        if seg["similarity"] < min_score_threshold:
+            break
+        clip_duration = seg["end"] - seg["start"]
+        if current_duration + clip_duration > duration:
+            break
+        selected.append(seg)
+        current_duration += clip_duration
 
+    return selected
+
+
+def plan_timeline(segments, duration):
+    """Repeat segments in order until they cover duration seconds."""
+    timeline = []
+    repeated_duration = 0.0
+    if not segments:
+        return timeline
+
+    while repeated_duration < duration:
+        for seg in segments:
+            if repeated_duration >= duration:
+                break
+            timeline.append(seg)
+            repeated_duration += seg["end"] - seg["start"]
+
+    return timeline
+
+
+@tracing.traced("assemble_final_video")
 def assemble_final_video(
     ranked_clips,
     tts_audio_path,
@@ -18,11 +109,21 @@ def assemble_final_video(
     bg_music_path=None,  # New optional parameter
     target_resolution=(1080, 1920),  # TikTok size
     bg_music_volume=0.1,  # Adjust background music volume
+    backend="moviepy",
+    use_segment_cache=False,
+    render_workers=1,
+    x264_preset=X264_PRESET,
+    crf=X264_CRF,
+    encode_threads=0,
+    captions=False,
+    music_ducking=0.0,
+    timeline=None,
 ):
     """
     Assemble the final video using the highest ranked clips that meet the score threshold,
     mute their original audio, add TTS narration and optional background music,
-    and render to TikTok dimensions.
+    and render to TikTok dimensions. Narration and music are pre-mixed into one track
+    (see audio.mixer) that both backends mux in unchanged.
 
     Args:
         ranked_clips: List of dicts with keys ['start', 'end', 'similarity', 'source']
@@ -32,45 +133,88 @@ def assemble_final_video(
         min_score_threshold: Minimum similarity score for a clip to be included
         font: Font for subtitles
         font_size: Font size for subtitles
-        subtitle_duration_per_line: Duration to show each subtitle (if script is a list)
+        subtitle_duration_per_line: Unused; kept for compatibility (captions follow the narration)
         bg_music_path: Optional path to background music file
         target_resolution: Desired output resolution (width, height)
         bg_music_volume: Volume level for background music
+        backend: "moviepy" composes frames in Python; "ffmpeg" renders one native filter graph
+        use_segment_cache: With the ffmpeg backend, concat pre-normalized cached segments
+            instead of re-encoding them from the sources
+        render_workers: With the ffmpeg backend, encode this many chunks of the timeline
+            in parallel processes and join them without re-encoding
+        x264_preset: libx264 preset (ultrafast ... veryslow)
+        crf: libx264 constant rate factor, lower is better quality
+        encode_threads: Encoder threads per process; 0 picks automatically
+        captions: Burn the script in as captions (font / font_size), timed over the narration;
+            with use_segment_cache this costs one re-encode of the joined video
+        music_ducking: Fraction (0-1) by which the music is lowered while the narration speaks
+        timeline: Segments already planned in play order over the narration (e.g. from
+            ClipSelector.align_script); ranked_clips is then ignored
     """
-    tts_audio = AudioFileClip(tts_audio_path)
-    tts_duration = tts_audio.duration
-
-    if isinstance(ad_script, str):
-        ad_lines = re.split(r'[.!?]\s*', ad_script)
-        ad_lines = [line.strip() for line in ad_lines if line.strip()]
-    else:
-        ad_lines = [line.strip() for line in ad_script if line.strip()]
+    if backend == "ffmpeg":
+        tts_duration = probe(tts_audio_path)["duration"]
+        if timeline is None:
+            selected = select_segments(ranked_clips, tts_duration, min_score_threshold)
+            if not selected:
+                raise ValueError("No suitable clips passed the min_score_threshold.")
+            timeline = plan_timeline(selected, tts_duration)
+        sprites = build_captions(ad_script, tts_duration, target_resolution, font, font_size) if captions else None
+        audio_path = mix_audio(tts_audio_path, bg_music_path, bg_music_volume, tts_duration, ducking=music_ducking)
+        encode = {"captions": sprites, "preset": x264_preset, "crf": crf, "threads": encode_threads}
 
+        try:
+            if use_segment_cache:
+                # Pieces cut to fit a script line are rendered here, outside the cache
+                scratch_dir = f"{output_path}.{uuid.uuid4().hex}.pieces"
+                try:
+                    cache = get_segment_cache(target_resolution, x264_preset, crf, encode_threads)
+                    pieces = cache.prepare(timeline, scratch_dir)
+                    return concat_pieces(pieces, audio_path, output_path, tts_duration, **encode)
+                finally:
+                    shutil.rmtree(scratch_dir, ignore_errors=True)
+            if render_workers > 1:
+                return render_chunked(
+                    timeline, audio_path, output_path, tts_duration,
+                    target_resolution=target_resolution, workers=render_workers, **encode,
+                )
+            return render_ffmpeg(
+                timeline, audio_path, output_path, tts_duration, target_resolution=target_resolution, **encode)
+        finally:
+            os.remove(audio_path)
+    if backend != "moviepy":
+        raise ValueError(f"Unknown render backend: {backend}")
+
+    # moviepy is only imported when this backend is actually used
+    from moviepy.editor import concatenate_videoclips, CompositeVideoClip
+
+    mix_path = mix_audio(tts_audio_path, bg_music_path, bg_music_volume, ducking=music_ducking)
+    tts_duration = wav_duration(mix_path)
+    # moviepy muxes a soundtrack file with -acodec copy, so it has to be AAC already
+    try:
+        audio_path = encode_aac(mix_path)
+    finally:
+        os.remove(mix_path)
+
+    readers = SourceReaders()
     selected_clips = []
-    current_duration = 0.0
 
-    for seg in ranked_clips:
-        if seg["similarity"] < min_score_threshold:
-            break
-        clip_duration = seg["end"] - seg["start"]
-        if current_duration + clip_duration > tts_duration:
-            break
+    segments = timeline if timeline is not None else select_segments(ranked_clips, tts_duration, min_score_threshold)
+    for seg in segments:
         try:
-            clip = VideoFileClip(seg["source"]).subclip(seg["start"], seg["end"]).without_audio()
-            clip = clip.resize(height=target_resolution[1])  # Resize to match TikTok height
-            clip = clip.resize(width=target_resolution[0])   # Ensure width matches (crop if needed)
+            clip = readers.segment(seg["source"], seg["start"], seg["end"], target_resolution)
             selected_clips.append(clip)
-            current_duration += clip_duration
         except Exception as e:
             print(f"Failed to load clip {seg['source']} from {seg['start']} to {seg['end']}: {e}")
 
     if not selected_clips:
+        readers.close()
+        os.remove(audio_path)
         raise ValueError("No suitable clips passed the min_score_threshold.")
 
 
-    # Repeat clips until we reach or exceed the TTS duration
-    full_clip_list = []
-    repeated_duration = 0
+    # Repeat clips until we reach or exceed the TTS duration (a given timeline already does)
+    full_clip_list = [] if timeline is None else selected_clips
+    repeated_duration = 0 if timeline is None else tts_duration
 
     while repeated_duration < tts_duration:
         for clip in selected_clips:
@@ -79,38 +223,26 @@ def assemble_final_video(
             full_clip_list.append(clip)
             repeated_duration += clip.duration
 
-    # Concatenate and trim to exact duration
-    final_video = concatenate_videoclips(full_clip_list, method="compose").subclip(0, tts_duration)
-
-
-    # Combine TTS and background music if provided
-    final_audio = tts_audio
-    if bg_music_path:
-        try:
-            bg_music = AudioFileClip(bg_music_path).subclip(0, tts_duration).volumex(bg_music_volume)
-            bg_music = AudioFileClip(bg_music_path).subclip(0, tts_duration).volumex(bg_music_volume)
-            bg_music = bg_music.audio_fadein(1).audio_fadeout(1)
-            final_audio = CompositeAudioClip([tts_audio, bg_music])
-
-        except Exception as e:
-            print(f"Failed to load background music: {e}")
-
-    # Add audio to video
-    final_video = final_video.set_audio(final_audio)
+    # Every clip already has the target size, so a plain chain concat is enough
+    final_video = concatenate_videoclips(full_clip_list, method="chain").subclip(0, tts_duration)
+    if captions:
+        sprites = build_captions(ad_script, tts_duration, target_resolution, font, font_size)
+        final_video = CompositeVideoClip([final_video, *caption_clips(sprites)], size=target_resolution)
 
 
-    # Create final composite video
-    final = CompositeVideoClip([final_video], size=target_resolution).set_duration(tts_duration)
+    final = final_video.set_duration(tts_duration)
 
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    final.write_videofile(output_path, codec="libx264", audio_codec="aac")
+    with tracing.span("moviepy.write_videofile", duration=tts_duration):
+        # Given a file name, moviepy copies the mixed track into the output without re-encoding
+        final.write_videofile(
+            output_path, codec="libx264", audio=audio_path, preset=x264_preset,
+            threads=encode_threads or None, ffmpeg_params=["-crf", str(crf)],
+        )
 
     # Cleanup
-    for clip in selected_clips:
-        clip.close()
-    tts_audio.close()
-    if bg_music_path:
-        bg_music.close()
+    readers.close()
     final.close()
+    os.remove(audio_path)
 
     return output_path
@@ -0,0 +1,136 @@
+"""
+Batched CLIP image embedding across frames, segments and videos
+"""
+
+import time
+import threading
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, Iterable
+from utils import tracing
+
+
+class BatchEmbedder:
+    """
+    Queue frames for many owners (segments), preprocess them on a thread pool and
+    run encode_image in fixed-size batches. run() returns the L2-normalized mean
+    embedding per owner.
+    """
+
+    def __init__(self, model, preprocess, device: str, dtype=None, batch_size: int = 32, preprocess_workers: int = 4, model_lock=None):
+        self.model = model
+        self.preprocess = preprocess
+        self.device = device
+        self.dtype = dtype
+        self.batch_size = max(1, batch_size)
+        self.model_lock = model_lock or threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, preprocess_workers), thread_name_prefix="clip-preprocess")
+
+        self._pending = deque()  # (owner id, future of preprocessed tensor)
+        self._owners = []
+        self._owner_ids: Dict[Hashable, int] = {}
+        self._sums = None
+        self._counts = np.zeros(0, dtype=np.int64)
+
+        self.frames_encoded = 0
+        self.encode_seconds = 0.0
+        self._started_at = None
+        self.last_stats: Dict[str, float] = {}
+
+    def _prepare(self, frame) -> "torch.Tensor":
+        from PIL import Image
+
+        if not isinstance(frame, Image.Image):
+            frame = Image.fromarray(np.asarray(frame, dtype=np.uint8))
+        return self.preprocess(frame.convert("RGB"))
+
+    def add(self, owner: Hashable, frames: Iterable[Any]) -> None:
+        """Queue frames (HxWx3 uint8 arrays or PIL images) whose embeddings average into owner."""
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+
+        if owner not in self._owner_ids:
+            self._owner_ids[owner] = len(self._owners)
+            self._owners.append(owner)
+        owner_id = self._owner_ids[owner]
+
+        for frame in frames:
+            self._pending.append((owner_id, self._pool.submit(self._prepare, frame)))
+            # Keep at most two batches of tensors in flight
+            if len(self._pending) >= 2 * self.batch_size:
+                self._encode_batch()
+
+    def _encode_batch(self) -> None:
+        import torch
+
+        count = min(self.batch_size, len(self._pending))
+        items = [self._pending.popleft() for _ in range(count)]
+        owner_ids = np.fromiter((owner_id for owner_id, _ in items), dtype=np.int64, count=count)
+        batch = torch.stack([future.result() for _, future in items]).to(self.device, dtype=self.dtype)
+
+        start = time.perf_counter()
+        with tracing.span("clip.encode_image", frames=count), self.model_lock, torch.no_grad():
+            embeddings = self.model.encode_image(batch)
+            embeddings /= embeddings.norm(dim=-1, keepdim=True)
+            embeddings = embeddings.float().cpu().numpy()
+        self.encode_seconds += time.perf_counter() - start
+        self.frames_encoded += count
+        tracing.count("frames_embedded", count)
+
+        # Scatter frame embeddings back onto their owners
+        if self._sums is None:
+            self._sums = np.zeros((len(self._owners), embeddings.shape[1]), dtype=np.float32)
+        if self._sums.shape[0] < len(self._owners):
+            grow = len(self._owners) - self._sums.shape[0]
+            self._sums = np.vstack([self._sums, np.zeros((grow, self._sums.shape[1]), dtype=np.float32)])
+        if self._counts.shape[0] < len(self._owners):
+            self._counts = np.concatenate([self._counts, np.zeros(len(self._owners) - self._counts.shape[0], dtype=np.int64)])
+
+        np.add.at(self._sums, owner_ids, embeddings)
+        np.add.at(self._counts, owner_ids, 1)
+
+    @property
+    def frames_per_second(self) -> float:
+        if not self._started_at or not self.frames_encoded:
+            return 0.0
+        return self.frames_encoded / (time.perf_counter() - self._started_at)
+
+    def run(self) -> Dict[Hashable, np.ndarray]:
+        """Encode everything still queued and return {owner: mean embedding}."""
+        while self._pending:
+            self._encode_batch()
+
+        results = {}
+        if self._sums is not None:
+            for owner_id, owner in enumerate(self._owners):
+                if owner_id < self._counts.shape[0] and self._counts[owner_id]:
+                    mean = self._sums[owner_id] / self._counts[owner_id]
+                    results[owner] = mean / np.linalg.norm(mean)
+
+        if self.frames_encoded:
+            self.last_stats = {
+                "frames": self.frames_encoded,
+                "segments": len(results),
+                "batch_size": self.batch_size,
+                "frames_per_sec": self.frames_per_second,
+                "encode_frames_per_sec": self.frames_encoded / max(self.encode_seconds, 1e-9),
+            }
+            print(
+                f"Embedded {self.frames_encoded} frames for {len(results)} segments "
+                f"({self.last_stats['frames_per_sec']:.1f} frames/sec overall, "
+                f"{self.last_stats['encode_frames_per_sec']:.1f} frames/sec in encode_image, "
+                f"batch size {self.batch_size})"
+            )
+
+        self.frames_encoded = 0
+        self.encode_seconds = 0.0
+        self._started_at = None
+        self._owners = []
+        self._owner_ids = {}
+        self._sums = None
+        self._counts = np.zeros(0, dtype=np.int64)
+        return results
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,269 @@
+"""
+Captions rasterized once into compact RGBA sprites and burned in during the encode.
+
+Glyph masks (fill and outline) are rendered once per font and size and blitted into
+each caption, so no text layout engine runs per frame. Sprites are cropped to the
+text's bounding box, stored as PNGs in a content-addressed cache and overlaid by
+ffmpeg (or composited as small ImageClips by the moviepy backend).
+"""
+
+import os
+import re
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from config.settings import CAPTION_CACHE_DIR
+from utils import tracing
+from utils.disk_cache import DiskCache
+
+# Fonts tried when the requested one cannot be found (ImageMagick names like "Arial-Bold" aren't files)
+FALLBACK_FONTS = (
+    "Arial Bold.ttf", "arialbd.ttf", "Arial-Bold.ttf", "DejaVuSans-Bold.ttf",
+    "LiberationSans-Bold.ttf", "Helvetica-Bold.ttf", "Arial.ttf", "DejaVuSans.ttf",
+)
+MAX_CAPTION_CHARS = 32
+# Vertical center of the captions, as a fraction of the frame height
+CAPTION_Y = 0.72
+
+caption_cache = DiskCache(CAPTION_CACHE_DIR, max_bytes=100 * 1024 * 1024, suffix=".png")
+
+
+def script_lines(ad_script) -> List[str]:
+    """Sentences of the script (a string) or its non-empty lines (a list)."""
+    if isinstance(ad_script, str):
+        lines = re.split(r'[.!?]\s*', ad_script)
+    else:
+        lines = ad_script
+    return [line.strip() for line in lines if line and line.strip()]
+
+
+def caption_lines(ad_script, max_chars: int = MAX_CAPTION_CHARS) -> List[str]:
+    """Script sentences broken at word boundaries into evenly sized captions of about max_chars."""
+    captions = []
+    for line in script_lines(ad_script):
+        parts = -(-len(line) // max_chars)
+        target = len(line) / parts
+        current, boundary, consumed = [], target, 0
+        for word in line.split():
+            # A word whose middle falls past the boundary opens the next caption
+            if current and consumed + len(word) / 2 > boundary:
+                captions.append(" ".join(current))
+                current = []
+                boundary += target
+            current.append(word)
+            consumed += len(word) + 1
+        if current:
+            captions.append(" ".join(current))
+    return captions
+
+
+def caption_timings(lines: Sequence[str], duration: float, min_weight: int = 4) -> List[Tuple[float, float]]:
+    """Split duration over the lines in proportion to their length, as narration roughly is."""
+    weights = np.array([max(min_weight, len(line)) for line in lines], dtype=np.float64)
+    if not len(weights):
+        return []
+    bounds = np.concatenate([[0.0], np.cumsum(weights) / weights.sum() * duration])
+    return [(float(bounds[i]), float(bounds[i + 1])) for i in range(len(lines))]
+
+
+class GlyphCache:
+    """Fill and outline masks plus advance width per character, rendered on first use."""
+
+    def __init__(self, font, stroke_width: int):
+        self.font = font
+        self.stroke_width = stroke_width
+        self.ascent, self.descent = font.getmetrics()
+        self._glyphs: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _mask(self, char: str, stroke_width: int):
+        mask, offset = self.font.getmask2(char, mode="L", stroke_width=stroke_width)
+        w, h = mask.size
+        alpha = np.asarray(mask, dtype=np.uint8).reshape(h, w) if w and h else np.zeros((0, 0), np.uint8)
+        return alpha, offset
+
+    def get(self, char: str) -> tuple:
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            fill = self._mask(char, 0)
+            stroke = self._mask(char, self.stroke_width) if self.stroke_width else fill
+            glyph = (fill, stroke, self.font.getlength(char))
+            with self._lock:
+                self._glyphs[char] = glyph
+        return glyph
+
+    def width(self, text: str) -> float:
+        return sum(self.get(char)[2] for char in text)
+
+
+_glyph_caches: Dict[tuple, GlyphCache] = {}
+_glyph_lock = threading.Lock()
+
+
+def load_font(font: str, font_size: int):
+    from PIL import ImageFont
+
+    for candidate in (font, f"{font}.ttf", *FALLBACK_FONTS):
+        try:
+            return ImageFont.truetype(candidate, font_size)
+        except OSError:
+            continue
+    print(f"Font {font} not found, using Pillow's default font")
+    return ImageFont.load_default(font_size)
+
+
+def get_glyph_cache(font: str, font_size: int, stroke_width: int) -> GlyphCache:
+    """Process-wide glyph cache per (font, size, outline width)."""
+    key = (font, font_size, stroke_width)
+    with _glyph_lock:
+        if key not in _glyph_caches:
+            _glyph_caches[key] = GlyphCache(load_font(font, font_size), stroke_width)
+        return _glyph_caches[key]
+
+
+def wrap(text: str, glyphs: GlyphCache, max_width: float) -> List[str]:
+    rows, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and glyphs.width(candidate) > max_width:
+            rows.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        rows.append(current)
+    return rows
+
+
+def rasterize(
+    text: str,
+    glyphs: GlyphCache,
+    max_width: int,
+    color: Tuple[int, int, int] = (255, 255, 255),
+    stroke_color: Tuple[int, int, int] = (0, 0, 0),
+    line_spacing: float = 1.15,
+) -> np.ndarray:
+    """Centered, wrapped caption as an RGBA array cropped to its visible pixels."""
+    rows = wrap(text, glyphs, max_width)
+    pad = glyphs.stroke_width
+    line_height = int((glyphs.ascent + glyphs.descent) * line_spacing)
+    width = int(max(glyphs.width(row) for row in rows)) + 2 * pad + 2
+    height = line_height * len(rows) + 2 * pad + 2
+    fill = np.zeros((height, width), dtype=np.uint8)
+    outline = np.zeros((height, width), dtype=np.uint8)
+
+    for r, row in enumerate(rows):
+        x = pad + (width - 2 * pad - glyphs.width(row)) / 2
+        y = pad + r * line_height
+        for char in row:
+            (fill_mask, fill_off), (stroke_mask, stroke_off), advance = glyphs.get(char)
+            # Outline offsets already include the stroke width
+            for mask, (ox, oy), target in ((stroke_mask, stroke_off, outline), (fill_mask, fill_off, fill)):
+                h, w = mask.shape
+                x0, y0 = int(round(x + ox)), int(y + oy)
+                x0c, y0c = max(0, x0), max(0, y0)
+                x1, y1 = min(width, x0 + w), min(height, y0 + h)
+                if x1 > x0c and y1 > y0c:
+                    region = target[y0c:y1, x0c:x1]
+                    np.maximum(region, mask[y0c - y0:y1 - y0, x0c - x0:x1 - x0], out=region)
+            x += advance
+
+    alpha = np.maximum(fill, outline)
+    weight = (fill.astype(np.float32) / 255.0)[..., None]
+    rgb = np.asarray(color, np.float32) * weight + np.asarray(stroke_color, np.float32) * (1 - weight)
+    sprite = np.dstack([rgb.astype(np.uint8), alpha])
+
+    ys, xs = np.nonzero(alpha)
+    if not len(ys):
+        return sprite[:1, :1]
+    return np.ascontiguousarray(sprite[ys.min():ys.max() + 1, xs.min():xs.max() + 1])
+
+
+def build_captions(
+    ad_script,
+    duration: float,
+    target_resolution: Tuple[int, int],
+    font: str = "Arial-Bold",
+    font_size: int = 48,
+    stroke_width: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Caption sprites for the script timed over duration seconds. Each entry has the
+    sprite's PNG 'path', its 'size', top-left 'position' in the frame and 'start'/'end'.
+    """
+    from PIL import Image
+
+    width, height = target_resolution
+    stroke_width = max(1, font_size // 12) if stroke_width is None else stroke_width
+    glyphs = get_glyph_cache(font, font_size, stroke_width)
+    lines = caption_lines(ad_script)
+
+    captions = []
+    with tracing.span("captions.rasterize", lines=len(lines)):
+        for line, (start, end) in zip(lines, caption_timings(lines, duration)):
+            key = DiskCache.make_key("caption", line, font, font_size, stroke_width, width)
+            path = caption_cache.get_path(key)
+            if path is None:
+                sprite = Image.fromarray(rasterize(line, glyphs, int(width * 0.86)), mode="RGBA")
+                tmp_path = caption_cache.path_for(key) + f".{os.getpid()}.{threading.get_ident()}.png"
+                os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+                sprite.save(tmp_path, optimize=False, compress_level=1)
+                path = caption_cache.put_file(key, tmp_path, move=True)
+                size = sprite.size
+            else:
+                tracing.count("captions.cache_hits")
+                with Image.open(path) as sprite:
+                    size = sprite.size
+
+            position = ((width - size[0]) // 2, int(height * CAPTION_Y - size[1] / 2))
+            captions.append({"text": line, "path": path, "size": size, "position": position, "start": start, "end": end})
+    return captions
+
+
+def overlay_filters(
+    captions: List[Dict[str, Any]],
+    first_input: int,
+    video_label: str,
+    out_label: str,
+    offset: float = 0.0,
+) -> Tuple[List[str], List[str]]:
+    """
+    Input args and an overlay chain burning captions into video_label; caption i is
+    input first_input + i. offset shifts caption times (for chunks that start later).
+    """
+    if not captions:
+        return [], [f"[{video_label}]null[{out_label}]"]
+
+    args, filters = [], []
+    current = video_label
+    for i, caption in enumerate(captions):
+        args += ["-i", caption["path"]]
+        x, y = caption["position"]
+        start, end = caption["start"] - offset, caption["end"] - offset
+        label = out_label if i == len(captions) - 1 else f"cap{i}"
+        filters.append(
+            f"[{current}][{first_input + i}:v]overlay=x={x}:y={y}:format=auto:"
+            f"enable='between(t,{start:.3f},{end:.3f})'[{label}]"
+        )
+        current = label
+    return args, filters
+
+
+def captions_between(captions: List[Dict[str, Any]], start: float, end: float) -> List[Dict[str, Any]]:
+    """Captions visible at some point in [start, end)."""
+    return [c for c in captions if c["end"] > start and c["start"] < end]
+
+
+def caption_clips(captions: List[Dict[str, Any]]) -> list:
+    """moviepy ImageClips (with alpha masks) for the moviepy backend."""
+    from PIL import Image
+    from moviepy.editor import ImageClip
+
+    clips = []
+    for caption in captions:
+        with Image.open(caption["path"]) as sprite:
+            rgba = np.asarray(sprite.convert("RGBA"))
+        mask = ImageClip(rgba[..., 3] / 255.0, ismask=True)
+        clip = ImageClip(rgba[..., :3]).set_mask(mask)
+        clips.append(clip.set_start(caption["start"]).set_end(caption["end"]).set_position(caption["position"]))
+    return clips
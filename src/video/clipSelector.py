@@ -3,30 +3,166 @@ Class-based video clip selector using CLIP embeddings and scene detection
 """
 
 import os
+import time
+import heapq
+import itertools
 import numpy as np
-import torch
-import open_clip
-from PIL import Image
 import hashlib
-from typing import List, Dict, Any
-from moviepy.editor import VideoFileClip
-from scenedetect import open_video, SceneManager
-from scenedetect.detectors import ContentDetector
-from scenedetect.detectors import ContentDetector
+import multiprocessing
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config.settings import (
+    EMBEDDING_STORE_DIR, SCENE_STORE_DIR, CLIP_MODEL_NAME, CLIP_PRETRAINED, CLIP_PRECISION,
+    CLIP_INDEX_STORAGE, CLIP_SAMPLING, CLIP_MAX_FRAMES,
+)
+from utils import tracing
+from utils.hashing import file_digest, load_digest_memo, save_digest_memo
+from video.alignment import align_lines
+from video.batch_embedder import BatchEmbedder
+from video.clip_index import ClipIndex
+from video.embedding_store import EmbeddingStore, SceneStore
+from video.captions import caption_timings, script_lines
+from video.frame_sampler import iter_segment_frames, iter_segment_keyframes
+from video.scene_detection import detect_scenes, scene_params_key
 
 
 class ClipSelector:
-    def __init__(self, model_name='ViT-L-14', device=None):
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.model, _, self.preprocess = open_clip.create_model_and_transforms(model_name, pretrained='openai')
-        self.tokenizer = open_clip.get_tokenizer(model_name)
-        self.model.to(self.device).eval()
+    """
+    torch/open_clip are imported and the CLIP weights loaded on first use (or by
+    warmup()), so constructing a selector is cheap and fully cached runs that never
+    embed anything never pay for the model.
+    """
+
+    def __init__(
+        self,
+        model_name=CLIP_MODEL_NAME,
+        device=None,
+        pretrained=CLIP_PRETRAINED,
+        precision: str = CLIP_PRECISION,
+        num_frames: int = 4,
+        store_dir: str = EMBEDDING_STORE_DIR,
+        batch_size: int = 32,
+        preprocess_workers: int = 4,
+        scene_store_dir: str = SCENE_STORE_DIR,
+        scene_workers: int = None,
+        scene_downscale: Optional[int] = None,
+        scene_frame_skip: int = 0,
+        index_storage: str = CLIP_INDEX_STORAGE,
+        sampling: str = CLIP_SAMPLING,
+        max_frames: int = CLIP_MAX_FRAMES,
+        change_threshold: float = 0.04,
+    ):
+        self.model_name = model_name
+        self.pretrained = pretrained
+        self.precision = precision
+        self._device = device
+        self._model = None
+        self._preprocess = None
+        self._tokenizer = None
+        self._load_lock = threading.Lock()
+        self._warm = False
+        self.num_frames = num_frames
+        self.batch_size = batch_size
+        self.preprocess_workers = preprocess_workers
+        self.model_lock = threading.Lock()
+        self.scene_workers = scene_workers or os.cpu_count() or 1
+        self.scene_downscale = scene_downscale
+        self.scene_frame_skip = scene_frame_skip
+        self.index_storage = index_storage
+        if sampling not in ("uniform", "adaptive"):
+            raise ValueError(f"Unknown frame sampling mode {sampling}, expected 'uniform' or 'adaptive'")
+        self.sampling = sampling
+        self.max_frames = max_frames
+        self.change_threshold = change_threshold
 
         # Runtime-only caches
-        self.scene_cache: Dict[str, List[tuple]] = {}
+        self.scene_cache: Dict[tuple, List[tuple]] = {}
         self.embedding_cache: Dict[str, np.ndarray] = {}
         self.text_embedding_cache: Dict[str, np.ndarray] = {}
 
+        # Persistent segment embeddings keyed by file content; pass store_dir=None to disable
+        self.store = None
+        self.digest_memo_path = None
+        if store_dir:
+            self.store = EmbeddingStore(
+                store_dir, model_name=model_name, pretrained=pretrained, num_frames=num_frames,
+                precision=precision, sampling=self.sampling_key())
+            self.digest_memo_path = os.path.join(store_dir, "digests.json")
+            load_digest_memo(self.digest_memo_path)
+        self.scene_store = SceneStore(scene_store_dir) if scene_store_dir else None
+
+    def sampling_key(self) -> Optional[str]:
+        """Identifies non-default sampling settings, which produce different embeddings; None for uniform."""
+        if self.sampling == "uniform":
+            return None
+        return f"adaptive:{self.max_frames}:{self.change_threshold:g}"
+
+    def _load_model(self) -> None:
+        with self._load_lock:
+            if self._model is not None:
+                return
+            start = time.perf_counter()
+            with tracing.span("clip.load_model", model=self.model_name, precision=self.precision):
+                import torch
+                import open_clip
+
+                self._device = self._device or ("cuda" if torch.cuda.is_available() else "cpu")
+                model, _, preprocess = open_clip.create_model_and_transforms(
+                    self.model_name, pretrained=self.pretrained, precision=self.precision, device=self._device)
+                self._tokenizer = open_clip.get_tokenizer(self.model_name)
+            self._preprocess = preprocess
+            self._model = model.eval()
+            print(f"Loaded CLIP {self.model_name} ({self.pretrained}, {self.precision}) on {self._device} "
+                  f"in {time.perf_counter() - start:.1f}s")
+
+    @property
+    def model(self):
+        self._load_model()
+        return self._model
+
+    @property
+    def preprocess(self):
+        self._load_model()
+        return self._preprocess
+
+    @property
+    def tokenizer(self):
+        self._load_model()
+        return self._tokenizer
+
+    @property
+    def device(self) -> str:
+        self._load_model()
+        return self._device
+
+    @property
+    def dtype(self):
+        # dtype the image tower takes its pixels in. With precision fp16/bf16 open_clip
+        # converts only the weight matrices, so e.g. positional_embedding, the first
+        # parameter, stays float32
+        visual = self.model.visual
+        conv1 = getattr(visual, "conv1", None)
+        if conv1 is not None:
+            return conv1.weight.dtype
+        # Other towers: the reduced precision, if any weights carry one
+        dtypes = [param.dtype for param in visual.parameters()]
+        return next((dtype for dtype in dtypes if dtype != dtypes[0]), dtypes[0])
+
+    def warmup(self) -> None:
+        """Load the model and run one text and one image forward pass so later calls are hot."""
+        if self._warm:
+            return
+        import torch
+        from PIL import Image
+
+        with self.model_lock, torch.no_grad():
+            tokens = self.tokenizer(["warmup"]).to(self.device)
+            self.model.encode_text(tokens)
+            image = self.preprocess(Image.new("RGB", (224, 224))).unsqueeze(0)
+            self.model.encode_image(image.to(self.device, dtype=self.dtype))
+        self._warm = True
+
     def make_segment_key(self, video_path: str, start: float, end: float) -> str:
         key = f"{video_path}_{start:.2f}_{end:.2f}"
         return hashlib.md5(key.encode()).hexdigest()
@@ -35,135 +171,399 @@ class ClipSelector:
         if text in self.text_embedding_cache:
             return self.text_embedding_cache[text]
 
+        import torch
+
         tokens = self.tokenizer([text]).to(self.device)
-        with torch.no_grad():
+        with tracing.span("clip.encode_text"), self.model_lock, torch.no_grad():
             text_embed = self.model.encode_text(tokens)
             text_embed /= text_embed.norm(dim=-1, keepdim=True)
 
-        result = text_embed.cpu().numpy().flatten()
+        result = text_embed.float().cpu().numpy().flatten()
         self.text_embedding_cache[text] = result
         return result
     
+    def get_text_embeddings(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), D) normalized embeddings; texts not cached yet are encoded in one batch."""
+        missing = list(dict.fromkeys(t for t in texts if t not in self.text_embedding_cache))
+        if missing:
+            import torch
+
+            tokens = self.tokenizer(missing).to(self.device)
+            with tracing.span("clip.encode_text", texts=len(missing)), self.model_lock, torch.no_grad():
+                text_embeds = self.model.encode_text(tokens)
+                text_embeds /= text_embeds.norm(dim=-1, keepdim=True)
+            for text, embedding in zip(missing, text_embeds.float().cpu().numpy()):
+                self.text_embedding_cache[text] = embedding
+        return np.stack([self.text_embedding_cache[t] for t in texts])
+
     def get_image_embedding(self, image_path: str) -> np.ndarray:
         if image_path in self.embedding_cache:
             return self.embedding_cache[image_path]
 
+        import torch
+        from PIL import Image
+
         image = Image.open(image_path).convert("RGB")
-        image_tensor = self.preprocess(image).unsqueeze(0).to(self.device)
+        image_tensor = self.preprocess(image).unsqueeze(0).to(self.device, dtype=self.dtype)
 
-        with torch.no_grad():
+        with self.model_lock, torch.no_grad():
             embedding = self.model.encode_image(image_tensor)
             embedding /= embedding.norm(dim=-1, keepdim=True)
 
-        result = embedding.cpu().numpy().flatten()
+        result = embedding.float().cpu().numpy().flatten()
         self.embedding_cache[image_path] = result
         return result
 
 
-    def get_clip_embedding_multi(self, clip: VideoFileClip, num_frames: int = 5) -> np.ndarray:
-        # Sample evenly spaced timestamps starting from 0.0 to just before the clip ends
-        if clip.duration <= 0:
+    def make_batch_embedder(self) -> BatchEmbedder:
+        return BatchEmbedder(
+            self.model,
+            self.preprocess,
+            self.device,
+            dtype=self.dtype,
+            batch_size=self.batch_size,
+            preprocess_workers=self.preprocess_workers,
+            model_lock=self.model_lock,
+        )
+
+    def sample_frames(self, clip: "VideoFileClip", start: float, end: float, num_frames: int):
+        # Evenly spaced timestamps from start to just before the segment ends
+        if end - start <= 0:
             raise ValueError("Clip duration must be positive.")
-        
-        times = np.linspace(0.0, max(0.0, clip.duration - 0.01), num_frames)
-        embeddings = []
 
-        for t in times:
-            frame = clip.get_frame(t)
-            image = Image.fromarray(frame.astype(np.uint8))
-            image_tensor = self.preprocess(image).unsqueeze(0).to(self.device)
+        for t in start + np.linspace(0.0, max(0.0, end - start - 0.01), num_frames):
+            yield clip.get_frame(t)
+
+    def get_clip_embedding_multi(self, clip: "VideoFileClip", num_frames: int = 5) -> np.ndarray:
+        # Sample first, so a clip that can't be read fails without loading the model
+        frames = list(self.sample_frames(clip, 0.0, clip.duration, num_frames))
+        embedder = self.make_batch_embedder()
+        try:
+            embedder.add(0, frames)
+            return embedder.run()[0]
+        finally:
+            embedder.close()
+
+    def make_segments(self, scenes: List[tuple], max_segment_duration: int, min_segment_duration: int) -> List[tuple]:
+        final_segments = []
+        for start, end in scenes:
+            duration = end - start
+            if duration > max_segment_duration:
+                for s in range(0, int(duration), max_segment_duration):
+                    seg_start = start + s
+                    seg_end = min(seg_start + max_segment_duration, end)
+                    if seg_end - seg_start >= min_segment_duration:
+                        final_segments.append((seg_start, seg_end))
+            elif duration >= min_segment_duration:
+                final_segments.append((start, end))
+        return final_segments
+
+    def _cached_scenes(self, path: str, params: str) -> Optional[List[tuple]]:
+        if (path, params) in self.scene_cache:
+            return self.scene_cache[(path, params)]
+        if self.scene_store:
+            scenes = self.scene_store.get(file_digest(path), params)
+            if scenes is not None:
+                self.scene_cache[(path, params)] = scenes
+                return scenes
+        return None
+
+    def _remember_scenes(self, path: str, params: str, scenes: List[tuple]) -> None:
+        self.scene_cache[(path, params)] = scenes
+        if self.scene_store:
+            self.scene_store.put(file_digest(path), params, scenes)
 
-            with torch.no_grad():
-                embedding = self.model.encode_image(image_tensor)
-                embedding /= embedding.norm(dim=-1, keepdim=True)
-                embeddings.append(embedding.cpu().numpy())
-
-        embeddings = np.vstack(embeddings)
-        avg_embedding = embeddings.mean(axis=0)
-        avg_embedding /= np.linalg.norm(avg_embedding)
-        return avg_embedding
+    def split_video_by_scene(self, path: str, threshold: float = 40.0) -> List[tuple]:
+        params = scene_params_key(threshold, self.scene_downscale, self.scene_frame_skip)
+        scenes = self._cached_scenes(path, params)
+        if scenes is None:
+            with tracing.span("detect_scenes", video=os.path.basename(path)):
+                scenes = detect_scenes(path, threshold, self.scene_downscale, self.scene_frame_skip)
+            tracing.count("scenes.detected")
+            self._remember_scenes(path, params, scenes)
+        return scenes
 
+    def iter_scenes(self, video_paths: List[str], threshold: float = 40.0) -> Iterator[tuple]:
+        """
+        Yield (path, scenes, error) as scene lists become available. Cached lists come
+        first; the rest are detected in a process pool, so callers can embed the
+        videos already segmented while others are still being analyzed.
+        """
+        params = scene_params_key(threshold, self.scene_downscale, self.scene_frame_skip)
+        pending = []
+        for path in video_paths:
+            try:
+                scenes = self._cached_scenes(path, params)
+            except Exception as e:
+                yield path, None, e
+                continue
+            if scenes is None:
+                pending.append(path)
+            else:
+                tracing.count("scenes.cache_hits")
+                yield path, scenes, None
+
+        if not pending:
+            return
+
+        if self.scene_workers <= 1 or len(pending) == 1:
+            for path in pending:
+                try:
+                    yield path, self.split_video_by_scene(path, threshold), None
+                except Exception as e:
+                    yield path, None, e
+            return
+
+        # Spawned, not forked: by now this process runs model, pipeline and service threads,
+        # and a fork could inherit their held locks
+        spawn = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(self.scene_workers, len(pending)), mp_context=spawn) as pool:
+            futures = {
+                pool.submit(detect_scenes, path, threshold, self.scene_downscale, self.scene_frame_skip): path
+                for path in pending
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    scenes = future.result()
+                    tracing.count("scenes.detected")
+                    self._remember_scenes(path, params, scenes)
+                except Exception as e:
+                    yield path, None, e
+                    continue
+                yield path, scenes, None
+
+    def build_index(
+        self,
+        video_paths: List[str],
+        max_segment_duration: int = 5,
+        min_segment_duration: int = 1,
+        failed: Optional[List[str]] = None,
+    ) -> ClipIndex:
+        """
+        Segment and embed every video (reusing stored embeddings) into one ClipIndex.
+        Videos that could not be analyzed are appended to failed, if given, so
+        incremental callers can retry them.
+        """
+        with tracing.span("build_index", videos=len(video_paths)):
+            return self._build_index(video_paths, max_segment_duration, min_segment_duration, failed=failed)
+
+    def _build_index(
+        self,
+        video_paths: List[str],
+        max_segment_duration: int,
+        min_segment_duration: int,
+        retain: bool = True,
+        failed: Optional[List[str]] = None,
+    ) -> ClipIndex:
+        # retain=False drops the embeddings from embedding_cache once they are in the index
+        # Pass 1: resolve cached segments and queue frames of the rest for batched embedding
+        analyzed = []
+        failed = [] if failed is None else failed
+        # Built once a segment turns out to be missing, so fully cached builds never load the model
+        embedder = None
+        # Adaptive sampling: content hash of the kept frames -> segment key that embeds it, and
+        # each exactly duplicated segment key -> the key whose embedding it shares
+        signature_owners: Dict[bytes, str] = {}
+        aliases: Dict[str, str] = {}
+
+        for video_path, scenes, error in self.iter_scenes(video_paths):
+            print(f'Analyzing video: {os.path.basename(video_path)}')
+            try:
+                if error is not None:
+                    raise error
+                final_segments = self.make_segments(scenes, max_segment_duration, min_segment_duration)
 
-    def split_video_by_scene(self, path: str, threshold: float = 40.0) -> List[tuple]:
-        if path in self.scene_cache:
-            return self.scene_cache[path]
+                with tracing.span("store_lookup", segments=len(final_segments)):
+                    digest = file_digest(video_path) if self.store else None
+                    stored = self.store.lookup(digest, final_segments) if self.store else [None] * len(final_segments)
+                missing, missing_keys = [], []
 
-        video = open_video(path)
-        scene_manager = SceneManager()
-        scene_manager.add_detector(ContentDetector(threshold=threshold))
-        scene_manager.detect_scenes(video)
+                for (seg_start, seg_end), stored_embedding in zip(final_segments, stored):
+                    seg_key = self.make_segment_key(video_path, seg_start, seg_end)
+                    if seg_key in self.embedding_cache:
+                        continue
+                    if stored_embedding is not None:
+                        self.embedding_cache[seg_key] = stored_embedding
+                        continue
+                    missing.append((seg_start, seg_end))
+                    missing_keys.append(seg_key)
+
+                tracing.count("segments.cached", len(final_segments) - len(missing))
+                tracing.count("segments.missing", len(missing))
+
+                if missing:
+                    if embedder is None:
+                        embedder = self.make_batch_embedder()
+                    # One forward decode per video, frames streamed straight into the embedder
+                    with tracing.span("decode_frames", video=os.path.basename(video_path), segments=len(missing)):
+                        if self.sampling == "adaptive":
+                            self._add_keyframes(embedder, video_path, missing, missing_keys, signature_owners, aliases)
+                        else:
+                            for seg_idx, frame in iter_segment_frames(video_path, missing, self.num_frames):
+                                embedder.add(missing_keys[seg_idx], (frame,))
+
+                analyzed.append((video_path, digest, final_segments, missing))
 
-        scene_list = scene_manager.get_scene_list()
-        scenes = [(start.get_seconds(), end.get_seconds()) for start, end in scene_list]
+            except Exception as e:
+                print(f"Error processing video {video_path}: {e}")
+                failed.append(video_path)
+
+        new_embeddings = {}
+        if embedder is not None:
+            with tracing.span("embed"):
+                new_embeddings = embedder.run()
+            embedder.close()
+        for key, owner in aliases.items():
+            if owner in new_embeddings:
+                new_embeddings[key] = new_embeddings[owner]
+        tracing.count("segments.embedded", len(new_embeddings))
+        self.embedding_cache.update(new_embeddings)
+
+        # Pass 2: persist new embeddings and gather every segment into the index
+        index = ClipIndex(storage=self.index_storage)
+
+        for video_path, digest, final_segments, missing in analyzed:
+            if self.store and missing:
+                keys = [self.make_segment_key(video_path, s, e) for s, e in missing]
+                done = [(seg, new_embeddings[key]) for seg, key in zip(missing, keys) if key in new_embeddings]
+                if done:
+                    with tracing.span("store_put", segments=len(done)):
+                        self.store.put(digest, [seg for seg, _ in done], np.vstack([emb for _, emb in done]))
+
+            segments, embeddings = [], []
+            for seg_start, seg_end in final_segments:
+                seg_key = self.make_segment_key(video_path, seg_start, seg_end)
+                embedding = self.embedding_cache.get(seg_key) if retain else self.embedding_cache.pop(seg_key, None)
+                if embedding is not None:
+                    segments.append((seg_start, seg_end))
+                    embeddings.append(embedding)
+            if segments:
+                index.add(video_path, segments, np.vstack(embeddings))
+
+        if self.digest_memo_path:
+            save_digest_memo(self.digest_memo_path)
+        return index
+
+    def _add_keyframes(self, embedder, video_path, segments, keys, signature_owners, aliases) -> None:
+        """Queue only the frames that differ visibly; byte-identical footage already queued is not embedded again."""
+        for seg_idx, frames, signature in iter_segment_keyframes(
+                video_path, segments, self.max_frames, self.change_threshold):
+            key = keys[seg_idx]
+            owner = signature_owners.setdefault(signature, key)
+            if owner != key:
+                aliases[key] = owner
+                tracing.count("segments.deduplicated")
+                continue
+            embedder.add(key, frames)
+
+    def rank_index(
+        self,
+        index: ClipIndex,
+        embedding_prompt: str,
+        reference_image_path: str = None,
+        text_weight: float = 0.5,  # Range [0, 1]
+        top_k: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        text_embedding = self.get_text_embedding(embedding_prompt)
+        reference_image_embedding = None
+        if reference_image_path:
+            reference_image_embedding = self.get_image_embedding(reference_image_path)
 
-        self.scene_cache[path] = scenes
-        return scenes
+        with tracing.span("rank", segments=len(index)):
+            return index.rank(text_embedding, k=top_k, reference_embedding=reference_image_embedding, text_weight=text_weight)
 
-    def get_ranked_clips(
+    def stream_ranked_clips(
         self,
-        video_paths: List[str],
+        video_paths: Iterable[str],
         embedding_prompt: str,
+        duration: Optional[float] = None,
+        min_score_threshold: float = 0.005,
+        top_k: int = 256,
+        chunk_videos: int = 16,
         max_segment_duration: int = 5,
         min_segment_duration: int = 1,
         reference_image_path: str = None,
-        text_weight: float = 0.5  # Range [0, 1]
+        text_weight: float = 0.5,  # Range [0, 1]
     ) -> List[Dict[str, Any]]:
-
+        """
+        Rank videos from an iterable chunk_videos at a time, keeping only the top_k
+        segments seen so far. Each chunk's embeddings go to the store and are not kept
+        in memory. With duration, stops as soon as the kept segments scoring at least
+        min_score_threshold add up to duration seconds.
+        """
         text_embedding = self.get_text_embedding(embedding_prompt)
         reference_image_embedding = None
         if reference_image_path:
             reference_image_embedding = self.get_image_embedding(reference_image_path)
+        query = ClipIndex.combine_queries(text_embedding, reference_image_embedding, text_weight)
+
+        # Min-heap of (score, seq, record), so the weakest kept segment is evicted first
+        heap: List[tuple] = []
+        seq = itertools.count()
+        videos = iter(video_paths)
+        scanned = 0
+
+        with tracing.span("stream_rank", top_k=top_k) as span:
+            while True:
+                chunk = list(itertools.islice(videos, chunk_videos))
+                if not chunk:
+                    break
+                scanned += len(chunk)
+                index = self._build_index(chunk, max_segment_duration, min_segment_duration, retain=False)
+                if len(index):
+                    scores = index.scores(query)[0]
+                    for record in index.records(ClipIndex.top_k(scores, top_k), scores):
+                        item = (record["similarity"], next(seq), record)
+                        if len(heap) < top_k:
+                            heapq.heappush(heap, item)
+                        elif item[0] > heap[0][0]:
+                            heapq.heapreplace(heap, item)
+
+                if duration is not None:
+                    footage = sum(record["duration"] for score, _, record in heap if score >= min_score_threshold)
+                    if footage >= duration:
+                        print(f"Found {footage:.1f}s of matching footage in the first {scanned} videos")
+                        tracing.count("stream_rank.early_stops")
+                        break
+            span.set(videos=scanned)
+
+        return [record for _, _, record in sorted(heap, key=lambda item: (-item[0], item[1]))]
+
+    def align_script(
+        self,
+        index: ClipIndex,
+        ad_script,
+        duration: float,
+        reference_image_path: str = None,
+        text_weight: float = 0.5,
+        min_score_threshold: float = 0.005,
+    ) -> List[Dict[str, Any]]:
+        """
+        Play-ordered timeline over duration seconds of narration where each script line
+        is shown over the segments matching it best (see video.alignment).
+        """
+        lines = script_lines(ad_script)
+        if not lines:
+            raise ValueError("The ad script has no lines to align")
+        line_embeddings = self.get_text_embeddings(lines)
+        reference_image_embedding = None
+        if reference_image_path:
+            reference_image_embedding = self.get_image_embedding(reference_image_path)
+        return align_lines(
+            index, line_embeddings, caption_timings(lines, duration),
+            reference_image_embedding, text_weight, min_score_threshold,
+        )
 
-        segments_scores = []
-
-        for video_path in video_paths:
-            print(f'Analyzing video: {os.path.basename(video_path)}')
-            try:
-                clip = VideoFileClip(video_path)
-                scenes = self.split_video_by_scene(video_path)
-
-                final_segments = []
-                for start, end in scenes:
-                    duration = end - start
-                    if duration > max_segment_duration:
-                        for s in range(0, int(duration), max_segment_duration):
-                            seg_start = start + s
-                            seg_end = min(seg_start + max_segment_duration, end)
-                            if seg_end - seg_start >= min_segment_duration:
-                                final_segments.append((seg_start, seg_end))
-                    elif duration >= min_segment_duration:
-                        final_segments.append((start, end))
-
-                for i, (seg_start, seg_end) in enumerate(final_segments):
-                    seg_key = self.make_segment_key(video_path, seg_start, seg_end)
-
-                    if seg_key in self.embedding_cache:
-                        embedding = self.embedding_cache[seg_key]
-                    else:
-                        segment = clip.subclip(seg_start, seg_end)
-                        embedding = self.get_clip_embedding_multi(segment, num_frames=4)
-                        self.embedding_cache[seg_key] = embedding
-                        segment.close()
-
-                    text_similarity = float(np.dot(embedding, text_embedding))
-                    if reference_image_embedding is not None:
-                        image_similarity = float(np.dot(embedding, reference_image_embedding))
-                        similarity = (text_weight * text_similarity) + ((1 - text_weight) * image_similarity)
-                    else:
-                        similarity = text_similarity
-
-                    segments_scores.append({
-                        "start": seg_start,
-                        "end": seg_end,
-                        "similarity": similarity,
-                        "duration": seg_end - seg_start,
-                        "source": video_path
-                    })
-
-                clip.close()
-
-            except Exception as e:
-                print(f"Error processing video {video_path}: {e}")
-
-        segments_scores.sort(key=lambda x: x['similarity'], reverse=True)
-        return segments_scores
\ No newline at end of file
+    def get_ranked_clips(
+        self,
+        video_paths: List[str],
+        embedding_prompt: str,
+        max_segment_duration: int = 5,
+        min_segment_duration: int = 1,
+        reference_image_path: str = None,
+        text_weight: float = 0.5,  # Range [0, 1]
+        top_k: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        index = self.build_index(video_paths, max_segment_duration, min_segment_duration)
+        return self.rank_index(index, embedding_prompt, reference_image_path, text_weight, top_k)
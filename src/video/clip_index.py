@@ -0,0 +1,322 @@
+"""
+Matrix-backed index over the segment embeddings of an asset library
+"""
+
+import os
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+# Rows scored per block for quantized storage; the dequantized block (768 KB at
+# D=768) is reused across blocks and stays in cache for the matrix product
+SCORE_BLOCK_ROWS = 256
+# float16 bits shifted into float32 position read as value * 2**-112 (see scores)
+HALF_EXPONENT_SCALE = 2.0 ** 112
+# Clears the three sign-extension bits left above the exponent by that shift
+HALF_BITS_MASK = np.int32(-0x70000001)  # 0x8FFFFFFF
+
+
+def quantize(embeddings: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Return (codes, per-row scales) for the storage type; scales is None unless int8."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if storage == "float32":
+        return embeddings, None
+    if storage == "float16":
+        return embeddings.astype(np.float16), None
+    if storage == "int8":
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown storage type {storage}, expected one of {STORAGE_TYPES}")
+
+
+class ClipIndex:
+    """
+    All segment embeddings of a library as one contiguous (N, D) matrix (float32,
+    or quantized, see __init__), with parallel arrays for source, start and end. Ranking is a single
+    matrix product followed by an argpartition top-k.
+    """
+
+    def __init__(self, storage: str = "float32"):
+        """
+        storage: "float32", "float16" (half the memory) or "int8" with a float32
+            scale per vector (about a quarter). Quantized rows are scored block-wise
+            without materializing a float32 copy of the library, which costs speed:
+            at 50k x 768, one query scores in about 12 ms for float32 and int8 and about
+            30 ms for float16 (quantization_report measures it for a given index).
+        """
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage type {storage}, expected one of {STORAGE_TYPES}")
+        self.storage = storage
+        self.sources: List[str] = []
+        self._source_ids: Dict[str, int] = {}
+
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._codes = np.zeros((0, 0), dtype=storage)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._source_idx = np.zeros(0, dtype=np.int32)
+        self._starts = np.zeros(0, dtype=np.float64)
+        self._ends = np.zeros(0, dtype=np.float64)
+
+    def add(self, source: str, segments: Sequence[Tuple[float, float]], embeddings: np.ndarray) -> None:
+        """Append the segments of one source file with their (len(segments), D) embeddings."""
+        if not len(segments):
+            return
+        if source not in self._source_ids:
+            self._source_ids[source] = len(self.sources)
+            self.sources.append(source)
+
+        bounds = np.asarray(segments, dtype=np.float64).reshape(-1, 2)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(bounds), -1)
+        source_idx = np.full(len(bounds), self._source_ids[source], dtype=np.int32)
+        self._pending.append((embeddings, source_idx, bounds[:, 0], bounds[:, 1]))
+
+    def _consolidate(self) -> None:
+        if not self._pending:
+            return
+        codes, scales = quantize(np.vstack([p[0] for p in self._pending]), self.storage)
+        self._codes = np.ascontiguousarray(np.vstack([self._codes, codes]) if len(self._codes) else codes)
+        if scales is not None:
+            self._scales = np.concatenate([self._scales, scales])
+        self._source_idx = np.concatenate([self._source_idx] + [p[1] for p in self._pending])
+        self._starts = np.concatenate([self._starts] + [p[2] for p in self._pending])
+        self._ends = np.concatenate([self._ends] + [p[3] for p in self._pending])
+        self._pending = []
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """The library matrix as float32 (dequantized copy for quantized storage)."""
+        self._consolidate()
+        if self.storage == "float32":
+            return self._codes
+        if self.storage == "int8":
+            return self._codes.astype(np.float32) * self._scales[:, None]
+        return self._codes.astype(np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the embedding matrix (and int8 scales)."""
+        self._consolidate()
+        return self._codes.nbytes + (self._scales.nbytes if self.storage == "int8" else 0)
+
+    @property
+    def starts(self) -> np.ndarray:
+        self._consolidate()
+        return self._starts
+
+    @property
+    def ends(self) -> np.ndarray:
+        self._consolidate()
+        return self._ends
+
+    @property
+    def source_idx(self) -> np.ndarray:
+        self._consolidate()
+        return self._source_idx
+
+    def __len__(self) -> int:
+        self._consolidate()
+        return len(self._codes)
+
+    @staticmethod
+    def combine_queries(
+        text_embeddings: np.ndarray,
+        reference_embedding: Optional[np.ndarray] = None,
+        text_weight: float = 0.5,
+    ) -> np.ndarray:
+        """
+        Fold the text / reference-image weighting into the query vectors; since the
+        score is linear, w * (E @ t) + (1 - w) * (E @ r) == E @ (w * t + (1 - w) * r).
+        """
+        queries = np.atleast_2d(np.asarray(text_embeddings, dtype=np.float32))
+        if reference_embedding is not None:
+            reference = np.asarray(reference_embedding, dtype=np.float32).reshape(1, -1)
+            queries = text_weight * queries + (1 - text_weight) * reference
+        return queries
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """(Q, N) similarity of every query against every segment."""
+        queries = np.atleast_2d(queries).astype(np.float32, copy=False)
+        if not len(self):
+            return np.zeros((len(queries), 0), dtype=np.float32)
+        if self.storage == "float32":
+            return queries @ self._codes.T
+
+        # Quantized rows: dequantize a block at a time into one reused buffer; for int8
+        # the per-row scale factors out of the dot product, so it is applied to the
+        # block's scores instead
+        num_rows, dim = self._codes.shape
+        scores = np.empty((len(queries), num_rows), dtype=np.float32)
+        if self.storage == "float16":
+            # numpy's float16 cast converts element by element. Shifting the raw bits
+            # into float32 position is exact and vectorized, and leaves every value
+            # 2**112 too small, which the queries make up for
+            bits = np.empty((min(SCORE_BLOCK_ROWS, num_rows), dim), dtype=np.int32)
+            block = bits.view(np.float32)
+            queries = queries * np.float32(HALF_EXPONENT_SCALE)
+        else:
+            block = np.empty((min(SCORE_BLOCK_ROWS, num_rows), dim), dtype=np.float32)
+
+        for start in range(0, num_rows, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, num_rows)
+            rows = end - start
+            if self.storage == "float16":
+                np.left_shift(self._codes[start:end].view(np.int16), 13, out=bits[:rows], dtype=np.int32)
+                np.bitwise_and(bits[:rows], HALF_BITS_MASK, out=bits[:rows])
+            else:
+                np.copyto(block[:rows], self._codes[start:end])
+            np.matmul(queries, block[:rows].T, out=scores[:, start:end])
+            if self.storage == "int8":
+                scores[:, start:end] *= self._scales[start:end]
+        return scores
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+        """Indices of the k highest scores in descending order (all of them when k is None)."""
+        n = scores.shape[-1]
+        if k is None or k >= n:
+            return np.argsort(-scores, kind="stable")
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def records(self, indices: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        """Segment dicts in the shape assemble_final_video consumes."""
+        starts, ends, source_idx = self.starts, self.ends, self.source_idx
+        return [
+            {
+                "start": float(starts[i]),
+                "end": float(ends[i]),
+                "similarity": float(scores[i]),
+                "duration": float(ends[i] - starts[i]),
+                "source": self.sources[source_idx[i]],
+            }
+            for i in indices
+        ]
+
+    def rank_many(
+        self,
+        text_embeddings: np.ndarray,
+        k: Optional[int] = None,
+        reference_embedding: Optional[np.ndarray] = None,
+        text_weight: float = 0.5,
+    ) -> List[List[Dict[str, Any]]]:
+        """Rank the library against several prompts at once with one matrix-matrix product."""
+        all_scores = self.scores(self.combine_queries(text_embeddings, reference_embedding, text_weight))
+        return [self.records(self.top_k(row, k), row) for row in all_scores]
+
+    def rank(
+        self,
+        text_embedding: np.ndarray,
+        k: Optional[int] = None,
+        reference_embedding: Optional[np.ndarray] = None,
+        text_weight: float = 0.5,
+    ) -> List[Dict[str, Any]]:
+        return self.rank_many(text_embedding, k, reference_embedding, text_weight)[0]
+
+    def extend(self, other: "ClipIndex") -> None:
+        """Append every segment of other (re-encoded to this index's storage)."""
+        embeddings, source_idx = other.embeddings, other.source_idx
+        bounds = np.stack([other.starts, other.ends], axis=1)
+        for i, source in enumerate(other.sources):
+            rows = source_idx == i
+            self.add(source, bounds[rows], embeddings[rows])
+
+    def remove_sources(self, sources: Sequence[str]) -> int:
+        """Drop all segments of the given source files; returns the number of rows removed."""
+        self._consolidate()
+        drop = {self._source_ids[s] for s in sources if s in self._source_ids}
+        if not drop:
+            return 0
+
+        keep = ~np.isin(self._source_idx, list(drop))
+        remap = np.full(len(self.sources), -1, dtype=np.int32)
+        kept_sources = []
+        for old, source in enumerate(self.sources):
+            if old not in drop:
+                remap[old] = len(kept_sources)
+                kept_sources.append(source)
+
+        removed = int(len(keep) - keep.sum())
+        self._codes = np.ascontiguousarray(self._codes[keep])
+        if self.storage == "int8":
+            self._scales = self._scales[keep]
+        self._source_idx = remap[self._source_idx[keep]]
+        self._starts = self._starts[keep]
+        self._ends = self._ends[keep]
+        self.sources = kept_sources
+        self._source_ids = {source: i for i, source in enumerate(kept_sources)}
+        return removed
+
+    def save(self, path: str) -> None:
+        """Write the index (in its storage encoding) to an .npz file, atomically."""
+        self._consolidate()
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            storage=np.array(self.storage),
+            sources=np.array(self.sources, dtype=str),
+            codes=self._codes,
+            scales=self._scales,
+            source_idx=self._source_idx,
+            starts=self._starts,
+            ends=self._ends,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ClipIndex":
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(storage=str(data["storage"]))
+            index.sources = [str(s) for s in data["sources"]]
+            index._source_ids = {source: i for i, source in enumerate(index.sources)}
+            index._codes = data["codes"]
+            index._scales = data["scales"]
+            index._source_idx = data["source_idx"]
+            index._starts = data["starts"]
+            index._ends = data["ends"]
+        return index
+
+    def with_storage(self, storage: str) -> "ClipIndex":
+        """Copy of this index re-encoded with another storage type."""
+        copy = ClipIndex(storage=storage)
+        copy.sources = list(self.sources)
+        copy._source_ids = dict(self._source_ids)
+        if len(self):
+            copy._pending.append((self.embeddings, self.source_idx.copy(), self.starts.copy(), self.ends.copy()))
+        return copy
+
+
+def quantization_report(index: ClipIndex, queries: np.ndarray, k: int = 20) -> Dict[str, Dict[str, float]]:
+    """
+    Compare each storage type against float32: mean/min top-k overlap over the
+    queries, rank-1 agreement, memory footprint and time to score the queries.
+    """
+    reference = index if index.storage == "float32" else index.with_storage("float32")
+    queries = np.atleast_2d(queries)
+    ref_scores = reference.scores(queries)
+    ref_top = [set(ClipIndex.top_k(row, k)) for row in ref_scores]
+    ref_first = [ClipIndex.top_k(row, 1)[0] for row in ref_scores] if len(reference) else []
+
+    report = {}
+    for storage in STORAGE_TYPES:
+        candidate = reference if storage == "float32" else reference.with_storage(storage)
+        len(candidate)  # re-encode before timing
+        started = time.perf_counter()
+        scores = candidate.scores(queries)
+        score_ms = (time.perf_counter() - started) * 1000
+        overlaps = [len(ref & set(ClipIndex.top_k(row, k))) / max(1, min(k, len(row))) for ref, row in zip(ref_top, scores)]
+        first = [ClipIndex.top_k(row, 1)[0] for row in scores] if len(candidate) else []
+        report[storage] = {
+            "bytes": candidate.nbytes,
+            "bytes_per_segment": candidate.nbytes / max(1, len(candidate)),
+            f"top{k}_overlap_mean": float(np.mean(overlaps)) if overlaps else 1.0,
+            f"top{k}_overlap_min": float(np.min(overlaps)) if overlaps else 1.0,
+            "top1_agreement": float(np.mean([a == b for a, b in zip(ref_first, first)])) if first else 1.0,
+            "score_ms": score_ms,
+        }
+    return report
@@ -0,0 +1,278 @@
+"""
+Persistent, content-addressed store for segment embeddings.
+
+Each model / sampling setup gets its own subdirectory (named after a hash of its
+fingerprint), so processes with different settings share the root without ever
+touching each other's vectors. Layout of a subdirectory:
+    meta.json         model / sampling fingerprint the stored vectors belong to
+    embeddings.f32    packed float32 rows, one per segment, append-only
+    index.jsonl       one line per appended batch: file digest, segment bounds, first row
+    store.lock        advisory lock guarding appends, reads and invalidation
+
+Scene lists live in a sibling SceneStore directory (see config.settings).
+
+Data rows are always written and fsynced before the index line that references
+them, so readers never see an index entry pointing at missing data. Readers hold
+the shared lock while reading index lines and memory-mapped rows, so the data
+file is never truncated underneath them.
+"""
+
+import os
+import json
+import hashlib
+import contextlib
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+STORE_VERSION = 1
+
+
+def _bound_key(start: float, end: float) -> str:
+    return f"{start:.3f}_{end:.3f}"
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path: str, exclusive: bool):
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _append_line(path: str, entry: dict) -> None:
+    with open(path, "ab") as f:
+        f.write((json.dumps(entry) + "\n").encode())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class EmbeddingStore:
+    def __init__(
+        self,
+        root: str,
+        model_name: str,
+        pretrained: str,
+        num_frames: int,
+        precision: str = "fp32",
+        sampling: Optional[str] = None,
+    ):
+        self.fingerprint = {
+            "version": STORE_VERSION,
+            "model_name": model_name,
+            "pretrained": pretrained,
+            "precision": precision,
+            "num_frames": num_frames,
+            "sampling": sampling,
+        }
+        namespace = hashlib.sha1(json.dumps(self.fingerprint, sort_keys=True).encode()).hexdigest()[:16]
+        self.root = os.path.join(root, namespace)
+        self.meta_path = os.path.join(self.root, "meta.json")
+        self.data_path = os.path.join(self.root, "embeddings.f32")
+        self.index_path = os.path.join(self.root, "index.jsonl")
+        self.lock_path = os.path.join(self.root, "store.lock")
+
+        self.dim: Optional[int] = None
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self._index_offset = 0
+        self._num_rows = 0
+        self._data: Optional[np.memmap] = None
+        self._thread_lock = threading.RLock()
+
+        os.makedirs(self.root, exist_ok=True)
+        self._check_fingerprint()
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool):
+        with self._thread_lock, _file_lock(self.lock_path, exclusive):
+            yield
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self.meta_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta: dict) -> None:
+        tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _check_fingerprint(self) -> None:
+        with self._locked(exclusive=True):
+            meta = self._read_meta()
+            if meta is not None and all(meta.get(k) == v for k, v in self.fingerprint.items()):
+                self.dim = meta.get("dim")
+                return
+            # Only a fresh directory or an unreadable / foreign meta.json gets here; other
+            # setups live in their own directories
+            if meta is not None:
+                print(f"Embedding store at {self.root} has an unexpected meta.json - resetting it")
+            self._invalidate()
+
+    def _invalidate(self) -> None:
+        # Caller holds the exclusive lock
+        for path in (self.data_path, self.index_path):
+            with open(path, "wb"):
+                pass
+        self._write_meta(dict(self.fingerprint, dim=None))
+        self.dim = None
+        self._rows.clear()
+        self._index_offset = 0
+        self._num_rows = 0
+        self._data = None
+
+    def _refresh(self) -> None:
+        """Pick up index lines appended (by this or another process) since the last read."""
+        with open(self.index_path, "rb") as f:
+            if f.seek(0, os.SEEK_END) < self._index_offset:
+                # Another process invalidated the store underneath us
+                self._rows.clear()
+                self._index_offset = 0
+                self._num_rows = 0
+                self._data = None
+                self.dim = None
+            f.seek(self._index_offset)
+            pending = f.read()
+
+        if not pending:
+            return
+
+        # Only consume complete lines; a torn trailing write is ignored until finished
+        complete = pending[:pending.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            row = entry["row"]
+            for start, end in entry["segments"]:
+                self._rows[(entry["digest"], _bound_key(start, end))] = row
+                row += 1
+            self._num_rows = max(self._num_rows, row)
+        self._index_offset += len(complete)
+
+        if self.dim is None:
+            meta = self._read_meta() or {}
+            self.dim = meta.get("dim")
+
+    def _matrix(self) -> Optional[np.memmap]:
+        if not self._num_rows or not self.dim:
+            return None
+        if self._data is None or self._data.shape[0] < self._num_rows:
+            self._data = np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(self._num_rows, self.dim))
+        return self._data
+
+    def lookup(self, digest: str, segments: List[Tuple[float, float]]) -> List[Optional[np.ndarray]]:
+        """Return the stored embedding for each (start, end) of a file, or None where missing."""
+        with self._locked(exclusive=False):
+            self._refresh()
+            data = self._matrix()
+            results = []
+            for start, end in segments:
+                row = self._rows.get((digest, _bound_key(start, end)))
+                results.append(None if row is None or data is None else np.array(data[row]))
+        return results
+
+    def put(self, digest: str, segments: List[Tuple[float, float]], embeddings: np.ndarray) -> None:
+        """Atomically append embeddings for the given segments of one file."""
+        if not segments:
+            return
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(segments), -1)
+
+        with self._locked(exclusive=True):
+            self._refresh()
+
+            dim = embeddings.shape[1]
+            if self.dim is None:
+                self.dim = dim
+                self._write_meta(dict(self.fingerprint, dim=dim))
+            elif self.dim != dim:
+                raise ValueError(f"Embedding dim {dim} does not match store dim {self.dim}")
+
+            keep = [i for i, (s, e) in enumerate(segments) if (digest, _bound_key(s, e)) not in self._rows]
+            if not keep:
+                return
+
+            row_bytes = dim * 4
+            with open(self.data_path, "r+b") as f:
+                size = f.seek(0, os.SEEK_END)
+                # Drop rows orphaned by a writer that died before committing its index line
+                committed = self._num_rows * row_bytes
+                if size != committed:
+                    f.truncate(committed)
+                    f.seek(committed)
+                f.write(embeddings[keep].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            entry = {
+                "digest": digest,
+                "segments": [[float(segments[i][0]), float(segments[i][1])] for i in keep],
+                "row": self._num_rows,
+            }
+            _append_line(self.index_path, entry)
+            self._refresh()
+
+    def __len__(self) -> int:
+        with self._locked(exclusive=False):
+            self._refresh()
+        return self._num_rows
+
+
+class SceneStore:
+    """
+    Scene lists keyed by file content digest and detector parameters, kept as an
+    append-only JSONL file. Independent of the CLIP model, so it survives
+    embedding store invalidation.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index_path = os.path.join(root, "scenes.jsonl")
+        self.lock_path = os.path.join(root, "scenes.lock")
+        self._scenes: Dict[Tuple[str, str], List[Tuple[float, float]]] = {}
+        self._index_offset = 0
+        self._thread_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _refresh(self) -> None:
+        try:
+            with open(self.index_path, "rb") as f:
+                f.seek(self._index_offset)
+                pending = f.read()
+        except FileNotFoundError:
+            return
+
+        complete = pending[:pending.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self._scenes[(entry["digest"], entry["params"])] = [tuple(s) for s in entry["scenes"]]
+        self._index_offset += len(complete)
+
+    def get(self, digest: str, params: str) -> Optional[List[Tuple[float, float]]]:
+        with self._thread_lock:
+            if (digest, params) not in self._scenes:
+                with _file_lock(self.lock_path, exclusive=False):
+                    self._refresh()
+            return self._scenes.get((digest, params))
+
+    def put(self, digest: str, params: str, scenes: List[Tuple[float, float]]) -> None:
+        with self._thread_lock, _file_lock(self.lock_path, exclusive=True):
+            self._refresh()
+            if (digest, params) in self._scenes:
+                return
+            _append_line(self.index_path, {"digest": digest, "params": params, "scenes": [list(s) for s in scenes]})
+            self._scenes[(digest, params)] = [tuple(s) for s in scenes]
+            self._index_offset = os.path.getsize(self.index_path)
@@ -0,0 +1,245 @@
+"""
+Render backends that drive ffmpeg directly, so no frame ever passes through Python:
+one filter graph over the raw sources (optionally cut into chunks encoded in parallel),
+or a stream-copy concat of pre-rendered pieces.
+"""
+
+import os
+import uuid
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from utils import tracing
+from utils.ffmpeg import run_ffmpeg
+from video.captions import captions_between, overlay_filters
+
+OUTPUT_FPS = 30
+AUDIO_SAMPLE_RATE = 44100
+
+# libx264 defaults; override per job to trade quality for speed
+X264_PRESET = "medium"
+X264_CRF = 23
+
+
+def fit_filter(target_resolution: Tuple[int, int], fps: int = OUTPUT_FPS) -> str:
+    """Aspect-correct scale to cover the target, center crop, constant fps and pixel format."""
+    width, height = target_resolution
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+        f"crop={width}:{height},setsar=1,fps={fps},format=yuv420p"
+    )
+
+
+def x264_args(preset: str = X264_PRESET, crf: int = X264_CRF, threads: int = 0) -> List[str]:
+    """Encoder settings; threads=0 lets x264 pick one per core."""
+    return [
+        "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+        "-threads", str(threads), "-pix_fmt", "yuv420p",
+    ]
+
+
+def segment_inputs(timeline: List[Dict[str, Any]], target_resolution: Tuple[int, int], fps: int):
+    """Input args and per-segment fit filters for timeline, concatenated into [vcat]."""
+    args: List[str] = []
+    filters: List[str] = []
+
+    # Each segment is its own input with input-side seeking, so ffmpeg only decodes
+    # from the nearest keyframe instead of the whole file
+    for i, seg in enumerate(timeline):
+        args += ["-ss", f"{seg['start']:.3f}", "-t", f"{seg['end'] - seg['start']:.3f}", "-i", seg["source"]]
+        filters.append(f"[{i}:v]{fit_filter(target_resolution, fps)}[v{i}]")
+
+    concat_inputs = "".join(f"[v{i}]" for i in range(len(timeline)))
+    filters.append(f"{concat_inputs}concat=n={len(timeline)}:v=1:a=0[vcat]")
+    return args, filters
+
+
+def render_ffmpeg(
+    timeline: List[Dict[str, Any]],
+    tts_audio_path: str,
+    output_path: str,
+    duration: float,
+    target_resolution: Tuple[int, int] = (1080, 1920),
+    fps: int = OUTPUT_FPS,
+    preset: str = X264_PRESET,
+    crf: int = X264_CRF,
+    threads: int = 0,
+    captions: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """
+    Render timeline (segment dicts with 'source', 'start', 'end', in play order)
+    under the soundtrack (narration already mixed with any music, see audio.mixer),
+    trimmed to duration seconds, with captions (see video.captions.build_captions)
+    burned in.
+    """
+    args, filters = segment_inputs(timeline, target_resolution, fps)
+    filters.append(f"[vcat]trim=duration={duration:.3f}[vtrim]")
+
+    tts_input = len(timeline)
+    args += ["-i", tts_audio_path]
+
+    caption_args, caption_filters = overlay_filters(captions or [], tts_input + 1, "vtrim", "vout")
+    args += caption_args
+    filters += caption_filters
+
+    args += [
+        "-filter_complex", ";".join(filters),
+        "-map", "[vout]", "-map", f"{tts_input}:a",
+        *x264_args(preset, crf, threads),
+        "-c:a", "aac",
+        "-t", f"{duration:.3f}",
+        "-movflags", "+faststart",
+        output_path,
+    ]
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    run_ffmpeg(args)
+    return output_path
+
+
+def concat_pieces(
+    piece_paths: List[str],
+    tts_audio_path: str,
+    output_path: str,
+    duration: float,
+    captions: Optional[List[Dict[str, Any]]] = None,
+    preset: str = X264_PRESET,
+    crf: int = X264_CRF,
+    threads: int = 0,
+) -> str:
+    """
+    Stream-copy identically encoded pieces back to back and mux the soundtrack
+    (narration already mixed with any music) under them. Burning in captions needs one re-encode of the joined video (with
+    preset / crf / threads); without captions the video is never re-encoded.
+    """
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    list_path = f"{output_path}.{uuid.uuid4().hex}.concat.txt"
+    with open(list_path, "w") as f:
+        for path in piece_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    video_out, video_args, caption_args, filter_args = "0:v", ["-c:v", "copy"], [], []
+    if captions:
+        caption_args, caption_filters = overlay_filters(captions, 2, "0:v", "vout")
+        filter_args = ["-filter_complex", ";".join(caption_filters)]
+        video_out, video_args = "[vout]", x264_args(preset, crf, threads)
+    try:
+        run_ffmpeg([
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-i", tts_audio_path, *caption_args, *filter_args,
+            "-map", video_out, "-map", "1:a",
+            *video_args, "-c:a", "aac",
+            "-t", f"{duration:.3f}",
+            "-movflags", "+faststart",
+            output_path,
+        ])
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+def split_timeline(timeline: List[Dict[str, Any]], chunks: int) -> List[List[Dict[str, Any]]]:
+    """Cut timeline at segment boundaries into up to chunks runs of roughly equal duration."""
+    total = sum(seg["end"] - seg["start"] for seg in timeline)
+    target = total / max(1, chunks) or 1.0
+    runs, run_idx, elapsed = [], None, 0.0
+    for seg in timeline:
+        length = seg["end"] - seg["start"]
+        # A segment belongs to the chunk its midpoint falls into
+        idx = min(chunks - 1, int((elapsed + length / 2) / target))
+        if idx != run_idx:
+            runs.append([])
+            run_idx = idx
+        runs[-1].append(seg)
+        elapsed += length
+    return runs
+
+
+def render_chunk(
+    chunk: List[Dict[str, Any]],
+    output_path: str,
+    target_resolution: Tuple[int, int],
+    fps: int,
+    preset: str,
+    crf: int,
+    threads: int,
+    captions: Optional[List[Dict[str, Any]]] = None,
+    offset: float = 0.0,
+) -> str:
+    """
+    Encode one run of segments (video only) with a keyframe at every cut. offset is
+    where the chunk starts in the ad, for placing the captions that overlap it.
+    """
+    args, filters = segment_inputs(chunk, target_resolution, fps)
+    cuts, t = [], 0.0
+    for seg in chunk[:-1]:
+        t += seg["end"] - seg["start"]
+        cuts.append(f"{t:.3f}")
+    chunk_duration = sum(seg["end"] - seg["start"] for seg in chunk)
+
+    caption_args, caption_filters = overlay_filters(
+        captions_between(captions or [], offset, offset + chunk_duration), len(chunk), "vcat", "vout", offset)
+    args += caption_args
+    filters += caption_filters
+
+    keyframes = ["-force_key_frames", ",".join(["0"] + cuts)]
+    run_ffmpeg([
+        *args,
+        "-filter_complex", ";".join(filters),
+        "-map", "[vout]", "-an",
+        *x264_args(preset, crf, threads),
+        *keyframes,
+        # Shared timebase so the chunks concatenate without re-encoding
+        "-video_track_timescale", "90000",
+        output_path,
+    ])
+    return output_path
+
+
+def render_chunked(
+    timeline: List[Dict[str, Any]],
+    tts_audio_path: str,
+    output_path: str,
+    duration: float,
+    target_resolution: Tuple[int, int] = (1080, 1920),
+    fps: int = OUTPUT_FPS,
+    preset: str = X264_PRESET,
+    crf: int = X264_CRF,
+    threads: int = 0,
+    workers: Optional[int] = None,
+    captions: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """
+    Split timeline at segment boundaries, encode the chunks in parallel ffmpeg
+    processes with identical encoder settings, then stream-copy them together and
+    mux the audio once. threads=0 divides the cores between the workers.
+    """
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(timeline)))
+    threads = threads or max(1, cpus // workers)
+    chunks = split_timeline(timeline, workers)
+
+    chunk_dir = f"{output_path}.{uuid.uuid4().hex}.chunks"
+    os.makedirs(chunk_dir)
+    try:
+        paths = [os.path.join(chunk_dir, f"chunk_{i:03d}.mp4") for i in range(len(chunks))]
+        offsets = [0.0]
+        for chunk in chunks[:-1]:
+            offsets.append(offsets[-1] + sum(seg["end"] - seg["start"] for seg in chunk))
+        parent = tracing.current_span_id()
+
+        def encode(i):
+            with tracing.span("render_chunk", parent=parent, chunk=i, segments=len(chunks[i])):
+                return render_chunk(
+                    chunks[i], paths[i], target_resolution, fps, preset, crf, threads, captions, offsets[i])
+
+        with tracing.span("render_chunks", chunks=len(chunks), threads=threads):
+            with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+                list(pool.map(encode, range(len(chunks))))
+
+        return concat_pieces(paths, tts_audio_path, output_path, duration)
+    finally:
+        shutil.rmtree(chunk_dir, ignore_errors=True)
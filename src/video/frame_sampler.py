@@ -0,0 +1,168 @@
+"""
+Sample frames for many segments of a video in a single forward decode.
+
+Instead of seeking per timestamp, every timestamp needed for a video is computed
+up front and ffmpeg decodes the covered range once, scaled down to roughly the
+CLIP input size, piping raw RGB frames that are picked off as their time passes.
+"""
+
+import hashlib
+import subprocess
+import numpy as np
+from typing import Iterator, List, Tuple
+from utils import tracing
+from utils.ffmpeg import ffmpeg_binary, probe
+
+CLIP_INPUT_SIZE = 224
+
+
+def segment_timestamps(segments: List[Tuple[float, float]], num_frames: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evenly spaced timestamps per segment, from its start to just before its end.
+    Returns (times, segment_indices) sorted by time.
+    """
+    times, owners = [], []
+    for idx, (start, end) in enumerate(segments):
+        if end - start <= 0:
+            continue
+        times.append(start + np.linspace(0.0, max(0.0, end - start - 0.01), num_frames))
+        owners.append(np.full(num_frames, idx))
+
+    if not times:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+
+    times = np.concatenate(times)
+    owners = np.concatenate(owners)
+    order = np.argsort(times, kind="stable")
+    return times[order], owners[order]
+
+
+def scaled_size(size: Tuple[int, int], short_side: int) -> Tuple[int, int]:
+    """Downscale (width, height) so the short side is about short_side; never upscale."""
+    w, h = size
+    if min(w, h) <= short_side:
+        return w, h
+    scale = short_side / min(w, h)
+    # Even dimensions keep every scaler/pixel format happy
+    return max(2, int(round(w * scale / 2)) * 2), max(2, int(round(h * scale / 2)) * 2)
+
+
+def iter_frames_at(path: str, times: np.ndarray, short_side: int = CLIP_INPUT_SIZE) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (i, frame) for each times[i] (sorted ascending) from one sequential decode.
+    Frames are HxWx3 uint8 arrays, already downscaled during decode.
+    """
+    if len(times) == 0:
+        return
+
+    infos = probe(path)
+    fps = infos.get("video_fps") or 30.0
+    width, height = scaled_size(tuple(infos["video_size"]), short_side)
+    frame_bytes = width * height * 3
+
+    first, last = float(times[0]), float(times[-1])
+    cmd = [
+        ffmpeg_binary(), "-nostdin", "-loglevel", "error",
+        "-ss", f"{first:.3f}",
+        "-i", path,
+        "-t", f"{last - first + 2.0 / fps:.3f}",
+        # Constant-rate output so frame k sits exactly at first + k / fps
+        "-vf", f"fps={fps},scale={width}:{height}:flags=bilinear",
+        "-an", "-f", "rawvideo", "-pix_fmt", "rgb24", "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=frame_bytes * 4)
+
+    frame_idx = 0
+    try:
+        next_idx = 0
+        last_frame = None
+        while next_idx < len(times):
+            raw = proc.stdout.read(frame_bytes)
+            if len(raw) < frame_bytes:
+                break
+            last_frame = np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 3)
+            frame_time = first + frame_idx / fps
+            frame_idx += 1
+            # Hand out this frame for every requested time it is the nearest frame for
+            while next_idx < len(times) and times[next_idx] < frame_time + 0.5 / fps:
+                yield next_idx, last_frame
+                next_idx += 1
+
+        # Timestamps past the last decodable frame reuse it, like moviepy's reader does
+        while last_frame is not None and next_idx < len(times):
+            yield next_idx, last_frame
+            next_idx += 1
+    finally:
+        tracing.count("frames_decoded", frame_idx)
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def iter_segment_frames(
+    path: str,
+    segments: List[Tuple[float, float]],
+    num_frames: int,
+    short_side: int = CLIP_INPUT_SIZE,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield (segment index, frame) for num_frames evenly spaced frames of every segment."""
+    times, owners = segment_timestamps(segments, num_frames)
+    for i, frame in iter_frames_at(path, times, short_side=short_side):
+        yield int(owners[i]), frame
+
+
+def frame_thumbnail(frame: np.ndarray, size: int = 16) -> np.ndarray:
+    """size x size grayscale block means in [0, 1], a cheap stand-in for the frame when comparing."""
+    h, w = frame.shape[:2]
+    bh, bw = max(1, h // size), max(1, w // size)
+    gray = frame[:bh * size, :bw * size].mean(axis=2, dtype=np.float32)
+    return gray.reshape(size, bh, size, bw).mean(axis=(1, 3)) / 255.0
+
+
+def content_hash(frames: List[np.ndarray]) -> bytes:
+    """Digest of the decoded pixels; equal only for byte-identical frames."""
+    h = hashlib.blake2b(digest_size=20)
+    for frame in frames:
+        h.update(np.ascontiguousarray(frame).tobytes())
+    return h.digest()
+
+
+def iter_segment_keyframes(
+    path: str,
+    segments: List[Tuple[float, float]],
+    max_frames: int,
+    change_threshold: float = 0.04,
+    short_side: int = CLIP_INPUT_SIZE,
+) -> Iterator[Tuple[int, List[np.ndarray], bytes]]:
+    """
+    Adaptive sampling: look at max_frames evenly spaced candidates per segment but
+    keep a frame only when its thumbnail differs from the last kept one by more than
+    change_threshold (mean absolute difference). A static shot yields one frame, a
+    pan up to max_frames. Yields (segment index, kept frames, signature) once per
+    segment; the signature is a content hash of the kept decoded frames, so it is
+    equal only for exactly duplicated footage (e.g. the same clip in two files),
+    which callers can embed once.
+    """
+    times, owners = segment_timestamps(segments, max_frames)
+    seen = np.zeros(len(segments), dtype=np.int64)
+    kept: dict = {}
+    for i, frame in iter_frames_at(path, times, short_side=short_side):
+        seg_idx = int(owners[i])
+        thumbnail = frame_thumbnail(frame)
+        frames, last = kept.setdefault(seg_idx, ([], [None]))
+        if last[0] is None or np.abs(thumbnail - last[0]).mean() > change_threshold:
+            frames.append(frame)
+            last[0] = thumbnail
+        else:
+            tracing.count("frames_skipped")
+
+        seen[seg_idx] += 1
+        if seen[seg_idx] == max_frames:
+            del kept[seg_idx]
+            yield seg_idx, frames, content_hash(frames)
+
+    # Segments cut short by the end of the stream
+    for seg_idx, (frames, _) in kept.items():
+        if frames:
+            yield seg_idx, frames, content_hash(frames)
@@ -0,0 +1,172 @@
+"""
+Incrementally maintained index of an asset library.
+
+Layout of a library's index directory (one per asset root, under LIBRARY_INDEX_DIR):
+    manifest.json     indexing parameters plus size / mtime / content digest per file
+    index.npz         the ClipIndex of every indexed file (see ClipIndex.save)
+    library.lock      advisory lock, so concurrent updates don't interleave
+
+update() walks the asset root, classifies files as added, changed, removed or
+unchanged, and runs only added and changed files through scene detection and
+embedding. Ranking at ad time then just loads the saved index.
+"""
+
+import os
+import json
+import hashlib
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from config.settings import LIBRARY_INDEX_DIR
+from utils import tracing
+from utils.hashing import file_digest
+from video.clip_index import ClipIndex
+from video.embedding_store import _file_lock
+from video.scene_detection import scene_params_key
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi')
+MANIFEST_VERSION = 1
+
+
+def iter_media_files(root: str, extensions: Tuple[str, ...] = VIDEO_EXTENSIONS) -> Iterator[str]:
+    """Paths of every video under root, recursively, in a stable order. Hidden entries are skipped."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.endswith(extensions) and not name.startswith("."):
+                yield os.path.join(dirpath, name)
+
+
+class LibraryDelta(NamedTuple):
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+    unchanged: List[str]
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.changed)} changed, "
+                f"{len(self.removed)} removed, {len(self.unchanged)} unchanged")
+
+
+class LibraryIndex:
+    """
+    Files are compared by size and mtime first; only when those differ is the
+    content hashed, so a touched-but-identical file is not re-analyzed. Changing the
+    segmenting or model parameters rebuilds the index from scratch (stored scene
+    lists and embeddings still make that cheap).
+    """
+
+    def __init__(
+        self,
+        root: str,
+        selector,
+        index_dir: Optional[str] = None,
+        max_segment_duration: int = 5,
+        min_segment_duration: int = 1,
+        scene_threshold: float = 40.0,
+    ):
+        self.root = os.path.abspath(root)
+        self.selector = selector
+        self.index_dir = index_dir or os.path.join(
+            LIBRARY_INDEX_DIR, hashlib.sha1(self.root.encode()).hexdigest()[:16])
+        self.max_segment_duration = max_segment_duration
+        self.min_segment_duration = min_segment_duration
+        self.scene_threshold = scene_threshold
+
+        self.manifest_path = os.path.join(self.index_dir, "manifest.json")
+        self.index_path = os.path.join(self.index_dir, "index.npz")
+        self.lock_path = os.path.join(self.index_dir, "library.lock")
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def params(self) -> dict:
+        """Everything that changes the indexed segments or their vectors."""
+        selector = self.selector
+        return {
+            "version": MANIFEST_VERSION,
+            "root": self.root,
+            "segments": [self.max_segment_duration, self.min_segment_duration],
+            "scenes": scene_params_key(self.scene_threshold, selector.scene_downscale, selector.scene_frame_skip),
+            "model": [selector.model_name, selector.pretrained, selector.precision, selector.num_frames],
+            "sampling": selector.sampling_key(),
+            "storage": selector.index_storage,
+        }
+
+    def _load(self) -> Tuple[Dict[str, dict], ClipIndex]:
+        """Saved (files, index), or an empty pair when missing, stale or inconsistent."""
+        empty = ({}, ClipIndex(storage=self.selector.index_storage))
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("params") != self.params():
+                print(f"Library index {self.index_dir} was built with different parameters - rebuilding")
+                return empty
+            index = ClipIndex.load(self.index_path)
+        except (OSError, ValueError, KeyError):
+            return empty
+
+        if len(index) != manifest.get("rows"):
+            # Crashed between writing the index and the manifest
+            print(f"Library index {self.index_dir} is inconsistent - rebuilding")
+            return empty
+        return manifest["files"], index
+
+    def _save(self, files: Dict[str, dict], index: ClipIndex) -> None:
+        index.save(self.index_path)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"params": self.params(), "rows": len(index), "files": files}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def scan(self, files: Dict[str, dict]) -> Tuple[LibraryDelta, Dict[str, dict]]:
+        """Compare the tree against the manifest entries; returns the delta and fresh stat entries."""
+        added, changed, unchanged = [], [], []
+        current = {}
+        for path in iter_media_files(self.root):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            old = files.get(path)
+            if old is None:
+                added.append(path)
+            elif old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+                entry["digest"] = old["digest"]
+                unchanged.append(path)
+            else:
+                entry["digest"] = file_digest(path)
+                (unchanged if entry["digest"] == old["digest"] else changed).append(path)
+            current[path] = entry
+
+        removed = [path for path in files if path not in current]
+        return LibraryDelta(added, changed, removed, unchanged), current
+
+    def update(self, rebuild: bool = False, dry_run: bool = False) -> ClipIndex:
+        """Bring the saved index in line with the asset tree and return it."""
+        with tracing.span("library_index.update", root=self.root), _file_lock(self.lock_path, exclusive=True):
+            files, index = ({}, ClipIndex(storage=self.selector.index_storage)) if rebuild else self._load()
+            delta, current = self.scan(files)
+            print(f"Library {self.root}: {delta.summary()}")
+            tracing.count("library.files_added", len(delta.added))
+            tracing.count("library.files_changed", len(delta.changed))
+            tracing.count("library.files_removed", len(delta.removed))
+
+            if dry_run or not (delta.added or delta.changed or delta.removed):
+                if not dry_run and current != files:
+                    self._save(current, index)  # refresh mtimes of touched-but-identical files
+                return index
+
+            index.remove_sources(delta.changed + delta.removed)
+            pending = delta.added + delta.changed
+            failed = []
+            if pending:
+                index.extend(self.selector.build_index(
+                    pending, self.max_segment_duration, self.min_segment_duration, failed=failed))
+
+            # Files that failed to analyze stay out of the manifest and are retried next time
+            for path in failed:
+                current.pop(path, None)
+            for path in pending:
+                if path in current:
+                    current[path]["digest"] = file_digest(path)
+
+            self._save(current, index)
+            return index
@@ -0,0 +1,37 @@
+"""
+Scene detection that can run inside worker processes
+"""
+
+from typing import List, Optional
+
+
+def scene_params_key(threshold: float, downscale: Optional[int], frame_skip: int) -> str:
+    return f"content-{threshold:g}-d{downscale or 'auto'}-s{frame_skip}"
+
+
+def detect_scenes(path: str, threshold: float = 40.0, downscale: Optional[int] = None, frame_skip: int = 0) -> List[tuple]:
+    """
+    Return [(start_seconds, end_seconds), ...] for the scenes of a video.
+
+    downscale: integer factor frames are shrunk by before analysis (None lets
+        PySceneDetect pick one from the resolution).
+    frame_skip: number of frames skipped between analyzed frames.
+    """
+    from scenedetect import open_video, SceneManager
+    from scenedetect.detectors import ContentDetector
+
+    video = open_video(path)
+    scene_manager = SceneManager()
+    if downscale:
+        scene_manager.auto_downscale = False
+        scene_manager.downscale = downscale
+    scene_manager.add_detector(ContentDetector(threshold=threshold))
+    scene_manager.detect_scenes(video, frame_skip=frame_skip)
+
+    scene_list = scene_manager.get_scene_list()
+    scenes = [(start.get_seconds(), end.get_seconds()) for start, end in scene_list]
+
+    # A single continuous shot has no cuts, which still makes it one scene
+    if not scenes and video.duration is not None:
+        scenes = [(0.0, video.duration.get_seconds())]
+    return scenes
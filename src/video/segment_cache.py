@@ -0,0 +1,150 @@
+"""
+Cache of library segments pre-rendered to the output format, so assembling an ad
+is mostly a stream-copy concat of cached pieces plus the audio mux.
+"""
+
+import os
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from config.settings import SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES
+from utils import tracing
+from utils.disk_cache import DiskCache
+from utils.ffmpeg import run_ffmpeg
+from utils.hashing import file_digest
+from video.ffmpeg_render import OUTPUT_FPS, X264_CRF, X264_PRESET, fit_filter
+
+
+class SegmentCache:
+    """
+    Segments keyed by source content digest, start/end and render settings, stored
+    as identical-format H.264 files (same size, fps, pixel format, timebase) so they
+    can be concatenated without re-encoding. Evicted LRU by disk budget. preset and
+    crf are part of the key; threads only affects encoding speed and is not.
+    """
+
+    def __init__(
+        self,
+        root: str = SEGMENT_CACHE_DIR,
+        max_bytes: int = SEGMENT_CACHE_MAX_BYTES,
+        target_resolution: Tuple[int, int] = (1080, 1920),
+        fps: int = OUTPUT_FPS,
+        preset: str = X264_PRESET,
+        crf: int = X264_CRF,
+        threads: int = 0,
+        workers: int = None,
+    ):
+        self.cache = DiskCache(root, max_bytes=max_bytes, suffix=".mp4")
+        self.settings = {
+            "resolution": list(target_resolution),
+            "fps": fps,
+            "pix_fmt": "yuv420p",
+            "codec": "libx264",
+            "preset": preset,
+            "crf": crf,
+        }
+        self.threads = threads
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+
+    def key(self, source: str, start: float, end: float) -> str:
+        return DiskCache.make_key("segment", file_digest(source), f"{start:.3f}", f"{end:.3f}", self.settings)
+
+    def encode_args(self) -> List[str]:
+        """Encoder settings every cached piece shares; keyframe at the start of each piece."""
+        return [
+            "-c:v", self.settings["codec"],
+            "-preset", self.settings["preset"],
+            "-crf", str(self.settings["crf"]),
+            "-pix_fmt", self.settings["pix_fmt"],
+            "-threads", str(self.threads),
+            "-video_track_timescale", "90000",
+        ]
+
+    def render(self, source: str, start: float, end: float, output_path: str) -> str:
+        run_ffmpeg([
+            "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", source,
+            "-vf", fit_filter(tuple(self.settings["resolution"]), self.settings["fps"]),
+            "-an", *self.encode_args(),
+            output_path,
+        ])
+        return output_path
+
+    def get_or_render(self, source: str, start: float, end: float) -> str:
+        key = self.key(source, start, end)
+        path = self.cache.get_path(key)
+        if path:
+            tracing.count("segment_cache.hits")
+            with self._lock:
+                self.bytes_saved += os.path.getsize(path)
+                self.seconds_saved += end - start
+            return path
+
+        tracing.count("segment_cache.misses")
+        tmp_path = self.cache.path_for(key) + f".{os.getpid()}.{threading.get_ident()}.render.mp4"
+        os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+        try:
+            self.render(source, start, end, tmp_path)
+            return self.cache.put_file(key, tmp_path, move=True)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def prepare(self, timeline: List[Dict[str, Any]], scratch_dir: Optional[str] = None) -> List[str]:
+        """
+        Paths of the normalized pieces for timeline, rendering misses in parallel.
+        Segments cut short of their scene (segment_end past end, as planned by script
+        alignment) are one-off lengths that would never be hit again, so they are
+        rendered into scratch_dir, which the caller removes, instead of the cache.
+        """
+        keys = [
+            (seg["source"], seg["start"], seg["end"], seg.get("segment_end", seg["end"]) > seg["end"] + 1e-3)
+            for seg in timeline
+        ]
+        unique = list(dict.fromkeys(keys))
+        if scratch_dir and any(trimmed for *_, trimmed in unique):
+            os.makedirs(scratch_dir, exist_ok=True)
+
+        def piece(source, start, end, trimmed):
+            if not trimmed or not scratch_dir:
+                return self.get_or_render(source, start, end)
+            tracing.count("segment_cache.uncached")
+            return self.render(source, start, end, os.path.join(scratch_dir, f"{uuid.uuid4().hex}.mp4"))
+
+        with tracing.span("segment_cache.prepare", segments=len(unique)):
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                paths = dict(zip(unique, pool.map(lambda u: piece(*u), unique)))
+
+        stats = self.stats()
+        print(
+            f"Segment cache: {stats['hits']} hits / {stats['misses']} misses "
+            f"({stats['hit_ratio']:.0%}), {stats['bytes_saved'] / 1e6:.1f} MB / {stats['seconds_saved']:.1f}s of renders reused"
+        )
+        return [paths[k] for k in keys]
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats["bytes_saved"] = self.bytes_saved
+        stats["seconds_saved"] = self.seconds_saved
+        return stats
+
+
+_default_caches: Dict[tuple, SegmentCache] = {}
+_default_lock = threading.Lock()
+
+
+def get_segment_cache(
+    target_resolution: Tuple[int, int] = (1080, 1920),
+    preset: str = X264_PRESET,
+    crf: int = X264_CRF,
+    threads: int = 0,
+) -> SegmentCache:
+    """Process-wide SegmentCache per output resolution and encoder settings."""
+    with _default_lock:
+        key = (tuple(target_resolution), preset, crf, threads)
+        if key not in _default_caches:
+            _default_caches[key] = SegmentCache(target_resolution=key[0], preset=preset, crf=crf, threads=threads)
+        return _default_caches[key]
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# config.settings reads these at import, so they have to be set before any src module loads
+_scratch = tempfile.mkdtemp(prefix="dropads-tests-")
+os.environ.setdefault("DROPADS_CACHE_DIR", os.path.join(_scratch, "cache"))
+os.environ.setdefault("DROPADS_TEMP_DIR", os.path.join(_scratch, "temp"))
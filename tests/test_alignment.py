@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from video.alignment import assign_segments, build_timeline
+from video.clip_index import ClipIndex
+
+
+def test_assign_segments_covers_each_line_without_reuse():
+    scores = np.array([
+        [0.9, 0.8, 0.1, 0.1, 0.2],
+        [0.9, 0.1, 0.7, 0.6, 0.1],
+    ])
+    durations = np.full(5, 2.0)
+    assigned = assign_segments(scores, durations, needs=[3.0, 3.0], min_shot=0.5)
+    # Segment 0 is the best match for both lines but goes to the stronger pair only once
+    assert assigned[0][0] == 0
+    assert 0 not in assigned[1]
+    assert not set(assigned[0]) & set(assigned[1])
+    assert sum(durations[assigned[1]]) >= 3.0
+
+
+def test_assign_segments_falls_back_to_best_segment():
+    scores = np.array([[0.9, 0.5], [0.001, 0.002]])
+    assigned = assign_segments(scores, np.array([10.0, 10.0]), needs=[2.0, 2.0])
+    assert assigned[0] == [0]
+    # Nothing above the threshold for line 1, so it reuses its best match
+    assert assigned[1] == [1]
+
+
+def test_assign_segments_empty_library():
+    assert assign_segments(np.zeros((2, 0)), np.zeros(0), [1.0, 1.0]) == [[], []]
+
+
+def make_index():
+    index = ClipIndex()
+    index.add("a.mp4", [(0.0, 2.0), (2.0, 5.0), (5.0, 6.0)], np.eye(3, dtype=np.float32))
+    return index
+
+
+def test_build_timeline_cuts_to_line_windows():
+    index = make_index()
+    scores = np.ones((2, 3))
+    windows = [(0.0, 2.5), (2.5, 4.0)]
+    timeline = build_timeline(index, [[0, 1], [2]], scores, windows)
+
+    assert [seg["line"] for seg in timeline] == [0, 0, 1, 1]
+    assert sum(seg["duration"] for seg in timeline) == 4.0
+    # Line 0: 2s of segment 0, then segment 1 cut to the remaining 0.5s
+    assert (timeline[1]["start"], timeline[1]["end"], timeline[1]["segment_end"]) == (2.0, 2.5, 5.0)
+    # The last line repeats its one 1s segment until the narration is covered
+    assert [(seg["start"], seg["end"]) for seg in timeline[2:]] == [(5.0, 6.0), (5.0, 5.5)]
+    assert timeline[0]["end"] == timeline[0]["segment_end"]
+
+
+def test_lines_shorter_than_min_shot_get_a_segment():
+    scores = np.array([
+        [0.9, 0.1, 0.1],
+        [0.1, 0.8, 0.1],
+        [0.1, 0.1, 0.7],
+    ])
+    durations = np.full(3, 2.0)
+    assigned = assign_segments(scores, durations, needs=[2.0, 0.3, 2.0], min_shot=0.5)
+    assert assigned[1] == [1]
+
+    index = make_index()
+    timeline = build_timeline(index, assigned, scores, [(0.0, 2.0), (2.0, 2.3), (2.3, 4.3)])
+    assert [seg["line"] for seg in timeline][:2] == [0, 1]
+    assert timeline[1]["duration"] == pytest.approx(0.3)
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from video.clip_index import STORAGE_TYPES, ClipIndex, quantization_report
+
+
+def normalized(rng, n, dim=32):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(storage="float32", seed=0):
+    rng = np.random.default_rng(seed)
+    index = ClipIndex(storage)
+    index.add("a.mp4", [(0.0, 1.0), (1.0, 2.0), (2.0, 4.0)], normalized(rng, 3))
+    index.add("b.mp4", [(0.0, 3.0), (3.0, 5.0)], normalized(rng, 2))
+    return index
+
+
+def test_rank_orders_by_similarity():
+    index = build()
+    query = index.embeddings[3]
+    ranked = index.rank(query, k=2)
+    assert ranked[0]["source"] == "b.mp4"
+    assert (ranked[0]["start"], ranked[0]["end"], ranked[0]["duration"]) == (0.0, 3.0, 3.0)
+    assert ranked[0]["similarity"] >= ranked[1]["similarity"]
+
+
+@pytest.mark.parametrize("storage", STORAGE_TYPES)
+def test_quantized_scores_match_float32(storage):
+    rng = np.random.default_rng(1)
+    reference = ClipIndex()
+    # More rows than one scoring block, with a ragged last block
+    reference.add("a.mp4", [(i, i + 1.0) for i in range(700)], normalized(rng, 700, 64))
+    queries = normalized(rng, 3, 64)
+
+    index = reference.with_storage(storage)
+    tolerance = {"float32": 1e-6, "float16": 2e-3, "int8": 5e-2}[storage]
+    np.testing.assert_allclose(index.scores(queries), reference.scores(queries), atol=tolerance)
+    # Scoring is exact against the index's own (dequantized) vectors
+    np.testing.assert_allclose(index.scores(queries), queries @ index.embeddings.T, atol=1e-5)
+    assert index.nbytes <= reference.nbytes
+
+
+def test_float16_scores_handle_zero_tiny_and_negative_values():
+    vectors = np.zeros((2, 8), dtype=np.float32)
+    vectors[0, :4] = [0.0, -0.0, 1e-6, -3e-5]
+    vectors[1, :4] = [1.0, -1.0, 0.5, -0.25]
+    index = ClipIndex("float16")
+    index.add("a.mp4", [(0.0, 1.0), (1.0, 2.0)], vectors)
+    query = np.arange(1, 9, dtype=np.float32)
+    np.testing.assert_allclose(index.scores(query)[0], vectors.astype(np.float16).astype(np.float32) @ query, rtol=1e-6)
+
+
+@pytest.mark.parametrize("storage", STORAGE_TYPES)
+def test_save_load_roundtrip(tmp_path, storage):
+    index = build(storage)
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = ClipIndex.load(path)
+    assert loaded.storage == storage
+    assert loaded.sources == index.sources
+    np.testing.assert_array_equal(loaded.embeddings, index.embeddings)
+    np.testing.assert_array_equal(loaded.starts, index.starts)
+    np.testing.assert_array_equal(loaded.ends, index.ends)
+
+
+def test_remove_sources_remaps_rows():
+    index = build()
+    b_rows = index.embeddings[3:].copy()
+    assert index.remove_sources(["a.mp4", "missing.mp4"]) == 3
+    assert index.sources == ["b.mp4"]
+    assert len(index) == 2
+    np.testing.assert_array_equal(index.embeddings, b_rows)
+    assert {r["source"] for r in index.rank(b_rows[0])} == {"b.mp4"}
+    assert index.remove_sources(["missing.mp4"]) == 0
+
+
+def test_extend_reencodes_into_own_storage():
+    index = build("int8")
+    other = ClipIndex()
+    other.add("c.mp4", [(0.0, 2.0)], normalized(np.random.default_rng(5), 1))
+    other.add("a.mp4", [(4.0, 5.0)], normalized(np.random.default_rng(6), 1))
+    index.extend(other)
+    assert index.sources == ["a.mp4", "b.mp4", "c.mp4"]
+    assert len(index) == 7
+    assert index.storage == "int8"
+    np.testing.assert_allclose(index.embeddings[5:], other.embeddings, atol=2e-2)
+    assert list(index.source_idx[5:]) == [2, 0]
+
+
+def test_top_k():
+    scores = np.array([0.1, 0.9, 0.5, 0.9, -1.0])
+    assert list(ClipIndex.top_k(scores, 2)) == [1, 3]
+    assert list(ClipIndex.top_k(scores)) == [1, 3, 2, 0, 4]
+    assert len(ClipIndex.top_k(scores, 0)) == 0
+
+
+def test_empty_index_scores():
+    assert ClipIndex("float16").scores(np.ones(4)).shape == (1, 0)
+
+
+def test_quantization_report():
+    rng = np.random.default_rng(2)
+    index = ClipIndex()
+    index.add("a.mp4", [(i, i + 1.0) for i in range(300)], normalized(rng, 300))
+    report = quantization_report(index, normalized(rng, 4), k=10)
+    assert set(report) == set(STORAGE_TYPES)
+    assert report["float32"]["top10_overlap_mean"] == 1.0
+    assert report["float16"]["bytes"] == report["float32"]["bytes"] // 2
+    assert all(entry["score_ms"] >= 0 for entry in report.values())
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from video.clipSelector import ClipSelector
+
+
+def fake_model(first_dtype, weight_dtype, with_conv1=True):
+    """Stand-in for an open_clip model loaded with reduced precision: the weights are
+    converted, positional_embedding (the first parameter) is not."""
+    conv1 = SimpleNamespace(weight=SimpleNamespace(dtype=weight_dtype))
+    params = [SimpleNamespace(dtype=first_dtype), conv1.weight]
+    visual = SimpleNamespace(parameters=lambda: iter(params))
+    if with_conv1:
+        visual.conv1 = conv1
+    return SimpleNamespace(visual=visual, parameters=lambda: iter(params))
+
+
+def selector_with(model):
+    selector = ClipSelector(store_dir=None, scene_store_dir=None)
+    selector._model = model
+    return selector
+
+
+def test_dtype_follows_the_image_tower_weights():
+    assert selector_with(fake_model("float32", "float16")).dtype == "float16"
+    assert selector_with(fake_model("float32", "bfloat16", with_conv1=False)).dtype == "bfloat16"
+    assert selector_with(fake_model("float32", "float32")).dtype == "float32"
+
+
+@pytest.mark.parametrize("precision", ["fp16", "bf16"])
+def test_dtype_of_a_low_precision_open_clip_model(precision):
+    torch = pytest.importorskip("torch")
+    open_clip = pytest.importorskip("open_clip")
+
+    model = open_clip.create_model("ViT-B-32", pretrained=None, precision=precision, device="cpu")
+    expected = torch.float16 if precision == "fp16" else torch.bfloat16
+    assert selector_with(model).dtype == expected
+    assert model.visual.conv1.weight.dtype == expected
+
+
+def test_fully_cached_build_does_not_load_the_model(tmp_path):
+    from utils.hashing import file_digest
+    from video.scene_detection import scene_params_key
+
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"not really a video")
+    selector = ClipSelector(store_dir=str(tmp_path / "embeddings"), scene_store_dir=str(tmp_path / "scenes"))
+    digest = file_digest(str(video))
+    selector.scene_store.put(digest, scene_params_key(40.0, None, 0), [(0.0, 2.0), (2.0, 5.0)])
+    selector.store.put(digest, [(0.0, 2.0), (2.0, 5.0)], np.eye(2, 4, dtype=np.float32))
+
+    def no_model():
+        raise AssertionError("the model was loaded")
+
+    selector._load_model = no_model
+    index = selector.build_index([str(video)])
+    assert len(index) == 2
+    assert index.sources == [str(video)]
@@ -0,0 +1,62 @@
+import os
+import time
+
+from utils.disk_cache import DiskCache
+
+
+def test_put_get_roundtrip(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), suffix=".bin")
+    key = DiskCache.make_key("a", 1, {"b": 2})
+    assert cache.get(key) is None
+    path = cache.put(key, b"payload")
+    assert path.endswith(".bin")
+    assert cache.get(key) == b"payload"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_root_is_created_on_first_write(tmp_path):
+    root = tmp_path / "lazy"
+    cache = DiskCache(str(root))
+    assert cache.get_path("ab" * 32) is None
+    assert not root.exists()
+    cache.put("ab" * 32, b"x")
+    assert root.exists()
+
+
+def test_make_key_is_stable_and_unambiguous():
+    assert DiskCache.make_key("a", {"x": 1, "y": 2}) == DiskCache.make_key("a", {"y": 2, "x": 1})
+    assert DiskCache.make_key("ab", "c") != DiskCache.make_key("a", "bc")
+
+
+def test_ttl_expires_entries(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=60)
+    path = cache.put("k1", b"old")
+    stale = time.time() - 120
+    os.utime(path, (stale, stale))
+    assert cache.get("k1") is None
+    assert not os.path.exists(path)
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=250)
+    now = time.time()
+    for i, key in enumerate(("k1", "k2")):
+        path = cache.put(key, b"x" * 100)
+        os.utime(path, (now - 100 + i, now - 100 + i))
+    # A hit touches k1, so k2 becomes the least recently used entry
+    assert cache.get("k1") is not None
+    cache.put("k3", b"x" * 100)
+    assert cache.get("k1") is not None
+    assert cache.get("k2") is None
+    assert cache.get("k3") is not None
+
+
+def test_put_file_move(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), suffix=".txt")
+    src = tmp_path / "src.txt"
+    src.write_text("hello")
+    path = cache.put_file("k", str(src), move=True)
+    assert not src.exists()
+    with open(path) as f:
+        assert f.read() == "hello"
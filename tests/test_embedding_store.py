@@ -0,0 +1,102 @@
+import multiprocessing
+import threading
+
+import numpy as np
+
+from video.embedding_store import EmbeddingStore, SceneStore
+
+
+def make_store(root, num_frames=4, sampling=None):
+    return EmbeddingStore(str(root), "ViT-B-32", "openai", num_frames, sampling=sampling)
+
+
+def _append(root, worker, count):
+    store = make_store(root)
+    for i in range(count):
+        store.put(f"video{worker}", [(float(i), i + 1.0)], np.full((1, 8), worker * 100 + i, dtype=np.float32))
+
+
+def test_put_and_reopen(tmp_path):
+    store = make_store(tmp_path)
+    vectors = np.arange(16, dtype=np.float32).reshape(2, 8)
+    store.put("digest", [(0.0, 1.0), (1.0, 2.5)], vectors)
+
+    reopened = make_store(tmp_path)
+    assert len(reopened) == 2
+    found = reopened.lookup("digest", [(1.0, 2.5), (0.0, 1.0), (2.5, 3.0)])
+    np.testing.assert_array_equal(found[0], vectors[1])
+    np.testing.assert_array_equal(found[1], vectors[0])
+    assert found[2] is None
+
+
+def test_put_skips_segments_already_stored(tmp_path):
+    store = make_store(tmp_path)
+    store.put("digest", [(0.0, 1.0)], np.ones((1, 4)))
+    store.put("digest", [(0.0, 1.0), (1.0, 2.0)], np.zeros((2, 4)))
+    assert len(store) == 2
+    np.testing.assert_array_equal(store.lookup("digest", [(0.0, 1.0)])[0], np.ones(4))
+
+
+def test_settings_get_separate_namespaces(tmp_path):
+    a = make_store(tmp_path, num_frames=4)
+    a.put("digest", [(0.0, 1.0)], np.ones((1, 4)))
+    b = make_store(tmp_path, num_frames=8)
+    assert b.root != a.root
+    assert b.lookup("digest", [(0.0, 1.0)]) == [None]
+    c = make_store(tmp_path, num_frames=4, sampling="adaptive")
+    assert c.lookup("digest", [(0.0, 1.0)]) == [None]
+    # Opening other setups leaves the first one intact
+    np.testing.assert_array_equal(make_store(tmp_path, num_frames=4).lookup("digest", [(0.0, 1.0)])[0], np.ones(4))
+
+
+def test_concurrent_thread_writers(tmp_path):
+    store = make_store(tmp_path)
+
+    def write(worker):
+        for i in range(20):
+            store.put(f"video{worker}", [(float(i), i + 1.0)], np.full((1, 8), worker * 100 + i, dtype=np.float32))
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(store) == 80
+    for worker in range(4):
+        rows = store.lookup(f"video{worker}", [(float(i), i + 1.0) for i in range(20)])
+        assert [int(row[0]) for row in rows] == [worker * 100 + i for i in range(20)]
+
+
+def test_concurrent_process_writers(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append, args=(str(tmp_path), w, 10)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    store = make_store(tmp_path)
+    assert len(store) == 30
+    for worker in range(3):
+        rows = store.lookup(f"video{worker}", [(float(i), i + 1.0) for i in range(10)])
+        assert [int(row[0]) for row in rows] == [worker * 100 + i for i in range(10)]
+
+
+def test_scene_store_reopen(tmp_path):
+    store = SceneStore(str(tmp_path))
+    assert store.get("digest", "params") is None
+    store.put("digest", "params", [(0.0, 1.5), (1.5, 4.0)])
+    store.put("digest", "params", [(0.0, 9.0)])  # first write wins
+
+    reopened = SceneStore(str(tmp_path))
+    assert reopened.get("digest", "params") == [(0.0, 1.5), (1.5, 4.0)]
+    assert reopened.get("digest", "other") is None
+
+
+def test_scene_store_sees_other_writers(tmp_path):
+    reader = SceneStore(str(tmp_path))
+    assert reader.get("digest", "params") is None
+    SceneStore(str(tmp_path)).put("digest", "params", [(0.0, 2.0)])
+    assert reader.get("digest", "params") == [(0.0, 2.0)]
@@ -0,0 +1,29 @@
+from video import ffmpeg_render
+
+
+def capture(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ffmpeg_render, "run_ffmpeg", calls.append)
+    return calls
+
+
+def test_render_maps_the_premixed_soundtrack(monkeypatch, tmp_path):
+    calls = capture(monkeypatch)
+    timeline = [{"source": "a.mp4", "start": 0.0, "end": 2.0}, {"source": "b.mp4", "start": 1.0, "end": 3.0}]
+    ffmpeg_render.render_ffmpeg(timeline, "mix.wav", str(tmp_path / "out.mp4"), 4.0)
+    args = calls[0]
+    assert args[args.index("mix.wav") - 1] == "-i"
+    maps = [args[i + 1] for i, arg in enumerate(args) if arg == "-map"]
+    assert maps == ["[vout]", "2:a"]
+    assert "amix" not in args[args.index("-filter_complex") + 1]
+
+
+def test_concat_copies_video_and_muxes_the_soundtrack(monkeypatch, tmp_path):
+    calls = capture(monkeypatch)
+    ffmpeg_render.concat_pieces(["p0.mp4", "p1.mp4"], "mix.wav", str(tmp_path / "out.mp4"), 4.0)
+    args = calls[0]
+    assert "-filter_complex" not in args
+    assert args[args.index("-c:v") + 1] == "copy"
+    maps = [args[i + 1] for i, arg in enumerate(args) if arg == "-map"]
+    assert maps == ["0:v", "1:a"]
+    assert not list(tmp_path.glob("*.concat.txt"))
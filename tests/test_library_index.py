@@ -0,0 +1,86 @@
+import threading
+
+import numpy as np
+
+from video.clip_index import ClipIndex
+from video.library_index import LibraryIndex, iter_media_files
+
+
+class FakeSelector:
+    """build_index stand-in: every file gets one segment, files named bad* fail."""
+
+    scene_downscale = None
+    scene_frame_skip = 0
+    model_name, pretrained, precision, num_frames = "fake", "none", "fp32", 4
+    index_storage = "float32"
+
+    def __init__(self):
+        self.built = []
+        self.before_return = {}
+
+    def sampling_key(self):
+        return None
+
+    def build_index(self, paths, max_segment_duration, min_segment_duration, failed=None):
+        index = ClipIndex()
+        for path in paths:
+            self.built.append(path)
+            if "bad" in path:
+                failed.append(path)
+            else:
+                index.add(path, [(0.0, 1.0)], np.ones((1, 4), dtype=np.float32))
+        hook = self.before_return.get(paths[0])
+        if hook:
+            hook()
+        return index
+
+
+def make_library(tmp_path, name, files):
+    root = tmp_path / name
+    root.mkdir()
+    for file in files:
+        (root / file).write_bytes(file.encode())
+    (root / "notes.txt").write_text("not a video")
+    return root
+
+
+def test_update_is_incremental_and_retries_failures(tmp_path):
+    root = make_library(tmp_path, "assets", ["a.mp4", "bad.mp4"])
+    selector = FakeSelector()
+    library = LibraryIndex(str(root), selector, index_dir=str(tmp_path / "index"))
+
+    index = library.update()
+    assert index.sources == [str(root / "a.mp4")]
+    assert selector.built == [str(root / "a.mp4"), str(root / "bad.mp4")]
+
+    # Only the failed file is analyzed again
+    selector.built.clear()
+    library.update()
+    assert selector.built == [str(root / "bad.mp4")]
+
+
+def test_concurrent_updates_keep_their_own_failures(tmp_path):
+    root_a = make_library(tmp_path, "a", ["bad.mp4"])
+    root_b = make_library(tmp_path, "b", ["good.mp4"])
+    selector = FakeSelector()
+    b_done = threading.Event()
+    # Library a's build finishes only after library b's build has run on the same selector
+    selector.before_return[str(root_a / "bad.mp4")] = lambda: b_done.wait(5)
+    selector.before_return[str(root_b / "good.mp4")] = b_done.set
+
+    library_a = LibraryIndex(str(root_a), selector, index_dir=str(tmp_path / "index_a"))
+    library_b = LibraryIndex(str(root_b), selector, index_dir=str(tmp_path / "index_b"))
+    thread = threading.Thread(target=library_a.update)
+    thread.start()
+    library_b.update()
+    thread.join(5)
+
+    # a's failure is retried, not recorded as indexed
+    selector.built.clear()
+    library_a.update()
+    assert selector.built == [str(root_a / "bad.mp4")]
+
+
+def test_iter_media_files_skips_other_files(tmp_path):
+    root = make_library(tmp_path, "assets", ["b.mov", "a.mp4", ".hidden.mp4"])
+    assert [p.rsplit("/", 1)[1] for p in iter_media_files(str(root))] == ["a.mp4", "b.mov"]
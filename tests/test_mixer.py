@@ -0,0 +1,80 @@
+import wave
+
+import numpy as np
+import pytest
+
+from audio import mixer
+
+RATE = 8000
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as f:
+        assert f.getframerate() == RATE
+        data = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+    return data.reshape(-1, mixer.CHANNELS) / 32767
+
+
+def tone(seconds, amplitude):
+    n = int(seconds * RATE)
+    return np.full((n, mixer.CHANNELS), int(amplitude * 32767), dtype=np.int16)
+
+
+@pytest.fixture
+def tracks(monkeypatch):
+    # One second of silence, one of speech, one of silence; the music bed is constant
+    narration = np.concatenate([tone(1.0, 0.0), tone(1.0, 0.2), tone(1.0, 0.0)])
+    music = tone(5.0, 0.5)
+    monkeypatch.setattr(mixer, "decode_pcm", lambda path, sample_rate: narration)
+    monkeypatch.setattr(mixer, "load_music_bed", lambda path, sample_rate: music)
+    return narration
+
+
+def test_duck_envelope_dips_under_speech():
+    narration = np.concatenate([tone(1.0, 0.0), tone(1.0, 0.2), tone(1.0, 0.0)]) / 32768
+    gain = mixer.duck_envelope(narration, RATE, amount=0.6, smoothing=0.1)
+    assert gain[int(0.5 * RATE)] == pytest.approx(1.0)
+    assert gain[int(1.5 * RATE)] == pytest.approx(0.4)
+    assert gain[int(2.5 * RATE)] == pytest.approx(1.0)
+    # Eases in just before speech starts
+    assert 0.4 < gain[int(0.98 * RATE)] < 1.0
+
+
+def test_mix_ducks_music_only_while_speaking(tracks, tmp_path):
+    path = mixer.mix_audio(
+        "voice.mp3", "music.mp3", bg_music_volume=0.5, output_path=str(tmp_path / "mix.wav"),
+        fade=0.0, ducking=0.5, sample_rate=RATE,
+    )
+    mix = read_wav(path)
+    assert len(mix) == len(tracks)
+    assert mix[int(0.5 * RATE), 0] == pytest.approx(0.25, abs=1e-3)
+    # Narration plus music at half the volume
+    assert mix[int(1.5 * RATE), 0] == pytest.approx(0.2 + 0.125, abs=1e-3)
+    assert mix[int(2.5 * RATE), 0] == pytest.approx(0.25, abs=1e-3)
+
+
+def test_mix_without_ducking_keeps_music_level(tracks, tmp_path):
+    path = mixer.mix_audio(
+        "voice.mp3", "music.mp3", bg_music_volume=0.5, output_path=str(tmp_path / "mix.wav"),
+        fade=0.0, sample_rate=RATE,
+    )
+    mix = read_wav(path)
+    assert mix[int(1.5 * RATE), 0] == pytest.approx(0.2 + 0.25, abs=1e-3)
+
+
+def test_mix_pads_to_duration_and_fades(tracks, tmp_path):
+    path = mixer.mix_audio(
+        "voice.mp3", "music.mp3", bg_music_volume=0.5, duration=4.0,
+        output_path=str(tmp_path / "mix.wav"), fade=0.5, sample_rate=RATE,
+    )
+    mix = read_wav(path)
+    assert mixer.wav_duration(path) == pytest.approx(4.0)
+    assert abs(mix[0, 0]) < 1e-3
+    assert abs(mix[-1, 0]) < 1e-3
+    assert mix[int(3.0 * RATE), 0] == pytest.approx(0.25, abs=1e-3)
+
+
+def test_narration_only(tracks, tmp_path):
+    mix = read_wav(mixer.mix_audio("voice.mp3", output_path=str(tmp_path / "mix.wav"), sample_rate=RATE))
+    assert mix[int(0.5 * RATE), 0] == 0.0
+    assert mix[int(1.5 * RATE), 0] == pytest.approx(0.2, abs=1e-3)
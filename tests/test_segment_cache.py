@@ -0,0 +1,62 @@
+import os
+
+from video.segment_cache import SegmentCache, get_segment_cache
+
+
+def make_cache(tmp_path, renders):
+    cache = SegmentCache(root=str(tmp_path / "segments"), workers=2)
+
+    def render(source, start, end, output_path):
+        renders.append((start, end))
+        with open(output_path, "w") as f:
+            f.write(f"{start}-{end}")
+        return output_path
+
+    cache.render = render
+    return cache
+
+
+def test_whole_segments_are_cached_and_reused(tmp_path):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"video")
+    renders = []
+    cache = make_cache(tmp_path, renders)
+    timeline = [{"source": str(source), "start": 0.0, "end": 2.0}] * 2
+
+    first = cache.prepare(timeline)
+    assert first[0] == first[1]
+    assert renders == [(0.0, 2.0)]
+    assert cache.prepare(timeline) == first
+    assert renders == [(0.0, 2.0)]
+    assert cache.stats()["hits"] >= 1
+
+
+def test_trimmed_pieces_bypass_the_cache(tmp_path):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"video")
+    renders = []
+    cache = make_cache(tmp_path, renders)
+    scratch = tmp_path / "scratch"
+    timeline = [
+        {"source": str(source), "start": 0.0, "end": 2.0, "segment_end": 2.0},
+        {"source": str(source), "start": 2.0, "end": 3.5, "segment_end": 5.0},
+    ]
+
+    pieces = cache.prepare(timeline, str(scratch))
+    assert os.path.dirname(pieces[1]) == str(scratch)
+    assert not pieces[0].startswith(str(scratch))
+    assert sorted(renders) == [(0.0, 2.0), (2.0, 3.5)]
+    cached = [name for _, _, names in os.walk(cache.cache.root) for name in names]
+    assert len(cached) == 1
+
+
+def test_encoder_settings_select_separate_caches():
+    fast = get_segment_cache((1080, 1920), "veryfast", 23)
+    assert get_segment_cache((1080, 1920), "veryfast", 23) is fast
+    slow = get_segment_cache((1080, 1920), "slow", 18, threads=2)
+    assert slow is not fast
+    assert slow.settings["preset"] == "slow"
+    assert slow.settings["crf"] == 18
+    assert "-threads" in slow.encode_args()
+    source = __file__
+    assert fast.key(source, 0.0, 1.0) != slow.key(source, 0.0, 1.0)
@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from pipeline.service import AdService, ServiceHTTPServer
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+class Runner:
+    """run_job stand-in that blocks every job until release() and records the start order."""
+
+    def __init__(self):
+        self.started = []
+        self.gate = threading.Event()
+
+    def __call__(self, request, executors):
+        self.started.append(request["image"])
+        assert set(executors) == {"network", "inference", "encode"}
+        if request.get("fail"):
+            raise RuntimeError("render failed")
+        self.gate.wait(5)
+        return f"out/{request['image']}.mp4"
+
+    def release(self):
+        self.gate.set()
+
+
+@pytest.fixture
+def service():
+    services = []
+
+    def make(**kwargs):
+        runner = Runner()
+        svc = AdService(runner, max_jobs=1, **kwargs)
+        services.append((svc, runner))
+        return svc, runner
+
+    yield make
+    for svc, runner in services:
+        runner.release()
+        svc.shutdown()
+
+
+def test_higher_priority_runs_first(service):
+    svc, runner = service()
+    blocker = svc.submit({"image": "first"})
+    wait_for(lambda: runner.started == ["first"])
+    svc.submit({"image": "low", "priority": 0})
+    svc.submit({"image": "high", "priority": 5})
+    svc.submit({"image": "low2", "priority": 0})
+    runner.release()
+    wait_for(lambda: svc.metrics()["jobs"]["succeeded"] == 4)
+    assert runner.started == ["first", "high", "low", "low2"]
+    job = svc.get(blocker["id"])
+    assert job["status"] == "succeeded"
+    assert job["output"] == "out/first.mp4"
+    assert svc.metrics()["latency_s"]["run"]["count"] == 4
+
+
+def test_cancel_queued_job(service):
+    svc, runner = service()
+    running = svc.submit({"image": "running"})
+    wait_for(lambda: runner.started == ["running"])
+    queued = svc.submit({"image": "queued"})
+    assert svc.cancel(queued["id"])["status"] == "cancelled"
+    # A running job is left alone
+    assert svc.cancel(running["id"])["status"] == "running"
+    assert svc.cancel("unknown") is None
+    runner.release()
+    wait_for(lambda: svc.get(running["id"])["status"] == "succeeded")
+    assert runner.started == ["running"]
+    assert svc.metrics()["jobs"]["cancelled"] == 1
+
+
+def test_failed_job_records_error(service):
+    svc, runner = service()
+    job = svc.submit({"image": "bad", "fail": True})
+    wait_for(lambda: svc.get(job["id"])["status"] == "failed")
+    assert "render failed" in svc.get(job["id"])["error"]
+
+
+def test_output_must_stay_in_output_dir(service, tmp_path):
+    svc, _ = service(output_dir=str(tmp_path))
+    job = svc.submit({"image": "img", "output": "sub/ad.mp4"})
+    assert job["request"]["output"] == str(tmp_path / "sub" / "ad.mp4")
+    for output in ("../ad.mp4", "/etc/ad.mp4", "."):
+        with pytest.raises(ValueError):
+            svc.submit({"image": "img", "output": output})
+
+    no_dir, _ = service()
+    with pytest.raises(ValueError):
+        no_dir.submit({"image": "img", "output": "ad.mp4"})
+
+
+def test_library_refreshes_coalesce_on_inference_pool(service):
+    calls = []
+    gate = threading.Event()
+
+    def refresh():
+        calls.append(threading.current_thread().name)
+        gate.wait(5)
+        return "index"
+
+    svc, _ = service(refresh_library=refresh)
+    first, second = svc.refresh(), svc.refresh()
+    assert first is second
+    gate.set()
+    assert first.result(5) == "index"
+    assert len(calls) == 1
+    assert calls[0].startswith("inference")
+    assert svc.refresh() is not first
+
+
+def request(base, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base + path, data=data, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_api(service):
+    svc, runner = service()
+    server = ServiceHTTPServer(("127.0.0.1", 0), svc)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        assert request(base, "GET", "/health") == (200, {"ok": True})
+
+        status, job = request(base, "POST", "/jobs", {"image": "img"})
+        assert status == 202
+        assert request(base, "GET", f"/jobs/{job['id']}")[0] == 200
+
+        assert request(base, "POST", "/jobs", {"priority": 1})[0] == 400
+        assert request(base, "POST", "/jobs", ["not", "an", "object"])[0] == 400
+        assert request(base, "GET", "/jobs/unknown")[0] == 404
+        assert request(base, "DELETE", "/jobs/unknown")[0] == 404
+        assert request(base, "GET", "/nowhere")[0] == 404
+        # No refresh_library configured
+        assert request(base, "POST", "/library", {})[0] == 404
+
+        runner.release()
+        wait_for(lambda: svc.get(job["id"])["status"] == "succeeded")
+        status, metrics = request(base, "GET", "/metrics")
+        assert status == 200
+        assert metrics["jobs"]["succeeded"] == 1
+        assert set(metrics["pools"]) == {"network", "inference", "encode"}
+    finally:
+        server.shutdown()
+        server.server_close()
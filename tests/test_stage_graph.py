@@ -0,0 +1,58 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline.stage_graph import StageGraph
+
+
+def test_results_flow_along_dependencies():
+    graph = StageGraph()
+    graph.add("a", lambda: 2)
+    graph.add("b", lambda: 3)
+    graph.add("c", lambda a, b: a * b, deps=["a", "b"])
+    results = graph.run()
+    assert results == {"a": 2, "b": 3, "c": 6}
+    assert graph.critical_path()[-1] == "c"
+    assert "c" in graph.format_timeline()
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(2, timeout=5)
+    graph = StageGraph()
+    graph.add("a", barrier.wait)
+    graph.add("b", barrier.wait)
+    graph.run(max_workers=2)
+
+
+def test_unknown_dependency_is_rejected():
+    graph = StageGraph()
+    with pytest.raises(ValueError):
+        graph.add("b", lambda a: a, deps=["a"])
+
+
+def test_failing_stage_raises_and_skips_dependents():
+    ran = []
+
+    def fail():
+        raise KeyError("boom")
+
+    graph = StageGraph()
+    graph.add("fail", fail)
+    graph.add("slow", lambda: time.sleep(0.05) or ran.append("slow"))
+    graph.add("after", lambda fail: ran.append("after"), deps=["fail"])
+    with pytest.raises(KeyError, match="boom"):
+        graph.run()
+    assert "after" not in ran
+
+
+def test_stages_run_on_named_executors():
+    threads = {}
+    graph = StageGraph()
+    graph.add("net", lambda: threads.setdefault("net", threading.current_thread().name), pool="network")
+    graph.add("own", lambda: threads.setdefault("own", threading.current_thread().name), pool="missing")
+    with ThreadPoolExecutor(1, thread_name_prefix="network") as network:
+        graph.run(executors={"network": network})
+    assert threads["net"].startswith("network")
+    assert not threads["own"].startswith("network")
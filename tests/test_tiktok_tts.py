@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("dotenv")
+pytest.importorskip("pydub")
+
+from audio import tiktok_tts  # noqa: E402
+from audio.tiktok_tts import split_text  # noqa: E402
+
+
+def test_short_text_is_one_chunk():
+    assert split_text("Hello there. How are you?") == ["Hello there. How are you?"]
+
+
+def test_sentences_are_packed_whole():
+    text = "One two three. Four five six. Seven eight nine."
+    assert split_text(text, max_words=6) == ["One two three. Four five six.", "Seven eight nine."]
+
+
+def test_overlong_sentence_falls_back_to_words():
+    words = " ".join(f"w{i}" for i in range(10))
+    chunks = split_text(f"Short one. {words}.", max_words=4)
+    assert chunks[0] == "Short one."
+    assert all(len(chunk.split()) <= 4 for chunk in chunks)
+    assert " ".join(chunks[1:]) == f"{words}."
+
+
+def test_chunks_respect_max_chars():
+    text = "Aaaa bbbb cccc. Dddd eeee ffff. Gggg."
+    chunks = split_text(text, max_chars=16)
+    assert all(len(chunk) <= 16 for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_empty_text():
+    assert split_text("   ") == []
+
+
+class FailingSession:
+    def __init__(self):
+        self.posts = 0
+
+    def post(self, url, timeout=None):
+        self.posts += 1
+        raise ConnectionError("unreachable")
+
+
+def test_failing_chunk_is_requested_once_per_attempt(monkeypatch):
+    session = FailingSession()
+    monkeypatch.setattr(tiktok_tts, "_session", session)
+    monkeypatch.setattr(tiktok_tts.time, "sleep", lambda seconds: None)
+    with pytest.raises(ConnectionError):
+        tiktok_tts.synthesize_chunk("Hello", "en_us_002", attempts=3)
+    assert session.posts == 3
+
+
+def test_session_does_not_retry_by_itself():
+    tiktok_tts.set_session(None)
+    try:
+        adapter = tiktok_tts.get_session().get_adapter("https://example.com")
+        assert adapter.max_retries.total == 0
+    finally:
+        tiktok_tts.set_session(None)